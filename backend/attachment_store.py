@@ -0,0 +1,272 @@
+"""
+Stockage des pièces jointes hors des documents courrier
+Les fichiers sont écrits par blocs dans GridFS (par défaut) ou sur le disque ;
+le document courrier ne conserve que les métadonnées (id, nom, taille, type, empreinte)
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+# Champs des pièces jointes à relire avant de supprimer un courrier
+ATTACHMENT_STORAGE_PROJECTION = {"attachments.storage": 1, "attachments.storage_id": 1}
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class AttachmentStore(ABC):
+    """Interface of an attachment storage backend"""
+
+    name = "abstract"
+
+    @abstractmethod
+    async def save(self, attachment_id: str, upload: UploadFile) -> Tuple[str, int, str]:
+        """
+        Stream an upload into the store
+
+        Returns:
+            tuple: (storage_id, size, sha256 hex digest)
+        """
+
+    @abstractmethod
+    def stream(self, storage_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield the bytes [start, end] (inclusive) of a stored file"""
+
+    @abstractmethod
+    async def delete(self, storage_id: str) -> None:
+        """Remove a stored file (no-op if it is already gone)"""
+
+
+class GridFSAttachmentStore(AttachmentStore):
+    """Store attachments in a GridFS bucket of the application database"""
+
+    name = "gridfs"
+
+    def __init__(self, db: AsyncIOMotorDatabase, bucket_name: str = "attachments"):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+
+    async def save(self, attachment_id: str, upload: UploadFile) -> Tuple[str, int, str]:
+        digest = hashlib.sha256()
+        size = 0
+        grid_in = self.bucket.open_upload_stream_with_id(
+            attachment_id,
+            upload.filename or attachment_id,
+            metadata={"content_type": upload.content_type},
+        )
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await grid_in.write(chunk)
+        except Exception:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+        return attachment_id, size, digest.hexdigest()
+
+    async def stream(self, storage_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        grid_out = await self.bucket.open_download_stream(storage_id)
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, storage_id: str) -> None:
+        try:
+            await self.bucket.delete(storage_id)
+        except NoFile:
+            pass
+
+
+class FileSystemAttachmentStore(AttachmentStore):
+    """Store attachments as plain files under a root directory"""
+
+    name = "filesystem"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, storage_id: str) -> Path:
+        # Répartition sur deux niveaux pour éviter des répertoires trop volumineux
+        return self.root / storage_id[:2] / storage_id
+
+    async def save(self, attachment_id: str, upload: UploadFile) -> Tuple[str, int, str]:
+        path = self._path(attachment_id)
+        tmp_path = path.with_suffix(".part")
+        await run_in_threadpool(path.parent.mkdir, parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        handle = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await run_in_threadpool(handle.write, chunk)
+        except Exception:
+            handle.close()
+            await run_in_threadpool(tmp_path.unlink, missing_ok=True)
+            raise
+        handle.close()
+        await run_in_threadpool(os.replace, tmp_path, path)
+        return attachment_id, size, digest.hexdigest()
+
+    async def stream(self, storage_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        path = self._path(storage_id)
+        if not path.exists():
+            raise FileNotFoundError(storage_id)
+        handle = await run_in_threadpool(open, path, "rb")
+        try:
+            await run_in_threadpool(handle.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await run_in_threadpool(handle.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+
+    async def delete(self, storage_id: str) -> None:
+        await run_in_threadpool(self._path(storage_id).unlink, missing_ok=True)
+
+
+async def delete_attachments(store: AttachmentStore, attachments: List[dict]) -> None:
+    """
+    Remove the stored content of a deleted mail's attachments
+
+    Legacy base64 attachments have nothing to remove. Files written by another
+    backend cannot be reached from this store and are only logged; a failed
+    removal never fails the mail deletion.
+    """
+    for attachment in attachments or []:
+        storage_id = attachment.get("storage_id")
+        if not storage_id:
+            continue
+        if attachment.get("storage") != store.name:
+            logger.warning(f"Pièce jointe {storage_id} ({attachment.get('storage')}) non supprimée: stockage {store.name} actif")
+            continue
+        try:
+            await store.delete(storage_id)
+        except Exception as e:
+            logger.error(f"Échec de la suppression de la pièce jointe {storage_id}: {e}")
+
+
+async def move_inline_attachments(db: AsyncIOMotorDatabase, store: Optional[AttachmentStore] = None) -> int:
+    """
+    Move legacy base64 attachment contents into the store and unset them
+
+    Mails are read one at a time and each attachment is decoded, written and
+    removed from its document before the next one, so memory stays bounded by
+    the largest mail document.
+
+    Returns:
+        int: number of attachments moved
+    """
+    store = store or create_attachment_store(db)
+    cursor = db.mails.find({"attachments.data": {"$exists": True, "$ne": None}}, {"_id": 0, "id": 1, "attachments": 1})
+    moved = 0
+    async for mail in cursor:
+        for index, attachment in enumerate(mail.get("attachments") or []):
+            if attachment.get("data") is None:
+                continue
+            attachment_id = attachment.get("id") or str(uuid.uuid4())
+            upload = UploadFile(
+                io.BytesIO(base64.b64decode(attachment["data"])),
+                filename=attachment.get("filename"),
+                headers=Headers({"content-type": attachment.get("content_type") or "application/octet-stream"}),
+            )
+            storage_id, size, sha256 = await store.save(attachment_id, upload)
+            prefix = f"attachments.{index}"
+            await db.mails.update_one(
+                {"id": mail["id"], f"{prefix}.data": {"$exists": True}},
+                {
+                    "$set": {
+                        f"{prefix}.id": attachment_id,
+                        f"{prefix}.storage": store.name,
+                        f"{prefix}.storage_id": storage_id,
+                        f"{prefix}.size": size,
+                        f"{prefix}.sha256": sha256,
+                    },
+                    "$unset": {f"{prefix}.data": ""},
+                },
+            )
+            moved += 1
+    if moved:
+        logger.info(f"{moved} pièce(s) jointe(s) base64 déplacée(s) vers le stockage {store.name}")
+    return moved
+
+
+def create_attachment_store(db: AsyncIOMotorDatabase) -> AttachmentStore:
+    """Build the store selected by ATTACHMENT_STORAGE (gridfs or filesystem)"""
+    backend = os.environ.get("ATTACHMENT_STORAGE", "gridfs").lower()
+    if backend == "filesystem":
+        return FileSystemAttachmentStore(os.environ.get("ATTACHMENT_DIR", "/data/attachments"))
+    if backend == "gridfs":
+        return GridFSAttachmentStore(db)
+    raise ValueError(f"Unknown ATTACHMENT_STORAGE backend: {backend}")
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range HTTP Range header
+
+    Returns:
+        tuple: (start, end) inclusive, or None when the whole file is requested
+    """
+    if not range_header:
+        return None
+
+    match = _RANGE_RE.match(range_header.strip())
+    if not match or size == 0:
+        raise HTTPException(
+            status_code=416,
+            detail="Invalid range",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+    first, last = match.groups()
+    if first == "" and last == "":
+        raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{size}"})
+    if first == "":
+        # Suffixe : les N derniers octets
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        start = int(first)
+        end = int(last) if last else size - 1
+        end = min(end, size - 1)
+
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+
+    return start, end
@@ -9,6 +9,7 @@ from fastapi_azure_auth import SingleTenantAzureAuthorizationCodeBearer
 from fastapi_azure_auth.user import User as AzureUser
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from azure_config import settings
+from principals import invalidate_user
 import logging
 from datetime import datetime, timezone
 
@@ -63,11 +64,13 @@ async def get_or_create_user_from_azure(azure_user: AzureUser, db: AsyncIOMotorD
                         "$set": {
                             "azure_id": azure_id,
                             "id": azure_id,  # Mettre à jour l'ID principal
-                            "last_login": datetime.now(timezone.utc).isoformat(),
+                            "last_login": datetime.now(timezone.utc),
                             "name": name,  # Mettre à jour le nom depuis Azure
                         }
                     }
                 )
+                # L'ID principal change : écarter les fiches en cache sous l'ancien ID
+                invalidate_user(existing_user["id"], email)
                 # Récupérer l'utilisateur mis à jour
                 existing_user = await db.users.find_one({"email": email}, {"_id": 0})
             else:
@@ -76,12 +79,17 @@ async def get_or_create_user_from_azure(azure_user: AzureUser, db: AsyncIOMotorD
                     {"azure_id": azure_id},
                     {
                         "$set": {
-                            "last_login": datetime.now(timezone.utc).isoformat(),
+                            "last_login": datetime.now(timezone.utc),
                             "email": email,
                             "name": name,
                         }
                     }
                 )
+                # last_login n'est pas mis en cache : seul un changement de
+                # nom ou d'email rend les fiches en cache obsolètes
+                if existing_user.get("email") != email or existing_user.get("name") != name:
+                    invalidate_user(existing_user["id"], existing_user.get("email"))
+                    existing_user.update(email=email, name=name)
             
             logger.info(f"Utilisateur connecté: {email} (role: {existing_user.get('role')})")
             return existing_user
@@ -99,12 +107,13 @@ async def get_or_create_user_from_azure(azure_user: AzureUser, db: AsyncIOMotorD
             "role": "admin" if is_first_azure_user else "user",
             "service_id": None,
             "sub_service_id": None,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "last_login": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
+            "last_login": datetime.now(timezone.utc),
             "password": None,  # Pas de mot de passe pour les utilisateurs Azure AD
         }
         
         await db.users.insert_one(new_user)
+        invalidate_user(new_user["id"], email)
         
         logger.info(f"Nouvel utilisateur Azure AD créé: {email} (role: {new_user['role']})")
         
@@ -3,6 +3,7 @@ from fastapi_azure_auth.user import User as AzureUser
 from typing import Optional
 import uuid
 from datetime import datetime, timezone
+from principals import get_user_by_email, invalidate_user
 
 async def get_current_user_azure(azure_user: AzureUser) -> dict:
     """
@@ -22,7 +23,7 @@ async def get_current_user_azure(azure_user: AzureUser) -> dict:
             raise HTTPException(status_code=401, detail="Email not found in token")
         
         # Find or create user in MongoDB
-        existing_user = await db.users.find_one({"email": email}, {"_id": 0})
+        existing_user = await get_user_by_email(db, email)
         
         if existing_user:
             # Update OID if needed
@@ -31,6 +32,7 @@ async def get_current_user_azure(azure_user: AzureUser) -> dict:
                     {"id": existing_user["id"]},
                     {"$set": {"oid": oid, "name": name}}
                 )
+                invalidate_user(existing_user["id"], email)
                 existing_user["oid"] = oid
                 existing_user["name"] = name
             
@@ -49,11 +51,12 @@ async def get_current_user_azure(azure_user: AzureUser) -> dict:
                 "name": name,
                 "role": "user",
                 "oid": oid,
-                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_at": datetime.now(timezone.utc),
                 "password": ""
             }
             
             await db.users.insert_one(new_user)
+            invalidate_user(new_user["id"], email)
             
             return {
                 "id": new_user["id"],
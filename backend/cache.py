@@ -0,0 +1,99 @@
+"""
+Cache mémoire à durée de vie limitée pour les données de référence
+(services, sous-services, annuaire des utilisateurs)
+Les réponses sont mises en cache déjà sérialisées en JSON avec leur ETag ;
+les mutations invalident explicitement les clés concernées. Chaque replica a
+son propre cache : la TTL borne la durée pendant laquelle un autre replica
+peut servir une donnée périmée
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("REFERENCE_CACHE_TTL", "60"))
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after a fixed time"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        """Store a value; ttl overrides the cache-wide lifetime for this entry"""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, prefix: Optional[str] = None) -> None:
+        """Drop every entry, or only string keys starting with prefix"""
+        if prefix is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if isinstance(k, str) and k.startswith(prefix)]:
+            del self._entries[key]
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> None:
+        """Drop the entries whose value satisfies predicate"""
+        for key in [k for k, (_, value) in self._entries.items() if predicate(value)]:
+            del self._entries[key]
+
+
+reference_cache = TTLCache()
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def cached_json_response(
+    request: Request,
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    adapter: TypeAdapter,
+    cache: TTLCache = reference_cache,
+) -> Response:
+    """
+    Serve a JSON payload from the cache, loading and serializing it on a miss
+
+    Returns 304 Not Modified when the client already holds the current ETag.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        body = adapter.dump_json(adapter.validate_python(await loader()))
+        entry = (body, _etag(body))
+        cache.set(key, entry)
+
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
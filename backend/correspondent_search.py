@@ -0,0 +1,96 @@
+"""
+Recherche de correspondants par préfixe (autocomplétion)
+Chaque correspondant porte un champ search_tokens : les mots de son nom, de
+son email et de son organisation, normalisés (minuscules, sans accents).
+Une requête devient une recherche de préfixes ancrés sur ce champ indexé,
+au lieu de trois $regex non ancrées sur toute la collection
+"""
+
+import re
+import unicodedata
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    if not text:
+        return ""
+    folded = unicodedata.normalize("NFKD", text)
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", folded.lower()).strip()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return normalize(text).split()
+
+
+def search_fields(correspondent: dict) -> dict:
+    """Derived fields to store with a correspondent document"""
+    tokens = set()
+    for field in ("name", "email", "organization"):
+        tokens.update(tokenize(correspondent.get(field)))
+    return {
+        "name_normalized": normalize(correspondent.get("name")),
+        "search_tokens": sorted(tokens),
+    }
+
+
+async def search_correspondents(
+    db: AsyncIOMotorDatabase,
+    query: str,
+    limit: int = DEFAULT_LIMIT,
+    offset: int = 0,
+) -> List[dict]:
+    """
+    Return correspondents whose words start with every word of the query
+
+    Ranking: names starting with the whole query first, then names
+    containing a word equal to a query word, then alphabetical order.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+    normalized_query = " ".join(tokens)
+
+    pipeline = [
+        {"$match": {"search_tokens": {"$all": [re.compile("^" + re.escape(token)) for token in tokens]}}},
+        {"$addFields": {
+            "_rank": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": [{"$indexOfCP": ["$name_normalized", normalized_query]}, 0]}, "then": 0},
+                    {"case": {"$gt": [{"$size": {"$setIntersection": ["$search_tokens", tokens]}}, 0]}, "then": 1},
+                ],
+                "default": 2,
+            }},
+        }},
+        {"$sort": {"_rank": 1, "name_normalized": 1, "id": 1}},
+        {"$skip": max(offset, 0)},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "_rank": 0, "search_tokens": 0, "name_normalized": 0}},
+    ]
+    return await db.correspondents.aggregate(pipeline).to_list(limit)
+
+
+async def backfill_search_fields(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> None:
+    """Compute search fields of correspondents created before they existed"""
+    cursor = db.correspondents.find(
+        {"search_tokens": {"$exists": False}},
+        {"_id": 1, "name": 1, "email": 1, "organization": 1},
+    )
+    operations = []
+    async for correspondent in cursor:
+        operations.append(UpdateOne({"_id": correspondent["_id"]}, {"$set": search_fields(correspondent)}))
+        if len(operations) >= batch_size:
+            await db.correspondents.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.correspondents.bulk_write(operations, ordered=False)
@@ -0,0 +1,129 @@
+"""
+Mots de passe des comptes locaux et limitation des tentatives de connexion
+Le hachage bcrypt (~100 ms par opération) est exécuté dans le pool de threads
+pour ne pas bloquer la boucle d'événements. Les anciens mots de passe stockés
+en clair restent acceptés et sont re-hachés à la première connexion réussie.
+Le throttle est en mémoire : chaque replica applique ses propres limites
+"""
+
+import asyncio
+import hmac
+import math
+import os
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Optional, Tuple
+
+import bcrypt
+from fastapi import HTTPException, Request
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Tentatives autorisées en rafale, puis une tentative de plus toutes les N secondes
+LOGIN_EMAIL_BURST = int(os.environ.get("LOGIN_EMAIL_BURST", "5"))
+LOGIN_EMAIL_REFILL_SECONDS = float(os.environ.get("LOGIN_EMAIL_REFILL_SECONDS", "12"))
+LOGIN_IP_BURST = int(os.environ.get("LOGIN_IP_BURST", "30"))
+LOGIN_IP_REFILL_SECONDS = float(os.environ.get("LOGIN_IP_REFILL_SECONDS", "2"))
+
+# Ne faire confiance à X-Forwarded-For que derrière un reverse proxy maîtrisé
+TRUST_FORWARDED_FOR = os.environ.get("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+def is_hashed(stored: Optional[str]) -> bool:
+    return bool(stored) and stored.startswith(_BCRYPT_PREFIXES)
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("ascii")
+
+
+def _check(password: str, stored: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), stored.encode("ascii"))
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password with bcrypt in the default thread pool executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(_hash, password))
+
+
+async def verify_password(password: str, stored: Optional[str]) -> Tuple[bool, bool]:
+    """
+    Check a password against its stored value
+
+    Returns:
+        Tuple[bool, bool]: (valid, needs_rehash); needs_rehash is True for a
+        valid password still stored in plaintext
+    """
+    if not stored:
+        return False, False
+    if not is_hashed(stored):
+        valid = hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return valid, valid
+    loop = asyncio.get_running_loop()
+    valid = await loop.run_in_executor(None, partial(_check, password, stored))
+    return valid, False
+
+
+class TokenBucket:
+    """In-memory token buckets keyed by an arbitrary string (bounded LRU)"""
+
+    def __init__(self, capacity: int, refill_seconds: float, maxsize: int = 10000):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def consume(self, key: str) -> float:
+        """
+        Take one token for key
+
+        Returns:
+            float: 0 if the token was granted, otherwise seconds until the next one
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(self.capacity), now))
+        tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) * self.refill_seconds
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return 0
+
+
+class LoginThrottle:
+    """Limit login attempts per account and per client address"""
+
+    def __init__(self):
+        self.by_email = TokenBucket(LOGIN_EMAIL_BURST, LOGIN_EMAIL_REFILL_SECONDS)
+        self.by_ip = TokenBucket(LOGIN_IP_BURST, LOGIN_IP_REFILL_SECONDS)
+
+    def check(self, email: str, request: Request) -> None:
+        """
+        Raises:
+            HTTPException: 429 with a Retry-After header when a limit is reached
+        """
+        wait = max(self.by_ip.consume(client_address(request)), self.by_email.consume(email.strip().lower()))
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail="Trop de tentatives de connexion, réessayez plus tard",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+def client_address(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,261 @@
+"""
+Import CSV en flux avec écritures par lots
+Le fichier est lu ligne à ligne (jamais décodé entièrement en mémoire), les
+correspondants sont résolus sur une table nom -> correspondant préchargée et
+les écritures sont envoyées par lots (insert_many / bulk_write)
+"""
+
+import csv
+import io
+import os
+import tempfile
+import time
+from itertools import islice
+from typing import Awaitable, BinaryIO, Callable, Dict, List, Optional
+
+from fastapi import UploadFile
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+
+from correspondent_search import search_fields
+from models import Correspondent, Mail, WorkflowStep
+from sequences import allocate_block
+from stats_counters import record_created
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
+MAX_BATCH_SIZE = 5000
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+ProgressCallback = Callable[[dict], Awaitable[None]]
+
+
+def _mail_status(statut: str) -> str:
+    if statut in ['archivé', 'archive', 'archivés']:
+        return 'archive'
+    return 'recu'
+
+
+def _mail_type(type_msg: str) -> str:
+    if type_msg in ['sortant', 'envoyé', 'envoye', 'out']:
+        return 'sortant'
+    return 'entrant'
+
+
+async def spool_to_disk(upload: UploadFile) -> str:
+    """
+    Copy an upload to a temporary file that outlives the request
+
+    The caller owns the returned path and must delete it.
+    """
+    handle = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, prefix="import-", suffix=".csv",
+        dir=os.environ.get("IMPORT_TMP_DIR"), delete=False,
+    )
+    try:
+        while True:
+            chunk = await upload.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(handle.write, chunk)
+    except Exception:
+        handle.close()
+        os.unlink(handle.name)
+        raise
+    handle.close()
+    return handle.name
+
+
+class CsvMailImporter:
+    """
+    Import correspondents and mails from a legacy CSV export
+
+    Columns: nom, prenom, telephone_fixe, telephone_mobile, adresse_mail,
+    adresse_postale, titre_message, type, statut
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        default_service: dict,
+        admin_user: dict,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        self.db = db
+        self.default_service = default_service
+        self.admin_user = admin_user
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.on_progress = on_progress
+        self.correspondents: Dict[str, dict] = {}
+        self._pending_ids = set()
+        self.stats = {
+            "correspondents_created": 0,
+            "correspondents_updated": 0,
+            "mails_created": 0,
+            "rows_processed": 0,
+            "duration_seconds": 0.0,
+            "rows_per_second": 0.0,
+            "errors": [],
+        }
+
+    async def _load_correspondents(self) -> None:
+        cursor = self.db.correspondents.find(
+            {}, {"_id": 0, "id": 1, "name": 1, "email": 1, "phone": 1, "address": 1, "organization": 1}
+        )
+        async for correspondent in cursor:
+            self.correspondents.setdefault(correspondent["name"], correspondent)
+
+    def _resolve_correspondent(self, row: dict, new_correspondents: List[dict], updates: Dict[str, dict]) -> dict:
+        """Return the correspondent of a row, queuing its creation or completion"""
+        nom = row.get('nom', '').strip()
+        prenom = row.get('prenom', '').strip()
+        tel_fixe = row.get('telephone_fixe', '').strip()
+        tel_mobile = row.get('telephone_mobile', '').strip()
+        email = row.get('adresse_mail', '').strip()
+        adresse = row.get('adresse_postale', '').strip()
+        phone = tel_mobile if tel_mobile else tel_fixe
+
+        full_name = f"{prenom} {nom}".strip() if prenom else nom
+        correspondent = self.correspondents.get(full_name)
+
+        if correspondent:
+            # Compléter uniquement les champs encore vides
+            update_data = {}
+            if email and not correspondent.get('email'):
+                update_data['email'] = email
+            if phone and not correspondent.get('phone'):
+                update_data['phone'] = phone
+            if adresse and not correspondent.get('address'):
+                update_data['address'] = adresse
+
+            if update_data:
+                correspondent.update(update_data)
+                update_data.update(search_fields(correspondent))
+                correspondent.update(update_data)
+                # Un correspondant créé dans ce lot est complété avant son insertion
+                if correspondent["id"] not in self._pending_ids:
+                    updates.setdefault(correspondent["id"], {}).update(update_data)
+                    self.stats["correspondents_updated"] += 1
+            return correspondent
+
+        correspondent_data = Correspondent(
+            name=full_name,
+            email=email if email else None,
+            phone=phone if phone else None,
+            address=adresse if adresse else None,
+            organization=None
+        )
+        doc = correspondent_data.model_dump()
+        doc.update(search_fields(doc))
+        new_correspondents.append(doc)
+
+        self.correspondents[full_name] = doc
+        self._pending_ids.add(doc["id"])
+        self.stats["correspondents_created"] += 1
+        return doc
+
+    async def _process_batch(self, rows: List[dict], first_row_number: int) -> None:
+        new_correspondents: List[dict] = []
+        updates: Dict[str, dict] = {}
+        pending = []
+
+        for offset, row in enumerate(rows):
+            row_number = first_row_number + offset
+            try:
+                titre = row.get('titre_message', '').strip()
+                if not row.get('nom', '').strip() or not titre:
+                    self.stats["errors"].append(f"Ligne {row_number}: nom et titre_message sont requis")
+                    continue
+                correspondent = self._resolve_correspondent(row, new_correspondents, updates)
+                pending.append((row_number, row, titre, correspondent))
+            except Exception as e:
+                self.stats["errors"].append(f"Ligne {row_number}: {str(e)}")
+
+        references = await allocate_block(self.db, len(pending))
+        mail_docs = []
+        mail_rows = []
+        for (row_number, row, titre, correspondent), reference in zip(pending, references):
+            try:
+                mail_status = _mail_status(row.get('statut', 'en_cours').strip().lower())
+                mail = Mail(
+                    type=_mail_type(row.get('type', 'entrant').strip().lower()),
+                    reference=reference,
+                    subject=titre,
+                    content=f"Message importé depuis CSV\n\nTitre: {titre}",
+                    correspondent_id=correspondent["id"],
+                    correspondent_name=correspondent["name"],
+                    service_id=self.default_service['id'],
+                    service_name=self.default_service['name'],
+                    status=mail_status,
+                    workflow=[
+                        WorkflowStep(
+                            status=mail_status,
+                            user_id=self.admin_user['sub'],
+                            user_name=self.admin_user['name'],
+                            comment="Import CSV"
+                        )
+                    ],
+                    message_type="courrier",
+                    is_registered=False
+                )
+                doc = mail.model_dump(exclude={"related_mails"})
+                doc["updated_at"] = doc["created_at"]
+                mail_docs.append(doc)
+                mail_rows.append(row_number)
+            except Exception as e:
+                self.stats["errors"].append(f"Ligne {row_number}: {str(e)}")
+
+        if new_correspondents:
+            await self.db.correspondents.insert_many(new_correspondents, ordered=False)
+            self._pending_ids.clear()
+        if updates:
+            await self.db.correspondents.bulk_write(
+                [UpdateOne({"id": corr_id}, {"$set": data}) for corr_id, data in updates.items()],
+                ordered=False,
+            )
+
+        if mail_docs:
+            inserted = mail_docs
+            try:
+                await self.db.mails.insert_many(mail_docs, ordered=False)
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                for error in e.details.get("writeErrors", []):
+                    self.stats["errors"].append(f"Ligne {mail_rows[error['index']]}: {error.get('errmsg')}")
+                inserted = [doc for index, doc in enumerate(mail_docs) if index not in failed]
+            await record_created(self.db, inserted)
+            self.stats["mails_created"] += len(inserted)
+
+    async def run(self, binary_file: BinaryIO) -> dict:
+        """Stream the CSV file and import it batch by batch"""
+        started = time.monotonic()
+        await self._load_correspondents()
+
+        # utf-8-sig : tolère le BOM ajouté par les exports Excel
+        text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        try:
+            row_number = 1
+            while True:
+                # Lecture disque et parsing hors de la boucle d'événements
+                rows = await run_in_threadpool(lambda: list(islice(reader, self.batch_size)))
+                if not rows:
+                    break
+                await self._process_batch(rows, row_number)
+                row_number += len(rows)
+                self.stats["rows_processed"] += len(rows)
+                self._update_throughput(started)
+                if self.on_progress:
+                    await self.on_progress(self.stats)
+        finally:
+            text.detach()
+
+        self._update_throughput(started)
+        return self.stats
+
+    def _update_throughput(self, started: float) -> None:
+        elapsed = time.monotonic() - started
+        self.stats["duration_seconds"] = round(elapsed, 3)
+        self.stats["rows_per_second"] = round(self.stats["rows_processed"] / elapsed, 1) if elapsed > 0 else 0.0
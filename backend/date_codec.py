@@ -0,0 +1,92 @@
+"""
+Stockage des dates en BSON natif
+Les dates étaient enregistrées en chaînes ISO 8601 puis reconverties ligne
+par ligne à la lecture. Elles sont désormais écrites telles quelles (datetime
+UTC) ; le client Motor est créé avec tz_aware=True pour relire des datetimes
+UTC « aware ». La migration convertit par lots les documents existants
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+# Champs date de chaque collection ; "workflow.timestamp" désigne un champ
+# des éléments d'un tableau
+DATE_FIELDS: Dict[str, List[str]] = {
+    "mails": ["created_at", "opened_at", "workflow.timestamp"],
+    "services": ["created_at", "archived_at"],
+    "correspondents": ["created_at"],
+    "users": ["created_at", "last_login", "deleted_at"],
+}
+
+# Jour UTC (YYYY-MM-DD) de created_at dans une agrégation, que la date soit
+# déjà native ou encore une chaîne ISO (avant migration)
+DAY_EXPRESSION = {
+    "$cond": [
+        {"$eq": [{"$type": "$created_at"}, "date"]},
+        {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+        {"$substrCP": ["$created_at", 0, 10]},
+    ]
+}
+
+
+def to_bson_date(value) -> Optional[datetime]:
+    """Convert an ISO string or datetime to a UTC datetime (None and unparsable values stay as is)"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    return value
+
+
+def _string_dates_filter(fields: List[str]) -> dict:
+    return {"$or": [{field: {"$type": "string"}} for field in fields]}
+
+
+def _converted_fields(doc: dict, fields: List[str]) -> dict:
+    update = {}
+    for field in fields:
+        if "." in field:
+            array, key = field.split(".", 1)
+            items = doc.get(array) or []
+            if any(isinstance(item.get(key), str) for item in items):
+                update[array] = [{**item, key: to_bson_date(item.get(key))} for item in items]
+        elif isinstance(doc.get(field), str):
+            update[field] = to_bson_date(doc[field])
+    return update
+
+
+async def convert_string_dates(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Rewrite ISO string dates as native BSON dates, collection by collection
+
+    Returns:
+        dict: number of converted documents per collection
+    """
+    converted = {}
+    for collection, fields in DATE_FIELDS.items():
+        projection = {"_id": 1, **{field.split(".", 1)[0]: 1 for field in fields}}
+        cursor = db[collection].find(_string_dates_filter(fields), projection).batch_size(batch_size)
+        operations = []
+        count = 0
+        async for doc in cursor:
+            update = _converted_fields(doc, fields)
+            if not update:
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+            if len(operations) >= batch_size:
+                await db[collection].bulk_write(operations, ordered=False)
+                count += len(operations)
+                operations = []
+        if operations:
+            await db[collection].bulk_write(operations, ordered=False)
+            count += len(operations)
+        converted[collection] = count
+    return converted
@@ -0,0 +1,52 @@
+"""
+Sérialisation JSON rapide des grosses réponses (listes de courriers, statistiques)
+Par défaut FastAPI revalide chaque ligne contre le response_model puis la
+convertit avec jsonable_encoder avant json.dumps. Avec FAST_JSON=true, les
+endpoints concernés renvoient directement les documents MongoDB (déjà écrits
+via les modèles et filtrés par projection) sérialisés par orjson.
+Contrepartie : les champs absents des anciens documents sont omis au lieu de
+recevoir la valeur par défaut du modèle
+"""
+
+import logging
+import os
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+FAST_JSON = os.environ.get("FAST_JSON", "false").lower() == "true"
+
+if FAST_JSON and orjson is None:
+    logger.warning("FAST_JSON=true mais orjson n'est pas installé : sérialisation standard utilisée")
+    FAST_JSON = False
+
+
+def _default(value: Any) -> Any:
+    """Fallback for BSON types orjson does not know (ObjectId, Decimal128…)"""
+    return str(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, UTC datetimes written with a Z suffix like Pydantic"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def fast_response(content: Any) -> Any:
+    """
+    Wrap an endpoint payload in a FastJSONResponse when the fast path is enabled
+
+    Returning a Response makes FastAPI skip response_model validation; when
+    disabled the payload is returned unchanged and validated as usual.
+    """
+    if FAST_JSON:
+        return FastJSONResponse(content)
+    return content
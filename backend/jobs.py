@@ -0,0 +1,188 @@
+"""
+Exécution de tâches longues en arrière-plan (asyncio, dans le processus)
+L'état des tâches est persisté dans la collection jobs pour que n'importe
+quel replica puisse renvoyer leur progression. Chaque replica date
+régulièrement (heartbeat_at) les tâches qu'il exécute ; une tâche dont le
+battement s'est arrêté est marquée interrompue par le premier replica qui
+la remarque, quel que soit l'hôte qui l'exécutait
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+
+# Nombre maximal d'erreurs par ligne conservées dans le document de la tâche
+MAX_STORED_ERRORS = 1000
+
+HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "30"))
+# Au-delà, le processus qui exécutait la tâche est considéré arrêté
+STALE_AFTER_SECONDS = 3 * HEARTBEAT_SECONDS
+
+ACTIVE_STATUSES = ["pending", "running"]
+
+
+class JobContext:
+    """Handle given to a running job to publish its progress"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, job_id: str):
+        self.db = db
+        self.job_id = job_id
+
+    async def update(self, progress: dict, errors: Optional[list] = None) -> None:
+        now = datetime.now(timezone.utc)
+        update = {"progress": progress, "updated_at": now, "heartbeat_at": now}
+        if errors is not None:
+            update["errors"] = errors[:MAX_STORED_ERRORS]
+            update["error_count"] = len(errors)
+        await self.db[JOBS_COLLECTION].update_one({"id": self.job_id}, {"$set": update})
+
+
+JobFunction = Callable[[JobContext], Awaitable[dict]]
+
+
+class JobRunner:
+    """Run coroutines as background jobs and persist their lifecycle"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.host = socket.gethostname()
+        self._tasks: Set[asyncio.Task] = set()
+        # Tâches de ce processus, dont le battement est entretenu par _watch
+        self._active: Set[str] = set()
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def submit(self, kind: str, func: JobFunction, created_by: str, params: Optional[dict] = None) -> dict:
+        """Persist a pending job and schedule it on the event loop"""
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "status": "pending",
+            "params": params or {},
+            "progress": {},
+            "result": None,
+            "errors": [],
+            "error_count": 0,
+            "created_by": created_by,
+            "host": self.host,
+            "created_at": now,
+            "updated_at": now,
+            "heartbeat_at": now,
+            "started_at": None,
+            "finished_at": None,
+        }
+        await self.db[JOBS_COLLECTION].insert_one(job)
+        job.pop("_id", None)
+
+        self._active.add(job["id"])
+        task = asyncio.create_task(self._run(job["id"], func))
+        # Garder une référence forte : asyncio ne conserve que des références faibles
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._active.discard(job["id"]))
+        return job
+
+    async def _run(self, job_id: str, func: JobFunction) -> None:
+        collection = self.db[JOBS_COLLECTION]
+        await collection.update_one(
+            {"id": job_id},
+            {"$set": {"status": "running", "started_at": datetime.now(timezone.utc)}}
+        )
+        try:
+            result = await func(JobContext(self.db, job_id))
+            await collection.update_one(
+                {"id": job_id},
+                {"$set": {
+                    "status": "completed",
+                    "result": result,
+                    "finished_at": datetime.now(timezone.utc),
+                    "updated_at": datetime.now(timezone.utc),
+                }}
+            )
+        except asyncio.CancelledError:
+            await collection.update_one(
+                {"id": job_id},
+                {"$set": {"status": "interrupted", "finished_at": datetime.now(timezone.utc)}}
+            )
+            raise
+        except Exception as e:
+            logger.exception(f"Échec de la tâche {job_id}")
+            await collection.update_one(
+                {"id": job_id},
+                {"$set": {
+                    "status": "failed",
+                    "failure": str(e),
+                    "finished_at": datetime.now(timezone.utc),
+                    "updated_at": datetime.now(timezone.utc),
+                }}
+            )
+
+    async def heartbeat(self) -> None:
+        """Record that the jobs of this process are still alive"""
+        if not self._active:
+            return
+        await self.db[JOBS_COLLECTION].update_many(
+            {"id": {"$in": list(self._active)}, "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {"heartbeat_at": datetime.now(timezone.utc)}}
+        )
+
+    async def recover(self) -> int:
+        """Mark pending or running jobs whose heartbeat stopped as interrupted, whatever their host"""
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=STALE_AFTER_SECONDS)
+        result = await self.db[JOBS_COLLECTION].update_many(
+            {
+                "status": {"$in": ACTIVE_STATUSES},
+                "id": {"$nin": list(self._active)},
+                "$or": [
+                    {"heartbeat_at": {"$lt": stale}},
+                    # tâches créées avant l'introduction du battement
+                    {"heartbeat_at": {"$exists": False}, "updated_at": {"$lt": stale}},
+                ],
+            },
+            {"$set": {"status": "interrupted", "finished_at": now}}
+        )
+        return result.modified_count
+
+    async def start(self) -> None:
+        """Recover abandoned jobs, then keep beating and sweeping in the background"""
+        interrupted = await self.recover()
+        if interrupted:
+            logger.warning(f"{interrupted} tâche(s) interrompue(s) par l'arrêt d'un replica")
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        # Un replica redémarré rapidement retrouve ses anciennes tâches encore
+        # fraîches : elles ne sont interrompues qu'au balayage suivant
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await self.heartbeat()
+                interrupted = await self.recover()
+                if interrupted:
+                    logger.warning(f"{interrupted} tâche(s) interrompue(s) par l'arrêt d'un replica")
+            except Exception as e:
+                logger.error(f"Échec du suivi des tâches: {e}")
+
+    async def shutdown(self) -> None:
+        if self._watcher:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def get_job(db: AsyncIOMotorDatabase, job_id: str) -> Optional[dict]:
+    return await db[JOBS_COLLECTION].find_one({"id": job_id}, {"_id": 0})
@@ -0,0 +1,145 @@
+"""
+Synchronisation incrémentale de la liste des courriers
+Chaque écriture d'un courrier renseigne updated_at ; chaque suppression laisse
+une pierre tombale (mail_tombstones, purgée après TOMBSTONE_TTL_DAYS), de même
+qu'une écriture qui change sa visibilité (service, destinataires finaux) : la
+pierre tombale porte alors l'ancienne visibilité, pour que le courrier soit
+retiré des listes des utilisateurs qui ne le voient plus. Un jeton
+de changement opaque (même encodage que les curseurs de pagination) marque la
+position (date, id) atteinte par le client : il ne recharge ensuite que les
+courriers créés, modifiés ou supprimés depuis.
+Les écritures en cours au moment de la lecture pourraient recevoir une date
+antérieure au jeton renvoyé : seuls les changements plus vieux que
+CHANGES_SETTLE_SECONDS sont servis
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from pagination import decode_cursor, encode_cursor
+
+TOMBSTONES_COLLECTION = "mail_tombstones"
+TOMBSTONE_TTL_DAYS = 30
+
+CHANGES_SETTLE_SECONDS = float(os.environ.get("CHANGES_SETTLE_SECONDS", "2"))
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 2000
+
+# Champs conservés dans la pierre tombale : type et filtres de visibilité
+TOMBSTONE_FIELDS = ["type", "service_id", "service_ids", "final_recipient_ids", "final_recipient_emails"]
+TOMBSTONE_PROJECTION = {"_id": 0, "id": 1, **{field: 1 for field in TOMBSTONE_FIELDS}}
+
+
+def clamp_changes_limit(limit: Optional[int]) -> int:
+    """Bound the number of changes returned per call"""
+    if not limit or limit < 1:
+        return DEFAULT_CHANGES_LIMIT
+    return min(limit, MAX_CHANGES_LIMIT)
+
+
+async def record_tombstones(db: AsyncIOMotorDatabase, mails: List[dict]) -> None:
+    """Remember deleted mails, or the previous visibility of moved mails (fetched with TOMBSTONE_PROJECTION)"""
+    if not mails:
+        return
+    deleted_at = datetime.now(timezone.utc)
+    await db[TOMBSTONES_COLLECTION].insert_many(
+        [{"id": mail["id"], **{field: mail.get(field) for field in TOMBSTONE_FIELDS}, "deleted_at": deleted_at} for mail in mails],
+        ordered=False,
+    )
+
+
+def visibility_changed(before: dict, after: dict) -> bool:
+    """Whether a write changed one of the visibility filters of a mail"""
+    return any(before.get(field) != after.get(field) for field in TOMBSTONE_FIELDS)
+
+
+async def backfill_updated_at(db: AsyncIOMotorDatabase) -> None:
+    """Initialise updated_at to created_at on mails written before it existed"""
+    await db.mails.update_many({"updated_at": {"$exists": False}}, [{"$set": {"updated_at": "$created_at"}}])
+
+
+def _after(field: str, at: datetime, mail_id: str, upper: datetime) -> dict:
+    """Documents strictly after (at, mail_id) and strictly before upper"""
+    return {
+        "$or": [
+            {field: {"$gt": at, "$lt": upper}},
+            {field: at, "id": {"$gt": mail_id}},
+        ]
+    }
+
+
+async def fetch_changes(
+    db: AsyncIOMotorDatabase,
+    since: Optional[str],
+    limit: int,
+    projection: dict,
+    query: dict,
+) -> dict:
+    """
+    Mails changed and ids deleted (or no longer visible) since a change token, oldest first
+
+    Without a token nothing is returned but the current position, to be
+    taken before a full reload of the list.
+
+    Args:
+        since: token returned by a previous call
+        projection: projection of the changed mails
+        query: extra filter (type, visibility) applied to mails and tombstones
+
+    Returns:
+        dict: items, deleted ids (deleted mails and mails moved out of the
+        query), next_token and has_more
+
+    Raises:
+        HTTPException: 400 on a malformed token, 410 once its tombstones may have expired
+    """
+    now = datetime.now(timezone.utc)
+    upper = now - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    if not since:
+        return {"items": [], "deleted": [], "next_token": encode_cursor(upper, ""), "has_more": False}
+
+    at, mail_id = decode_cursor(since)
+    if at < now - timedelta(days=TOMBSTONE_TTL_DAYS):
+        raise HTTPException(status_code=410, detail="Change token expired, reload the full list")
+
+    mails = await db.mails.find(
+        {"$and": [_after("updated_at", at, mail_id, upper), query]},
+        {**projection, "updated_at": 1},
+    ).sort([("updated_at", 1), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+    tombstones = await db[TOMBSTONES_COLLECTION].find(
+        {"$and": [_after("deleted_at", at, mail_id, upper), query]},
+        {"_id": 0, "id": 1, "deleted_at": 1},
+    ).sort([("deleted_at", 1), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+
+    # Fusion des deux flux dans l'ordre (date, id) du jeton
+    events = sorted(
+        [(mail["updated_at"], mail["id"], mail) for mail in mails]
+        + [(tombstone["deleted_at"], tombstone["id"], None) for tombstone in tombstones],
+        key=lambda event: (event[0], event[1]),
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    if has_more:
+        next_token = encode_cursor(events[-1][0], events[-1][1])
+    else:
+        next_token = encode_cursor(upper, "")
+
+    # Un courrier dont la visibilité a changé mais qui reste visible n'est pas retiré
+    removed = {event_id for _, event_id, mail in events if mail is None}
+    if removed:
+        still_visible = await db.mails.find(
+            {"$and": [{"id": {"$in": list(removed)}}, query]}, {"_id": 0, "id": 1}
+        ).to_list(len(removed))
+        removed -= {mail["id"] for mail in still_visible}
+
+    return {
+        "items": [mail for _, _, mail in events if mail is not None],
+        "deleted": [event_id for _, event_id, mail in events if mail is None and event_id in removed],
+        "next_token": next_token,
+        "has_more": has_more,
+    }
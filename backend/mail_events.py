@@ -0,0 +1,211 @@
+"""
+Événements courriers poussés en temps réel (Server-Sent Events)
+Les routes d'écriture publient mail.created, mail.status_changed et
+mail.assigned sur un bus d'événements ; chaque connexion à
+GET /api/events/stream y est abonnée avec un filtre de visibilité.
+Le bus « memory » ne diffuse qu'aux clients du même processus ; le bus
+« mongodb » (EVENT_BUS_BACKEND=mongodb) insère les événements dans
+mail_events et chaque réplique suit le change stream de cette collection,
+ce qui demande un replica set MongoDB
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+MAIL_CREATED = "mail.created"
+MAIL_STATUS_CHANGED = "mail.status_changed"
+MAIL_ASSIGNED = "mail.assigned"
+# Envoyé à un abonné trop lent dont la file a débordé : il doit recharger
+RESYNC = "resync"
+
+EVENTS_COLLECTION = "mail_events"
+EVENT_TTL_SECONDS = 3600
+
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("SSE_QUEUE_SIZE", "100"))
+HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+WATCH_RETRY_SECONDS = 5
+# Code d'erreur MongoDB : point de reprise sorti de l'oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Champs du courrier joints à l'événement : affichage et filtres de visibilité
+EVENT_MAIL_FIELDS = [
+    "id", "type", "reference", "subject", "status", "message_type",
+    "service_id", "service_name", "service_ids", "final_recipient_ids", "final_recipient_emails",
+    "assigned_to_id", "assigned_to_name", "created_at",
+]
+
+
+def mail_event(kind: str, mail: dict, **extra) -> dict:
+    """Build an event carrying the listed fields of mail"""
+    return {
+        "id": str(uuid.uuid4()),
+        "type": kind,
+        "at": datetime.now(timezone.utc),
+        "mail": {field: mail.get(field) for field in EVENT_MAIL_FIELDS},
+        **extra,
+    }
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    return str(value)
+
+
+def format_sse(event: dict) -> str:
+    """Serialize an event as a Server-Sent Events message"""
+    data = json.dumps(event, default=_default, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class Subscription:
+    """Bounded queue of the events accepted for one connected client"""
+
+    def __init__(self, accept: Callable[[dict], bool]):
+        self.accept = accept
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event: dict) -> None:
+        if event["type"] != RESYNC and not self.accept(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent : vider la file plutôt que de bloquer le bus
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"id": str(uuid.uuid4()), "type": RESYNC, "at": datetime.now(timezone.utc)})
+
+
+class EventBus(ABC):
+    """Local fan-out to subscriptions; subclasses decide how published events reach every replica"""
+
+    name = "base"
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+
+    def subscribe(self, accept: Callable[[dict], bool]) -> Subscription:
+        subscription = Subscription(accept)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def dispatch(self, event: dict) -> None:
+        """Deliver an event to the subscriptions of this process"""
+        for subscription in list(self._subscriptions):
+            subscription.deliver(event)
+
+    @abstractmethod
+    async def publish(self, event: dict) -> None:
+        """Send an event to the subscriptions of every replica"""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class InMemoryEventBus(EventBus):
+    """Single-process bus: events only reach clients connected to the publishing replica"""
+
+    name = "memory"
+
+    async def publish(self, event: dict) -> None:
+        self.dispatch(event)
+
+
+class MongoEventBus(EventBus):
+    """Multi-replica bus: events go through mail_events and are read back from its change stream"""
+
+    name = "mongodb"
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        super().__init__()
+        self.collection = db[EVENTS_COLLECTION]
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+
+    async def publish(self, event: dict) -> None:
+        # Une panne du bus ne doit pas faire échouer l'écriture du courrier
+        try:
+            await self.collection.insert_one(dict(event))
+        except PyMongoError as e:
+            logger.warning(f"Événement {event['type']} non publié: {e}")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _watch(self) -> None:
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=self._resume_token) as stream:
+                    async for change in stream:
+                        self._resume_token = change["_id"]
+                        event = change["fullDocument"]
+                        event.pop("_id", None)
+                        self.dispatch(event)
+            except PyMongoError as e:
+                logger.warning(f"Change stream {EVENTS_COLLECTION} interrompu: {e}")
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self._resume_token = None
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+
+def create_event_bus(db: AsyncIOMotorDatabase) -> EventBus:
+    """Build the bus selected by EVENT_BUS_BACKEND (memory or mongodb)"""
+    backend = os.environ.get("EVENT_BUS_BACKEND", "memory").lower()
+    if backend == "memory":
+        return InMemoryEventBus()
+    if backend == "mongodb":
+        return MongoEventBus(db)
+    raise ValueError(f"Unknown EVENT_BUS_BACKEND: {backend}")
+
+
+async def sse_stream(bus: EventBus, accept: Callable[[dict], bool], is_disconnected: Callable) -> AsyncIterator[str]:
+    """
+    Messages of a subscription held for the lifetime of the response
+
+    Subscribing inside the generator guarantees the matching unsubscribe;
+    comments sent every HEARTBEAT_SECONDS keep proxies from closing the
+    idle connection.
+    """
+    subscription = bus.subscribe(accept)
+    try:
+        yield f"retry: {WATCH_RETRY_SECONDS * 1000}\n\n"
+        while not await is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        bus.unsubscribe(subscription)
@@ -0,0 +1,124 @@
+"""
+Export intégral des courriers en NDJSON ou CSV
+Les documents sont lus par un curseur asynchrone et écrits au fil de l'eau
+dans la réponse (par blocs d'environ CHUNK_SIZE octets) : la mémoire reste
+constante quel que soit le nombre de courriers. La compression gzip est
+faite à la volée avec zlib
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, List
+
+from fast_json import orjson
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+# Documents demandés à MongoDB par aller-retour
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+CHUNK_SIZE = 64 * 1024
+
+# Colonnes du CSV ; les listes sont jointes par LIST_SEPARATOR
+CSV_COLUMNS = [
+    "id", "reference", "type", "message_type", "status", "subject", "content",
+    "correspondent_id", "correspondent_name",
+    "service_id", "service_name", "service_names", "sub_service_name", "sub_service_names",
+    "assigned_to_id", "assigned_to_name", "final_recipient_emails",
+    "created_at", "opened_at", "opened_by_name",
+    "parent_mail_id", "parent_mail_reference",
+    "is_registered", "registered_number", "no_response_needed",
+    "attachment_count",
+]
+LIST_SEPARATOR = " | "
+
+
+def _iso(value: datetime) -> str:
+    """ISO 8601 date with a Z suffix for UTC, as written by Pydantic and orjson"""
+    return value.isoformat().replace("+00:00", "Z")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _iso(value)
+    return str(value)
+
+
+def _ndjson_line(doc: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(doc, default=str, option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(doc, default=_default, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return _iso(value)
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join("" if item is None else str(item) for item in value)
+    return value
+
+
+def _csv_row(doc: dict) -> List[Any]:
+    row = {**doc, "attachment_count": len(doc.get("attachments") or [])}
+    return [_csv_value(row.get(column)) for column in CSV_COLUMNS]
+
+
+async def ndjson_chunks(docs: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """One JSON document per line, grouped in chunks of about CHUNK_SIZE bytes"""
+    buffer = bytearray()
+    async for doc in docs:
+        buffer += _ndjson_line(doc)
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def csv_chunks(docs: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """CSV with a header row, UTF-8 with BOM so Excel detects the encoding"""
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(CSV_COLUMNS)
+    yield "\ufeff".encode("utf-8") + text.getvalue().encode("utf-8")
+    text.seek(0)
+    text.truncate()
+    async for doc in docs:
+        writer.writerow(_csv_row(doc))
+        if text.tell() >= CHUNK_SIZE:
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compress a byte stream into a single gzip member (wbits=31 writes the gzip header)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(docs: AsyncIterator[dict], format: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """Byte stream of docs in the given format (see EXPORT_FORMATS), optionally gzipped"""
+    chunks = csv_chunks(docs) if format == "csv" else ndjson_chunks(docs)
+    if compress:
+        return gzip_chunks(chunks)
+    return chunks
+
+
+def export_filename(format: str, compress: bool, now: datetime) -> str:
+    extension = EXPORT_FORMATS[format][1]
+    return f"courriers-{now.strftime('%Y%m%d-%H%M%S')}.{extension}" + (".gz" if compress else "")
@@ -0,0 +1,101 @@
+"""
+Recherche plein texte dans les courriers
+S'appuie sur l'index texte de la collection mails (objet, contenu, référence,
+numéro de recommandé, correspondant) ; les extraits renvoyés mettent en
+évidence les termes recherchés
+"""
+
+import html
+import re
+from typing import List, Optional
+
+from correspondent_search import normalize
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SNIPPET_LENGTH = 160
+
+# Champs indexés et leur poids dans le score de pertinence
+TEXT_INDEX_WEIGHTS = {
+    "reference": 10,
+    "registered_number": 10,
+    "subject": 5,
+    "correspondent_name": 3,
+    "content": 1,
+}
+
+HIGHLIGHT_FIELDS = ["subject", "reference", "registered_number", "correspondent_name"]
+
+# Chaque lettre accepte ses variantes accentuées courantes
+_ACCENT_CLASSES = {
+    "a": "[aàâäáã]",
+    "c": "[cç]",
+    "e": "[eéèêë]",
+    "i": "[iîïíì]",
+    "o": "[oôöóò]",
+    "u": "[uùûüú]",
+    "y": "[yÿ]",
+}
+
+
+def query_terms(query: str) -> List[str]:
+    return [term for term in re.findall(r"\w+", query, re.UNICODE) if len(term) > 1]
+
+
+def _term_pattern(terms: List[str]) -> Optional[re.Pattern]:
+    """Accent-insensitive pattern matching any query term as a word prefix"""
+    if not terms:
+        return None
+    alternatives = []
+    for term in terms:
+        folded = normalize(term)
+        if not folded:
+            continue
+        alternatives.append("".join(_ACCENT_CLASSES.get(char, re.escape(char)) for char in folded))
+    if not alternatives:
+        return None
+    return re.compile(r"\b(" + "|".join(alternatives) + r")\w*", re.IGNORECASE | re.UNICODE)
+
+
+def highlight(text: Optional[str], pattern: Optional[re.Pattern]) -> Optional[str]:
+    """HTML-escape text and wrap matches in <mark>; None when nothing matches"""
+    if not text or pattern is None:
+        return None
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    if last == 0:
+        return None
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def snippet(text: Optional[str], pattern: Optional[re.Pattern], length: int = SNIPPET_LENGTH) -> Optional[str]:
+    """Highlighted excerpt of a long text centred on the first match"""
+    if not text or pattern is None:
+        return None
+    match = pattern.search(text)
+    if not match:
+        return None
+    start = max(match.start() - length // 3, 0)
+    end = min(start + length, len(text))
+    excerpt = highlight(text[start:end], pattern)
+    if excerpt is None:
+        return None
+    return ("…" if start > 0 else "") + excerpt + ("…" if end < len(text) else "")
+
+
+def build_highlights(mail: dict, query: str) -> dict:
+    pattern = _term_pattern(query_terms(query))
+    highlights = {}
+    for field in HIGHLIGHT_FIELDS:
+        marked = highlight(mail.get(field), pattern)
+        if marked:
+            highlights[field] = marked
+    content = snippet(mail.get("content"), pattern)
+    if content:
+        highlights["content"] = content
+    return highlights
@@ -0,0 +1,118 @@
+"""
+Métriques Prometheus du backend (exposées sur /metrics)
+- requêtes HTTP : nombre, latence et taille des réponses par modèle de route
+  (/api/mails/{mail_id} et non l'URL réelle, pour borner la cardinalité)
+- commandes MongoDB : durée par collection et par commande, via un
+  CommandListener pymongo passé au client Motor
+Les compteurs sont propres au processus (un seul worker uvicorn par conteneur)
+"""
+
+import time
+from typing import Dict, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+MONGO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "HTTP response body size", ["method", "route"], buckets=SIZE_BUCKETS
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command duration", ["collection", "command"], buckets=MONGO_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed", ["collection", "command"]
+)
+
+# Commandes de gestion de connexion, sans intérêt pour l'analyse des performances
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+
+def route_template(scope: Scope) -> str:
+    """Path template of the matched route, or a fixed label for unmatched paths"""
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording count, latency and size of HTTP responses"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            method = scope["method"]
+            route = route_template(scope)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_RESPONSE_SIZE.labels(method, route).observe(size)
+
+
+def command_target(command_name: str, command: dict) -> str:
+    """Collection targeted by a command document ("-" for database-level commands)"""
+    if command_name == "getMore":
+        return command.get("collection", "-")
+    target = command.get(command_name)
+    return target if isinstance(target, str) else "-"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Time every MongoDB command per collection and command name"""
+
+    def __init__(self):
+        # Les événements succeeded/failed ne portent pas la commande : retenir
+        # la collection visée au démarrage, par connexion et request_id
+        self._targets: Dict[Tuple, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._targets[(event.connection_id, event.request_id)] = command_target(event.command_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._targets.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._targets.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+            MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
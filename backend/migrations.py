@@ -0,0 +1,235 @@
+"""
+Gestion versionnée du schéma MongoDB (index et migrations de données)
+Chaque version déclare les index qu'elle introduit et, éventuellement, une
+fonction de migration des données. Les versions appliquées sont enregistrées
+dans la collection _migrations
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from attachment_store import move_inline_attachments
+from correspondent_search import backfill_search_fields
+from date_codec import convert_string_dates
+from jobs import JOBS_COLLECTION
+from mail_changes import TOMBSTONE_TTL_DAYS, TOMBSTONES_COLLECTION, backfill_updated_at
+from mail_events import EVENT_TTL_SECONDS, EVENTS_COLLECTION
+from mail_search import TEXT_INDEX_WEIGHTS
+from sequences import find_duplicate_references, seed_reference_counters
+from stats_counters import STATS_COLLECTION, rebuild_counters
+from threads import drop_related_mails
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "_migrations"
+
+
+@dataclass
+class IndexSpec:
+    collection: str
+    keys: list
+    name: str
+    version: int
+    options: dict = field(default_factory=dict)
+
+    def model(self) -> IndexModel:
+        return IndexModel(self.keys, name=self.name, **self.options)
+
+
+async def _seed_references(db: AsyncIOMotorDatabase) -> None:
+    await seed_reference_counters(db)
+    # Les références officielles ne sont jamais réattribuées automatiquement :
+    # les doublons sont corrigés par un opérateur avant l'index unique
+    duplicates = await find_duplicate_references(db)
+    if duplicates:
+        raise RuntimeError(
+            f"Duplicate mail references: {duplicates}; review them with "
+            "scripts/migrate.py --renumber-duplicates --dry-run before renumbering"
+        )
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    run: Optional[Callable[[AsyncIOMotorDatabase], Awaitable[None]]] = None
+
+
+# Index couvrant les formes de requêtes de server.py
+INDEXES: List[IndexSpec] = [
+    # mails : accès direct, fil de réponses, liste paginée et filtres de visibilité
+    IndexSpec("mails", [("id", ASCENDING)], "id_unique", 1, {"unique": True}),
+    IndexSpec("mails", [("created_at", DESCENDING), ("id", DESCENDING)], "created_at_id", 1),
+    IndexSpec("mails", [("parent_mail_id", ASCENDING)], "parent_mail_id", 1, {"sparse": True}),
+    IndexSpec("mails", [("service_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "service_created_at", 1),
+    IndexSpec("mails", [("service_ids", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "service_ids_created_at", 1),
+    IndexSpec("mails", [("final_recipient_ids", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "final_recipient_ids_created_at", 1),
+    IndexSpec("mails", [("final_recipient_emails", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "final_recipient_emails_created_at", 1),
+    IndexSpec("mails", [("type", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "type_created_at", 1),
+    IndexSpec("mails", [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "status_created_at", 1),
+    IndexSpec("mails", [("correspondent_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "correspondent_created_at", 1),
+    IndexSpec("mails", [("assigned_to_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "assigned_to_created_at", 1),
+    IndexSpec("mails", [("opened_by_id", ASCENDING)], "opened_by_id", 1, {"sparse": True}),
+    # users : connexion, liaison Azure AD, annuaire par service
+    IndexSpec("users", [("id", ASCENDING)], "id_unique", 1, {"unique": True}),
+    IndexSpec("users", [("email", ASCENDING)], "email", 1),
+    IndexSpec("users", [("azure_id", ASCENDING)], "azure_id", 1, {"sparse": True}),
+    IndexSpec("users", [("service_id", ASCENDING)], "service_id", 1),
+    # services et correspondants
+    IndexSpec("services", [("id", ASCENDING)], "id_unique", 1, {"unique": True}),
+    IndexSpec("services", [("archived", ASCENDING)], "archived", 1),
+    IndexSpec("correspondents", [("id", ASCENDING)], "id_unique", 1, {"unique": True}),
+    IndexSpec("correspondents", [("name", ASCENDING)], "name", 1),
+    # compteurs matérialisés des statistiques
+    IndexSpec(
+        STATS_COLLECTION,
+        [("service_id", ASCENDING), ("type", ASCENDING), ("status", ASCENDING), ("message_type", ASCENDING), ("day", ASCENDING)],
+        "bucket_unique", 2, {"unique": True},
+    ),
+    IndexSpec(STATS_COLLECTION, [("day", ASCENDING)], "day", 2),
+    # unicité des références attribuées par le compteur annuel
+    IndexSpec("mails", [("reference", ASCENDING)], "reference_unique", 3, {"unique": True}),
+    # tâches d'arrière-plan, purgées 30 jours après leur création
+    IndexSpec(JOBS_COLLECTION, [("id", ASCENDING)], "id_unique", 4, {"unique": True}),
+    IndexSpec(JOBS_COLLECTION, [("created_at", ASCENDING)], "created_at_ttl", 4, {"expireAfterSeconds": 30 * 24 * 3600}),
+    # autocomplétion des correspondants (préfixes normalisés)
+    IndexSpec("correspondents", [("search_tokens", ASCENDING)], "search_tokens", 5),
+    IndexSpec("correspondents", [("name_normalized", ASCENDING)], "name_normalized", 5),
+    # recherche plein texte dans les courriers
+    IndexSpec(
+        "mails",
+        [(field, TEXT) for field in TEXT_INDEX_WEIGHTS],
+        "mail_text", 6,
+        {"weights": TEXT_INDEX_WEIGHTS, "default_language": "french", "language_override": "text_language"},
+    ),
+    # synchronisation incrémentale : changements par date, pierres tombales purgées
+    IndexSpec("mails", [("updated_at", ASCENDING), ("id", ASCENDING)], "updated_at_id", 9),
+    IndexSpec(
+        TOMBSTONES_COLLECTION, [("deleted_at", ASCENDING)], "deleted_at_ttl", 9,
+        {"expireAfterSeconds": TOMBSTONE_TTL_DAYS * 24 * 3600},
+    ),
+    # événements temps réel du bus mongodb, conservés une heure
+    IndexSpec(EVENTS_COLLECTION, [("at", ASCENDING)], "at_ttl", 10, {"expireAfterSeconds": EVENT_TTL_SECONDS}),
+]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create initial indexes"),
+    Migration(2, "Build mail_stats counters", rebuild_counters),
+    Migration(3, "Seed reference counters and enforce unique references", _seed_references),
+    Migration(4, "Create background jobs indexes"),
+    Migration(5, "Backfill correspondent search tokens", backfill_search_fields),
+    Migration(6, "Create mail full-text index"),
+    Migration(7, "Drop denormalized related_mails (threads resolved with $graphLookup)", drop_related_mails),
+    Migration(8, "Convert ISO string dates to native BSON dates", convert_string_dates),
+    Migration(9, "Backfill mail updated_at and create change tracking indexes", backfill_updated_at),
+    Migration(10, "Create mail events TTL index"),
+    Migration(11, "Move inline base64 attachments to the attachment store", move_inline_attachments),
+]
+
+
+def latest_version() -> int:
+    return max(migration.version for migration in MIGRATIONS)
+
+
+async def applied_versions(db: AsyncIOMotorDatabase) -> List[int]:
+    docs = await db[MIGRATIONS_COLLECTION].find({"status": "applied"}, {"_id": 1}).to_list(None)
+    return sorted(doc["_id"] for doc in docs)
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase, specs: List[IndexSpec]) -> None:
+    """Create the given indexes, grouped by collection (no-op for existing ones)"""
+    by_collection: Dict[str, List[IndexModel]] = {}
+    for spec in specs:
+        by_collection.setdefault(spec.collection, []).append(spec.model())
+    for collection, models in by_collection.items():
+        await db[collection].create_indexes(models)
+
+
+async def apply_migration(db: AsyncIOMotorDatabase, migration: Migration) -> bool:
+    """
+    Apply one migration version
+
+    The version document is claimed first so that concurrent replicas
+    starting together do not run the same migration twice.
+
+    Returns:
+        bool: True if the migration was applied by this call
+    """
+    collection = db[MIGRATIONS_COLLECTION]
+    try:
+        await collection.insert_one({
+            "_id": migration.version,
+            "description": migration.description,
+            "status": "running",
+            "started_at": datetime.now(timezone.utc),
+        })
+    except DuplicateKeyError:
+        return False
+
+    try:
+        # Données d'abord : un index unique peut dépendre d'un nettoyage préalable
+        if migration.run:
+            await migration.run(db)
+        await ensure_indexes(db, [spec for spec in INDEXES if spec.version == migration.version])
+    except Exception:
+        await collection.delete_one({"_id": migration.version})
+        raise
+
+    await collection.update_one(
+        {"_id": migration.version},
+        {"$set": {"status": "applied", "applied_at": datetime.now(timezone.utc)}}
+    )
+    return True
+
+
+async def run_migrations(db: AsyncIOMotorDatabase) -> List[int]:
+    """
+    Apply every pending migration in version order
+
+    Stops at the first failure, or at a version claimed by another replica,
+    so later versions never run on top of an incomplete schema.
+
+    Returns:
+        list: versions applied by this call
+    """
+    done = set(await applied_versions(db))
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        logger.info(f"Migration {migration.version}: {migration.description}")
+        if not await apply_migration(db, migration):
+            # Version prise par une autre réplique (ou restée "running") : ne pas
+            # appliquer les suivantes sur un schéma incomplet
+            logger.warning(f"Migration {migration.version} en cours ailleurs : migrations suivantes reportées")
+            break
+        applied.append(migration.version)
+    return applied
+
+
+async def index_report(db: AsyncIOMotorDatabase) -> dict:
+    """Compare declared indexes with the ones present in the database"""
+    existing: Dict[str, dict] = {}
+    for collection in sorted({spec.collection for spec in INDEXES}):
+        existing[collection] = await db[collection].index_information()
+
+    missing = [
+        {"collection": spec.collection, "name": spec.name, "keys": spec.keys, "version": spec.version}
+        for spec in INDEXES
+        if spec.name not in existing[spec.collection]
+    ]
+    versions = await applied_versions(db)
+
+    return {
+        "schema_version": versions[-1] if versions else 0,
+        "latest_version": latest_version(),
+        "pending_versions": [m.version for m in MIGRATIONS if m.version not in versions],
+        "missing_indexes": missing,
+        "indexes": {collection: sorted(info) for collection, info in existing.items()},
+    }
@@ -0,0 +1,268 @@
+"""
+Modèles Pydantic des documents et des échanges de l'API
+Séparés de server.py pour que les modules de traitement (import CSV…)
+puissent construire des documents sans importer l'application FastAPI
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class User(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    email: str
+    name: str
+    password: Optional[str] = None  # Optional pour les utilisateurs Azure AD
+    role: str = "user"  # "user" or "admin"
+    service_id: Optional[str] = None  # Service assigned to user for permissions
+    sub_service_id: Optional[str] = None  # Sub-service assigned to user
+    azure_id: Optional[str] = None  # Azure AD Object ID
+    last_login: Optional[datetime] = None  # Dernière connexion
+    is_deleted: bool = False  # Marqueur de suppression RGPD
+    deleted_at: Optional[datetime] = None  # Date de suppression
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class UserCreate(BaseModel):
+    email: str
+    name: str
+    password: Optional[str] = None  # Optional pour les utilisateurs Azure AD
+    role: str = "user"
+    service_id: Optional[str] = None
+    sub_service_id: Optional[str] = None
+    azure_id: Optional[str] = None
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class LoginResponse(BaseModel):
+    token: str
+    user: dict
+
+class SubService(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+
+class Service(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    sub_services: List[SubService] = []
+    archived: bool = False
+    archived_at: Optional[datetime] = None
+    archived_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ServiceCreate(BaseModel):
+    name: str
+    sub_services: List[SubService] = []
+
+class Correspondent(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    email: Optional[str] = None
+    organization: Optional[str] = None
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class CorrespondentCreate(BaseModel):
+    name: str
+    email: Optional[str] = None
+    organization: Optional[str] = None
+    phone: Optional[str] = None
+    address: Optional[str] = None
+
+class Attachment(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    filename: str
+    content_type: str
+    size: int
+    sha256: Optional[str] = None
+    storage: Optional[str] = None  # "gridfs" or "filesystem" (None = legacy inline data)
+    storage_id: Optional[str] = None
+    data: Optional[str] = None  # Legacy: base64 encoded content stored in the mail
+
+class WorkflowStep(BaseModel):
+    status: str  # "recu", "traitement", "traite", "archive"
+    user_id: str
+    user_name: str
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    comment: Optional[str] = None
+
+class Mail(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str  # "entrant" or "sortant"
+    reference: str  # Auto-generated reference number
+    subject: str
+    content: str
+    correspondent_id: str
+    correspondent_name: str
+    service_id: str  # Primary service (pour compatibilité)
+    service_name: str  # Primary service name (pour compatibilité)
+    service_ids: Optional[List[str]] = None  # Multiple destinataires
+    service_names: Optional[List[str]] = None  # Multiple destinataires names
+    sub_service_id: Optional[str] = None  # Primary sub-service (pour compatibilité)
+    sub_service_name: Optional[str] = None  # Primary sub-service name (pour compatibilité)
+    sub_service_ids: Optional[List[str]] = None  # Multiple sous-services pour chaque destinataire
+    sub_service_names: Optional[List[str]] = None  # Multiple sous-services names
+    final_recipient_ids: Optional[List[str]] = None  # Utilisateurs destinataires finaux
+    final_recipient_emails: Optional[List[str]] = None  # Emails des destinataires finaux
+    assigned_to_id: Optional[str] = None
+    assigned_to_name: Optional[str] = None
+    status: str = "recu"  # "recu", "traitement", "traite", "archive"
+    workflow: List[WorkflowStep] = []
+    attachments: List[Attachment] = []
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    opened_by_id: Optional[str] = None
+    opened_by_name: Optional[str] = None
+    opened_at: Optional[datetime] = None
+    parent_mail_id: Optional[str] = None  # For replies
+    parent_mail_reference: Optional[str] = None
+    related_mails: List[dict] = []  # Thread around the mail, computed on read (not stored)
+    # New fields
+    message_type: str = "courrier"  # "courrier", "email", "accueil_physique", "accueil_telephonique", "colis"
+    is_registered: bool = False  # Recommandé
+    registered_number: Optional[str] = None  # Numéro de recommandé ou code-barres
+    no_response_needed: bool = False  # Ne nécessite pas de réponse
+    version: int = 0  # Incremented on every update (optimistic concurrency)
+    updated_at: Optional[datetime] = None  # Last write, drives GET /mails/changes
+
+class MailPage(BaseModel):
+    items: List[Mail]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+class MailSummary(BaseModel):
+    """Lightweight mail row for list views (no content, workflow or attachments)"""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    type: str
+    reference: str
+    subject: str
+    correspondent_id: str
+    correspondent_name: str
+    service_id: str
+    service_name: str
+    sub_service_name: Optional[str] = None
+    assigned_to_id: Optional[str] = None
+    assigned_to_name: Optional[str] = None
+    status: str = "recu"
+    message_type: str = "courrier"
+    is_registered: bool = False
+    parent_mail_id: Optional[str] = None
+    attachment_count: int = 0
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class MailSummaryPage(BaseModel):
+    items: List[MailSummary]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+class MailChanges(BaseModel):
+    """Mails created or updated and ids deleted since a change token"""
+    items: List[MailSummary]
+    deleted: List[str]
+    next_token: str
+    has_more: bool = False
+
+class MailSearchHit(MailSummary):
+    score: float
+    highlights: dict = {}
+
+class MailSearchResult(BaseModel):
+    items: List[MailSearchHit]
+    total: int
+
+class ThreadNode(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    reference: str
+    type: str
+    subject: str
+    status: str = "recu"
+    created_at: datetime
+    parent_mail_id: Optional[str] = None
+    depth: int = 0
+
+class MailThread(BaseModel):
+    mail: ThreadNode
+    ancestors: List[ThreadNode] = []  # Du courrier initial jusqu'au parent direct
+    descendants: List[ThreadNode] = []  # Réponses à toute profondeur, par date
+
+class MailCreate(BaseModel):
+    type: str
+    subject: str
+    content: str
+    correspondent_id: str
+    correspondent_name: str
+    service_id: str  # Primary service (pour compatibilité)
+    service_name: str  # Primary service name (pour compatibilité)
+    service_ids: Optional[List[str]] = None  # Multiple destinataires
+    service_names: Optional[List[str]] = None  # Multiple destinataires names
+    sub_service_id: Optional[str] = None  # Primary sub-service (pour compatibilité)
+    sub_service_name: Optional[str] = None  # Primary sub-service name (pour compatibilité)
+    sub_service_ids: Optional[List[str]] = None  # Multiple sous-services
+    sub_service_names: Optional[List[str]] = None  # Multiple sous-services names
+    final_recipient_ids: Optional[List[str]] = None  # Utilisateurs destinataires finaux
+    final_recipient_emails: Optional[List[str]] = None  # Emails des destinataires finaux
+    parent_mail_id: Optional[str] = None
+    parent_mail_reference: Optional[str] = None
+    message_type: str = "courrier"
+    is_registered: bool = False
+    registered_number: Optional[str] = None
+    no_response_needed: bool = False
+
+class MailUpdate(BaseModel):
+    subject: Optional[str] = None
+    content: Optional[str] = None
+    correspondent_id: Optional[str] = None
+    correspondent_name: Optional[str] = None
+    service_id: Optional[str] = None
+    service_name: Optional[str] = None
+    service_ids: Optional[List[str]] = None
+    service_names: Optional[List[str]] = None
+    sub_service_id: Optional[str] = None
+    sub_service_name: Optional[str] = None
+    sub_service_ids: Optional[List[str]] = None
+    sub_service_names: Optional[List[str]] = None
+    final_recipient_ids: Optional[List[str]] = None
+    final_recipient_emails: Optional[List[str]] = None
+    message_type: Optional[str] = None
+    is_registered: Optional[bool] = None
+    registered_number: Optional[str] = None
+    status: Optional[str] = None
+    assigned_to_id: Optional[str] = None
+    assigned_to_name: Optional[str] = None
+    comment: Optional[str] = None
+    expected_version: Optional[int] = None  # Reject with 409 if the mail changed since this version
+
+MAX_BATCH_MAILS = 1000
+
+class MailBatchRequest(BaseModel):
+    ids: List[str]
+    operation: str  # "status", "assign", "reassign_service", "delete"
+    status: Optional[str] = None  # operation "status"
+    comment: Optional[str] = None  # workflow comment for operation "status"
+    assigned_to_id: Optional[str] = None  # operation "assign"
+    assigned_to_name: Optional[str] = None
+    service_id: Optional[str] = None  # operation "reassign_service"
+    service_name: Optional[str] = None
+    sub_service_id: Optional[str] = None
+    sub_service_name: Optional[str] = None
+
+class MailBatchItem(BaseModel):
+    id: str
+    outcome: str  # "updated", "deleted", "unchanged", "not_found", "conflict"
+
+class MailBatchResult(BaseModel):
+    operation: str
+    results: List[MailBatchItem]
+    counts: dict
@@ -0,0 +1,84 @@
+"""
+Pagination par curseur (keyset) pour les listes de courriers
+Le curseur est opaque pour le client : il encode la clé de tri (created_at, id)
+du dernier élément renvoyé
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from date_codec import to_bson_date
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Ordre de tri stable : created_at puis id pour départager les égalités
+MAIL_SORT = [("created_at", -1), ("id", -1)]
+
+
+def encode_cursor(created_at, mail_id: str) -> str:
+    """Encode the sort key of the last returned mail as an opaque cursor"""
+    if hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    raw = json.dumps({"c": created_at, "i": mail_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at = to_bson_date(data["c"])
+        if not isinstance(created_at, datetime):
+            raise ValueError("invalid date")
+        return created_at, data["i"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(cursor: Optional[str]) -> Optional[dict]:
+    """Return the Mongo filter selecting mails strictly after the cursor"""
+    if not cursor:
+        return None
+    created_at, mail_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": mail_id}},
+        ]
+    }
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Bound the requested page size"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+async def fetch_page(collection, query: dict, limit: int, projection: Optional[dict] = None):
+    """
+    Fetch one page of documents sorted by MAIL_SORT
+
+    Reads limit + 1 documents to know whether a next page exists without
+    an extra count query.
+
+    Returns:
+        tuple: (documents, next_cursor, has_more)
+    """
+    projection = projection if projection is not None else {"_id": 0}
+    docs = await collection.find(query, projection).sort(MAIL_SORT).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = None
+    if has_more and docs:
+        last = docs[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    return docs, next_cursor, has_more
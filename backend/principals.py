@@ -0,0 +1,115 @@
+"""
+Résolution de l'utilisateur authentifié (principal) à chaque requête
+Les tokens JWT sont décodés une seule fois puis conservés jusqu'à leur
+expiration ; les fiches utilisateur sont gardées quelques secondes en cache
+pour que le rôle et le service appliqués soient ceux de la base (et non ceux
+figés dans le token) sans requête MongoDB à chaque appel. Une mutation
+d'utilisateur n'écarte que les fiches de cet utilisateur (et les annuaires
+mis en cache) ; sur les autres replicas la TTL borne la durée pendant
+laquelle un ancien rôle peut encore s'appliquer
+"""
+
+import os
+import time
+from typing import Optional
+
+import jwt
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from cache import TTLCache, reference_cache
+
+TOKEN_CACHE_SIZE = int(os.environ.get("PRINCIPAL_TOKEN_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.environ.get("PRINCIPAL_USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.environ.get("PRINCIPAL_USER_CACHE_SIZE", "1024"))
+
+# Champs de la fiche utilisateur qui priment sur le contenu du token
+FRESH_CLAIMS = ("email", "name", "role", "service_id")
+
+USER_PROJECTION = {"_id": 0, "password": 0}
+
+token_cache = TTLCache(ttl=3600, maxsize=TOKEN_CACHE_SIZE)
+user_cache = TTLCache(ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE)
+
+
+def decode_token(token: str, secret: str, algorithm: str) -> dict:
+    """
+    Validate a JWT, reusing the decoded payload until the token expires
+
+    Raises:
+        HTTPException: 401 if the token is expired or invalid
+    """
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    try:
+        payload = jwt.decode(token, secret, algorithms=[algorithm])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    ttl = payload["exp"] - time.time() if "exp" in payload else None
+    if ttl is None or ttl > 0:
+        token_cache.set(token, payload, ttl)
+    return payload
+
+
+async def _cached_user(db: AsyncIOMotorDatabase, key: str, query: dict) -> Optional[dict]:
+    user = user_cache.get(key)
+    if user is None:
+        # Les absences ne sont pas mises en cache : un compte peut être créé
+        # entre-temps par un autre replica
+        user = await db.users.find_one(query, USER_PROJECTION)
+        if user is None:
+            return None
+        user_cache.set(key, user)
+    return dict(user)
+
+
+async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> Optional[dict]:
+    """Return a copy of the user record (without password), served from the cache when fresh"""
+    return await _cached_user(db, f"id:{user_id}", {"id": user_id})
+
+
+async def get_user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[dict]:
+    """Return a copy of the user record (without password), served from the cache when fresh"""
+    return await _cached_user(db, f"email:{email}", {"email": email})
+
+
+async def resolve_principal(db: AsyncIOMotorDatabase, payload: dict) -> dict:
+    """
+    Merge the current user record into a decoded token payload
+
+    Tokens of users unknown to the database are returned unchanged.
+
+    Raises:
+        HTTPException: 401 if the account has been deleted since the token was issued
+    """
+    user = await get_user_by_id(db, payload.get("sub", ""))
+    principal = dict(payload)
+    if user is None:
+        return principal
+    if user.get("is_deleted"):
+        raise HTTPException(status_code=401, detail="User account disabled")
+    for claim in FRESH_CLAIMS:
+        principal[claim] = user.get(claim)
+    principal["role"] = principal["role"] or "user"
+    return principal
+
+
+def invalidate_user(user_id: Optional[str] = None, email: Optional[str] = None) -> None:
+    """
+    Forget cached user directories and the records of one user after it was mutated
+
+    The records are matched by id or email, so entries cached under either key
+    are dropped. Without any argument, every cached record is forgotten.
+    """
+    reference_cache.invalidate("users:")
+    if user_id is None and email is None:
+        user_cache.invalidate()
+        return
+    user_cache.discard_where(
+        lambda user: (user_id is not None and user.get("id") == user_id)
+        or (email is not None and user.get("email") == email)
+    )
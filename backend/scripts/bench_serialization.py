@@ -0,0 +1,132 @@
+"""
+Coût de sérialisation par ligne des listes de courriers
+Compare, sans base de données, le chemin standard de FastAPI (validation
+contre le response_model, jsonable_encoder puis json.dumps) au chemin rapide
+FAST_JSON (orjson sur les documents bruts) et à un TypeAdapter Pydantic seul
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark import REPORT_DIR, git_revision, load_app  # noqa: E402
+from seed_benchmark import BENCH_DB_NAME, STATUSES, SUBJECT_TOPICS, random_text  # noqa: E402
+
+
+def sample_mails(count: int, rng: random.Random) -> list:
+    """Full mail documents as returned by MongoDB with MAIL_PROJECTION"""
+    now = datetime.now(timezone.utc)
+    mails = []
+    for index in range(count):
+        created_at = now - timedelta(days=rng.uniform(0, 365))
+        status = rng.choice(STATUSES)
+        mails.append({
+            "id": f"mail-{index}",
+            "type": rng.choice(["entrant", "sortant"]),
+            "reference": f"MAIL-2025-{index:05d}",
+            "subject": rng.choice(SUBJECT_TOPICS).capitalize(),
+            "content": random_text(rng, 300, 2000),
+            "correspondent_id": f"corr-{index % 500}",
+            "correspondent_name": f"Correspondant {index % 500}",
+            "service_id": "service-1",
+            "service_name": "Urbanisme",
+            "service_ids": ["service-1"],
+            "service_names": ["Urbanisme"],
+            "assigned_to_id": "user-1",
+            "assigned_to_name": "Jean Dupont",
+            "status": status,
+            "workflow": [
+                {"status": step, "user_id": "user-1", "user_name": "Jean Dupont",
+                 "timestamp": created_at + timedelta(hours=position), "comment": None}
+                for position, step in enumerate(STATUSES[:STATUSES.index(status) + 1])
+            ],
+            "attachments": [
+                {"id": f"att-{index}-{n}", "filename": f"piece-{n}.pdf", "content_type": "application/pdf",
+                 "size": rng.randint(10_000, 2_000_000), "sha256": "0" * 64, "storage": "gridfs",
+                 "storage_id": f"att-{index}-{n}"}
+                for n in range(rng.randint(0, 2))
+            ],
+            "created_at": created_at,
+            "opened_by_id": "user-1",
+            "opened_by_name": "Jean Dupont",
+            "opened_at": created_at + timedelta(hours=1),
+            "parent_mail_id": None,
+            "message_type": "courrier",
+            "is_registered": False,
+            "registered_number": None,
+            "no_response_needed": False,
+            "version": 1,
+        })
+    return mails
+
+
+def time_per_row(func, payload: dict, rows: int, repeat: int) -> float:
+    """Best-of-repeat duration of func(payload), in microseconds per row"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / rows * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût de sérialisation des listes de courriers")
+    parser.add_argument("--rows", default="50,500,5000", help="Tailles de liste, séparées par des virgules")
+    parser.add_argument("--repeat", type=int, default=5, help="Répétitions (meilleur temps conservé)")
+    parser.add_argument("--output-dir", type=Path, default=REPORT_DIR, help="Dossier du rapport JSON")
+    args = parser.parse_args()
+
+    server = load_app(BENCH_DB_NAME, mongomock=False)
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from fast_json import FastJSONResponse, orjson
+
+    adapter = TypeAdapter(server.MailPage)
+
+    def fastapi_default(payload):
+        # Chemin de FastAPI 0.110 : validation, sérialisation Python, jsonable_encoder, json.dumps
+        validated = adapter.validate_python(payload)
+        content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def type_adapter(payload):
+        return adapter.dump_json(adapter.validate_python(payload))
+
+    def fast_json(payload):
+        return FastJSONResponse(payload).body
+
+    strategies = {"fastapi_default": fastapi_default, "type_adapter": type_adapter}
+    if orjson is not None:
+        strategies["fast_json"] = fast_json
+    else:
+        print("⚠️  orjson n'est pas installé : chemin FAST_JSON non mesuré")
+
+    rng = random.Random(42)
+    results = {}
+    print(f"{'lignes':>8} " + " ".join(f"{name:>16}" for name in strategies) + "   (µs/ligne)")
+    for rows in [int(value) for value in args.rows.split(",")]:
+        payload = {"items": sample_mails(rows, rng), "next_cursor": None, "has_more": False}
+        results[rows] = {name: round(time_per_row(func, payload, rows, args.repeat), 2) for name, func in strategies.items()}
+        print(f"{rows:>8} " + " ".join(f"{results[rows][name]:>16.2f}" for name in strategies))
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "unit": "microseconds_per_row",
+        "results": results,
+    }
+    commit = (report["git"]["commit"] or "nogit")[:8]
+    path = args.output_dir / f"serialization-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{commit}.json"
+    path.write_text(json.dumps(report, indent=2))
+    print(f"\n✅ Rapport écrit : {path}")
+
+if __name__ == "__main__":
+    main()
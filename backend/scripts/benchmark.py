@@ -0,0 +1,378 @@
+"""
+Benchmark des principaux endpoints de l'API
+L'application est exécutée dans le processus (httpx.ASGITransport, sans
+serveur HTTP ni réseau) contre un mongod local, ou contre mongomock avec
+--mongomock pour une vérification rapide du harnais (les mesures ne sont alors
+pas représentatives et certains scénarios, comme la recherche plein texte, ne
+sont pas supportés). Chaque exécution écrit un rapport JSON dans
+test_reports/benchmarks, comparable à un rapport de référence (--baseline)
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from seed_benchmark import (  # noqa: E402
+    BENCH_ADMIN, BENCH_DB_NAME, FIRST_NAMES, LAST_NAMES, SUBJECT_TOPICS,
+    add_seed_arguments, seed, seed_options,
+)
+
+load_dotenv()
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+REPORT_DIR = ROOT_DIR / "test_reports" / "benchmarks"
+
+SCENARIOS = ["list", "list_filtered", "detail", "thread", "create", "stats", "stats_advanced", "search", "correspondents", "import"]
+
+# Écart toléré par rapport à la référence avant de signaler une régression (%)
+DEFAULT_TOLERANCE = 10.0
+
+RequestFactory = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+def load_app(db_name: str, mongomock: bool):
+    """Import server.py against the benchmark database"""
+    os.environ["DB_NAME"] = db_name
+    os.environ["RUN_MIGRATIONS"] = "false"
+    for name in ("AZURE_TENANT_ID", "AZURE_CLIENT_ID", "AZURE_SCOPE"):
+        os.environ.setdefault(name, "benchmark")
+    if mongomock:
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("❌ mongomock-motor n'est pas installé : pip install mongomock-motor")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+        # GridFS n'est pas disponible avec mongomock
+        os.environ["ATTACHMENT_STORAGE"] = "filesystem"
+        os.environ.setdefault("ATTACHMENT_DIR", tempfile.mkdtemp(prefix="bench-attachments-"))
+
+    import server
+    return server
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float, sample_error: Optional[str] = None) -> dict:
+    values = sorted(latency * 1000 for latency in latencies)
+    summary = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_seconds, 1) if wall_seconds else 0.0,
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+    if sample_error:
+        summary["sample_error"] = sample_error
+    return summary
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: RequestFactory,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed_value: int,
+) -> dict:
+    """Send requests with a fixed number of concurrent workers and time each response"""
+    rng = random.Random(seed_value)
+    for _ in range(warmup):
+        await make_request(client, rng)
+
+    latencies: List[float] = []
+    errors = 0
+    sample_error = None
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, sample_error
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, rng)
+                failed = response.status_code >= 400
+                detail = f"HTTP {response.status_code}: {response.text[:200]}" if failed else None
+            except Exception as e:
+                failed, detail = True, repr(e)
+            if failed:
+                errors += 1
+                sample_error = sample_error or detail
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, sample_error)
+
+
+def import_csv(rows: int, rng: random.Random) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["nom", "prenom", "adresse_mail", "titre_message", "statut", "type"])
+    writer.writeheader()
+    for index in range(rows):
+        writer.writerow({
+            "nom": rng.choice(LAST_NAMES),
+            "prenom": rng.choice(FIRST_NAMES),
+            "adresse_mail": f"import{rng.randint(0, rows)}@exemple.fr",
+            "titre_message": f"{rng.choice(SUBJECT_TOPICS).capitalize()} {index}",
+            "statut": rng.choice(["en_cours", "traite", "archive"]),
+            "type": rng.choice(["entrant", "sortant"]),
+        })
+    return buffer.getvalue().encode("utf-8")
+
+
+async def run_import(client: httpx.AsyncClient, rows: int, runs: int, seed_value: int) -> dict:
+    """Time complete CSV imports, from upload until the background job finishes"""
+    rng = random.Random(seed_value)
+    latencies: List[float] = []
+    errors = 0
+    sample_error = None
+    rows_per_second = []
+    started = time.perf_counter()
+
+    for _ in range(runs):
+        payload = import_csv(rows, rng)
+        start = time.perf_counter()
+        response = await client.post("/api/import/csv", files={"file": ("bench.csv", payload, "text/csv")})
+        if response.status_code != 202:
+            errors += 1
+            sample_error = sample_error or f"HTTP {response.status_code}: {response.text[:200]}"
+            continue
+        job_id = response.json()["id"]
+        while True:
+            job = (await client.get(f"/api/jobs/{job_id}")).json()
+            if job["status"] not in ("pending", "running"):
+                break
+            await asyncio.sleep(0.05)
+        if job["status"] != "completed":
+            errors += 1
+            sample_error = sample_error or f"job {job['status']}: {job.get('failure')}"
+            continue
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        rows_per_second.append(rows / elapsed)
+
+    summary = summarize(latencies, errors, time.perf_counter() - started, sample_error)
+    summary["rows_per_import"] = rows
+    summary["rows_per_second"] = round(sum(rows_per_second) / len(rows_per_second), 1) if rows_per_second else 0.0
+    return summary
+
+
+async def build_scenarios(db) -> Dict[str, RequestFactory]:
+    """Request factories drawing their parameters from the seeded data"""
+    mail_ids = [doc["id"] for doc in await db.mails.find({}, {"_id": 0, "id": 1}).limit(2000).to_list(2000)]
+    services = await db.services.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)
+    correspondents = await db.correspondents.find({}, {"_id": 0, "id": 1, "name": 1}).limit(500).to_list(500)
+    if not mail_ids or not services or not correspondents:
+        sys.exit("❌ Base de benchmark vide : lancez scripts/seed_benchmark.py ou utilisez --seed-data")
+    statuses = ["recu", "traitement", "traite", "archive"]
+    search_words = [word for topic in SUBJECT_TOPICS for word in topic.split() if len(word) > 3]
+
+    async def list_mails(client, rng):
+        return await client.get("/api/mails/summary", params={"limit": 50})
+
+    async def list_filtered(client, rng):
+        return await client.get("/api/mails/summary", params={
+            "limit": 50, "service_id": rng.choice(services)["id"], "status": rng.choice(statuses),
+        })
+
+    async def detail(client, rng):
+        return await client.get(f"/api/mails/{rng.choice(mail_ids)}")
+
+    async def thread(client, rng):
+        return await client.get(f"/api/mails/{rng.choice(mail_ids)}/thread")
+
+    async def create(client, rng):
+        service = rng.choice(services)
+        correspondent = rng.choice(correspondents)
+        return await client.post("/api/mails", json={
+            "type": "entrant",
+            "subject": f"{rng.choice(SUBJECT_TOPICS).capitalize()} - benchmark",
+            "content": "Courrier créé par le benchmark. " * rng.randint(5, 50),
+            "correspondent_id": correspondent["id"],
+            "correspondent_name": correspondent["name"],
+            "service_id": service["id"],
+            "service_name": service["name"],
+        })
+
+    async def stats(client, rng):
+        return await client.get("/api/stats")
+
+    async def stats_advanced(client, rng):
+        return await client.get("/api/stats/advanced", params={"period": rng.choice(["week", "month", "year", "all"])})
+
+    async def search(client, rng):
+        return await client.get("/api/mails/search", params={"q": rng.choice(search_words)})
+
+    async def search_correspondents(client, rng):
+        name = rng.choice(correspondents)["name"]
+        return await client.get("/api/correspondents", params={"search": name[:rng.randint(2, 5)]})
+
+    return {
+        "list": list_mails,
+        "list_filtered": list_filtered,
+        "detail": detail,
+        "thread": thread,
+        "create": create,
+        "stats": stats,
+        "stats_advanced": stats_advanced,
+        "search": search,
+        "correspondents": search_correspondents,
+    }
+
+
+def git_revision() -> dict:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Describe scenarios whose p95 latency or throughput regressed beyond tolerance (%)"""
+    regressions = []
+    print(f"\n📊 Comparaison avec {baseline.get('git', {}).get('commit') or 'la référence'}")
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        p95_delta = _delta(current["p95_ms"], previous["p95_ms"])
+        rps_delta = _delta(current["throughput_rps"], previous["throughput_rps"])
+        print(f"  {name:<16} p95 {previous['p95_ms']:>9.2f} → {current['p95_ms']:>9.2f} ms ({p95_delta:+.1f}%)"
+              f"   débit {previous['throughput_rps']:>8.1f} → {current['throughput_rps']:>8.1f} req/s ({rps_delta:+.1f}%)")
+        if p95_delta > tolerance:
+            regressions.append(f"{name}: p95 +{p95_delta:.1f}%")
+        if rps_delta < -tolerance:
+            regressions.append(f"{name}: débit {rps_delta:.1f}%")
+    return regressions
+
+
+def _delta(current: float, previous: float) -> float:
+    return (current - previous) / previous * 100 if previous else 0.0
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    server = load_app(args.db, args.mongomock)
+    db = server.db
+
+    dataset = None
+    if args.seed_data:
+        print(f"🌱 Génération du jeu de données ({args.mails} courriers)...")
+        dataset = await seed(db, use_gridfs=not args.mongomock, **seed_options(args))
+
+    headers = {"Authorization": f"Bearer {server.create_token({**BENCH_ADMIN, 'service_id': None})}"}
+    transport = httpx.ASGITransport(app=server.app)
+    selected = args.scenarios.split(",") if args.scenarios else SCENARIOS
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"❌ Scénarios inconnus : {', '.join(sorted(unknown))}")
+
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=None) as client:
+        factories = await build_scenarios(db)
+        for position, name in enumerate(selected):
+            print(f"⏱️  {name}...")
+            if name == "import":
+                results[name] = await run_import(client, args.import_rows, args.import_runs, args.seed + position)
+            else:
+                results[name] = await run_scenario(
+                    client, factories[name], args.requests, args.concurrency, args.warmup, args.seed + position
+                )
+            summary = results[name]
+            print(f"   p50 {summary['p50_ms']} ms | p95 {summary['p95_ms']} ms | p99 {summary['p99_ms']} ms"
+                  f" | {summary['throughput_rps']} req/s | erreurs {summary['errors']}")
+
+    await server.job_runner.shutdown()
+    server.client.close()
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": "mongomock" if args.mongomock else "mongod",
+        "database": args.db,
+        "dataset": dataset or {"seeded": False},
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "import_rows": args.import_rows,
+            "import_runs": args.import_runs,
+        },
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des endpoints de l'API")
+    parser.add_argument("--db", default=BENCH_DB_NAME, help="Base de benchmark")
+    parser.add_argument("--mongomock", action="store_true", help="Utiliser mongomock au lieu d'un mongod (implique --seed-data)")
+    parser.add_argument("--seed-data", action="store_true", help="Regénérer le jeu de données avant les mesures")
+    parser.add_argument("--scenarios", help=f"Scénarios séparés par des virgules (défaut : {','.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes mesurées par scénario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requêtes simultanées")
+    parser.add_argument("--warmup", type=int, default=10, help="Requêtes de chauffe non mesurées")
+    parser.add_argument("--import-rows", type=int, default=2000, help="Lignes par import CSV")
+    parser.add_argument("--import-runs", type=int, default=3, help="Nombre d'imports CSV mesurés")
+    parser.add_argument("--output-dir", type=Path, default=REPORT_DIR, help="Dossier des rapports JSON")
+    parser.add_argument("--baseline", type=Path, help="Rapport JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Régression tolérée (%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Code de sortie 1 en cas de régression")
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+    args.seed_data = args.seed_data or args.mongomock
+
+    if args.db == os.environ.get("DB_NAME"):
+        sys.exit(f"❌ {args.db} est la base de l'application : choisissez une base de benchmark (--db)")
+
+    report = asyncio.run(benchmark(args))
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    commit = (report["git"]["commit"] or "nogit")[:8]
+    path = args.output_dir / f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{commit}.json"
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\n✅ Rapport écrit : {path}")
+
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print("⚠️  Régressions : " + ", ".join(regressions))
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("✅ Aucune régression au-delà de la tolérance")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import sys
 from datetime import datetime, timezone
 from dotenv import load_dotenv
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from correspondent_search import search_fields  # noqa: E402
 
 load_dotenv()
 
@@ -26,14 +32,14 @@ async def init_database():
                 {"id": "sub-1-3", "name": "Espaces Verts"}
             ],
             "archived": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-2",
             "name": "État Civil",
             "sub_services": [],
             "archived": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-3",
@@ -43,21 +49,21 @@ async def init_database():
                 {"id": "sub-3-2", "name": "Budget"}
             ],
             "archived": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-4",
             "name": "Ressources Humaines",
             "sub_services": [],
             "archived": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-5",
             "name": "Communication",
             "sub_services": [],
             "archived": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     
@@ -78,7 +84,7 @@ async def init_database():
             "phone": "0123456789",
             "address": "12 Rue de la République, 95880 Enghien-les-Bains",
             "organization": None,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-2",
@@ -87,7 +93,7 @@ async def init_database():
             "phone": "0145678901",
             "address": "45 Avenue de la Liberté, 95880 Enghien-les-Bains",
             "organization": "Association Locale",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-3",
@@ -96,12 +102,14 @@ async def init_database():
             "phone": "0167890123",
             "address": "8 Place du Marché, 95880 Enghien-les-Bains",
             "organization": None,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     
     existing_correspondents = await db.correspondents.count_documents({})
     if existing_correspondents == 0:
+        for correspondent in correspondents_data:
+            correspondent.update(search_fields(correspondent))
         await db.correspondents.insert_many(correspondents_data)
         print(f"✅ Correspondants créés : {len(correspondents_data)}")
     else:
@@ -53,7 +53,7 @@ async def link_azure_account():
             "$set": {
                 "azure_id": azure_oid,
                 "id": azure_oid,  # Utiliser l'Azure ID comme ID principal
-                "last_login": datetime.now(timezone.utc).isoformat()
+                "last_login": datetime.now(timezone.utc)
             }
         }
     )
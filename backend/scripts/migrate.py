@@ -0,0 +1,81 @@
+import asyncio
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from migrations import MIGRATIONS_COLLECTION, index_report, run_migrations  # noqa: E402
+from sequences import renumber_duplicate_references, seed_reference_counters  # noqa: E402
+
+load_dotenv()
+
+async def renumber_duplicates(db, dry_run: bool):
+    """Give fresh references to mails sharing one with an older mail (blocks migration 3)"""
+    if not dry_run:
+        await seed_reference_counters(db)
+    renumbered = await renumber_duplicate_references(db, dry_run=dry_run)
+    for mail in renumbered:
+        target = mail['reference'] or "(nouvelle référence)"
+        print(f"   - {mail['id']}: {mail['previous_reference']} -> {target}")
+    if not renumbered:
+        print("ℹ️  Aucune référence en double")
+    elif dry_run:
+        print(f"🔍 {len(renumbered)} courrier(s) seraient renumérotés (relancer sans --dry-run pour appliquer)")
+    else:
+        print(f"✅ {len(renumbered)} courrier(s) renumérotés, ancienne référence conservée dans previous_reference")
+
+async def migrate(status_only: bool, release: int = None, renumber: bool = False, dry_run: bool = False):
+    """Apply pending schema migrations or print the current schema status"""
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    
+    try:
+        if release is not None:
+            # Libère une migration restée bloquée à l'état "running" (arrêt brutal)
+            result = await db[MIGRATIONS_COLLECTION].delete_one({"_id": release, "status": "running"})
+            print(f"🔓 Migration {release} libérée: {result.deleted_count} document(s)")
+            return
+        
+        if renumber:
+            await renumber_duplicates(db, dry_run)
+            return
+        
+        if not status_only:
+            applied = await run_migrations(db)
+            if applied:
+                print(f"✅ Migrations appliquées : {applied}")
+            else:
+                print("ℹ️  Aucune migration en attente")
+        
+        report = await index_report(db)
+        print(f"Version du schéma : {report['schema_version']} / {report['latest_version']}")
+        if report['pending_versions']:
+            print(f"⚠️  Versions en attente : {report['pending_versions']}")
+        if report['missing_indexes']:
+            print("⚠️  Index manquants :")
+            for index in report['missing_indexes']:
+                print(f"   - {index['collection']}.{index['name']} {index['keys']}")
+        else:
+            print("✅ Tous les index déclarés sont présents")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrations du schéma MongoDB")
+    parser.add_argument("--status", action="store_true", help="Afficher l'état sans appliquer")
+    parser.add_argument("--release", type=int, help="Libérer une migration bloquée à l'état running")
+    parser.add_argument(
+        "--renumber-duplicates", action="store_true",
+        help="Attribuer une nouvelle référence aux courriers en double (le plus ancien garde la sienne)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Avec --renumber-duplicates : lister sans modifier")
+    args = parser.parse_args()
+    if args.dry_run and not args.renumber_duplicates:
+        parser.error("--dry-run requires --renumber-duplicates")
+    asyncio.run(migrate(args.status, args.release, args.renumber_duplicates, args.dry_run))
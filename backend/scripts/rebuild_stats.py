@@ -0,0 +1,28 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stats_counters import rebuild_counters  # noqa: E402
+
+load_dotenv()
+
+async def rebuild_stats():
+    """Recompute the mail_stats counters from the mails collection"""
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    
+    try:
+        buckets = await rebuild_counters(db)
+        print(f"✅ Compteurs statistiques reconstruits : {buckets} bucket(s)")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_stats())
@@ -0,0 +1,284 @@
+"""
+Jeu de données de benchmark : services, utilisateurs, correspondants,
+courriers (tailles réalistes, fils de réponses) et pièces jointes
+Génération déterministe (--seed) pour comparer des mesures entre commits.
+Écrit par défaut dans la base BENCH_DB_NAME (mail_manager_bench), jamais
+dans DB_NAME, pour ne pas polluer les données de l'application
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from starlette.datastructures import Headers, UploadFile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from attachment_store import GridFSAttachmentStore  # noqa: E402
+from correspondent_search import search_fields  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from sequences import allocate_block  # noqa: E402
+from stats_counters import rebuild_counters  # noqa: E402
+
+load_dotenv()
+
+BENCH_DB_NAME = os.environ.get("BENCH_DB_NAME", "mail_manager_bench")
+
+# Compte administrateur utilisé par les scénarios du benchmark
+BENCH_ADMIN = {"id": "bench-admin", "email": "bench-admin@mairie.fr", "name": "Admin Benchmark", "role": "admin"}
+
+STATUSES = ["recu", "traitement", "traite", "archive"]
+STATUS_WEIGHTS = [30, 25, 30, 15]
+MESSAGE_TYPES = ["courrier", "email", "accueil_physique", "accueil_telephonique", "colis"]
+MESSAGE_TYPE_WEIGHTS = [50, 30, 8, 10, 2]
+
+SERVICE_NAMES = [
+    "Urbanisme", "État civil", "Ressources humaines", "Finances", "Services techniques",
+    "Affaires scolaires", "Culture", "Sports", "Action sociale", "Police municipale",
+    "Communication", "Environnement", "Voirie", "Élections", "Cimetières",
+]
+FIRST_NAMES = ["Jean", "Marie", "Pierre", "Sophie", "Luc", "Hélène", "François", "Chloé", "Éric", "Amélie", "Noël", "Zoé"]
+LAST_NAMES = ["Dupont", "Martin", "Bernard", "Lefèvre", "Moreau", "Girard", "Dubois", "Roux", "Fournier", "Mercier"]
+ORGANIZATIONS = ["", "", "", "SARL Bâtiment", "Association des Parents", "Préfecture", "Conseil départemental", "Cabinet Notarial"]
+SUBJECT_TOPICS = [
+    "permis de construire", "demande de subvention", "réclamation voirie", "inscription scolaire",
+    "acte de naissance", "réservation de salle", "facture", "candidature spontanée", "nuisances sonores",
+    "déclaration préalable", "concession funéraire", "éclairage public", "marché public", "recensement",
+]
+WORDS = (
+    "madame monsieur maire demande dossier pièce jointe réponse délai mairie service courrier "
+    "concernant objet suite rendez-vous document justificatif adresse parcelle travaux autorisation "
+    "subvention association convention règlement paiement facture relance urgent information"
+).split()
+
+
+def random_text(rng: random.Random, min_chars: int, max_chars: int) -> str:
+    target = rng.randint(min_chars, max_chars)
+    words = []
+    length = 0
+    while length < target:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words).capitalize() + "."
+
+
+async def _save_attachment(store: GridFSAttachmentStore, rng: random.Random, size_kb: int) -> dict:
+    attachment_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    filename = f"piece-{attachment_id[:8]}.pdf"
+    data = rng.randbytes(rng.randint(size_kb // 2, size_kb * 2) * 1024)
+    upload = UploadFile(io.BytesIO(data), filename=filename, headers=Headers({"content-type": "application/pdf"}))
+    storage_id, size, sha256 = await store.save(attachment_id, upload)
+    return {
+        "id": attachment_id,
+        "filename": filename,
+        "content_type": "application/pdf",
+        "size": size,
+        "sha256": sha256,
+        "storage": store.name,
+        "storage_id": storage_id,
+    }
+
+
+async def seed(
+    db: AsyncIOMotorDatabase,
+    mails: int = 10000,
+    correspondents: int = 2000,
+    services: int = 10,
+    users: int = 30,
+    attachment_ratio: float = 0.1,
+    attachment_kb: int = 64,
+    reply_ratio: float = 0.15,
+    days: int = 365,
+    seed_value: int = 42,
+    batch_size: int = 1000,
+    use_gridfs: bool = True,
+) -> dict:
+    """
+    Drop and regenerate the benchmark dataset in db
+
+    Returns:
+        dict: counts of generated documents and the elapsed time
+    """
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+
+    for collection in ["mails", "users", "services", "correspondents", "counters", "mail_stats", "_migrations", "jobs", "mail_tombstones"]:
+        await db[collection].drop()
+    await db["attachments.files"].drop()
+    await db["attachments.chunks"].drop()
+    await run_migrations(db)
+
+    service_docs = []
+    for index in range(services):
+        name = SERVICE_NAMES[index % len(SERVICE_NAMES)] + ("" if index < len(SERVICE_NAMES) else f" {index}")
+        service_docs.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": name,
+            "sub_services": [{"id": str(uuid.UUID(int=rng.getrandbits(128))), "name": f"{name} - pôle {n + 1}"} for n in range(rng.randint(0, 3))],
+            "archived": False,
+            "archived_at": None,
+            "created_at": now - timedelta(days=days),
+        })
+    await db.services.insert_many(service_docs)
+
+    user_docs = [{**BENCH_ADMIN, "password": None, "service_id": None, "created_at": now}]
+    for index in range(users):
+        service = rng.choice(service_docs)
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        user_docs.append({
+            "id": f"bench-user-{index}",
+            "email": f"bench-user-{index}@mairie.fr",
+            "name": name,
+            "password": None,
+            "role": "user",
+            "service_id": service["id"],
+            "created_at": now - timedelta(days=days),
+        })
+    await db.users.insert_many(user_docs)
+
+    correspondent_docs = []
+    for index in range(correspondents):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}"
+        doc = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": name,
+            "email": f"correspondant{index}@exemple.fr" if rng.random() < 0.7 else None,
+            "organization": rng.choice(ORGANIZATIONS) or None,
+            "phone": f"0{rng.randint(100000000, 999999999)}" if rng.random() < 0.5 else None,
+            "address": f"{rng.randint(1, 200)} rue {rng.choice(LAST_NAMES)}" if rng.random() < 0.6 else None,
+            "created_at": now - timedelta(days=rng.uniform(0, days)),
+        }
+        doc.update(search_fields(doc))
+        correspondent_docs.append(doc)
+    for start in range(0, len(correspondent_docs), batch_size):
+        await db.correspondents.insert_many(correspondent_docs[start:start + batch_size])
+
+    store = GridFSAttachmentStore(db) if use_gridfs else None
+    workers = [user for user in user_docs if user["role"] == "user"] or user_docs
+    created_ids = []
+    attachments_created = 0
+
+    for start in range(0, mails, batch_size):
+        count = min(batch_size, mails - start)
+        references = await allocate_block(db, count)
+        batch = []
+        for reference in references:
+            service = rng.choice(service_docs)
+            correspondent = rng.choice(correspondent_docs)
+            status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+            created_at = now - timedelta(days=rng.uniform(0, days))
+            assignee = rng.choice(workers) if status != "recu" or rng.random() < 0.3 else None
+            is_registered = rng.random() < 0.1
+            parent_id = rng.choice(created_ids) if created_ids and rng.random() < reply_ratio else None
+
+            attachments = []
+            if store is not None and rng.random() < attachment_ratio:
+                for _ in range(rng.randint(1, 3)):
+                    attachments.append(await _save_attachment(store, rng, attachment_kb))
+                attachments_created += len(attachments)
+
+            mail_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            batch.append({
+                "id": mail_id,
+                "type": "sortant" if parent_id or rng.random() < 0.3 else "entrant",
+                "reference": reference,
+                "subject": f"{rng.choice(SUBJECT_TOPICS).capitalize()} - {correspondent['name']}",
+                "content": random_text(rng, 300, 4000),
+                "correspondent_id": correspondent["id"],
+                "correspondent_name": correspondent["name"],
+                "service_id": service["id"],
+                "service_name": service["name"],
+                "service_ids": [service["id"]],
+                "service_names": [service["name"]],
+                "assigned_to_id": assignee["id"] if assignee else None,
+                "assigned_to_name": assignee["name"] if assignee else None,
+                "status": status,
+                "workflow": [
+                    {
+                        "status": step,
+                        "user_id": BENCH_ADMIN["id"],
+                        "user_name": BENCH_ADMIN["name"],
+                        "timestamp": created_at + timedelta(hours=6 * position),
+                        "comment": None,
+                    }
+                    for position, step in enumerate(STATUSES[:STATUSES.index(status) + 1])
+                ],
+                "attachments": attachments,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "parent_mail_id": parent_id,
+                "message_type": rng.choices(MESSAGE_TYPES, MESSAGE_TYPE_WEIGHTS)[0],
+                "is_registered": is_registered,
+                "registered_number": f"1A{rng.randint(10**10, 10**11 - 1)}" if is_registered else None,
+                "no_response_needed": status == "archive" and rng.random() < 0.5,
+                "version": 0,
+            })
+            created_ids.append(mail_id)
+        await db.mails.insert_many(batch, ordered=False)
+
+    buckets = await rebuild_counters(db)
+    return {
+        "services": len(service_docs),
+        "users": len(user_docs),
+        "correspondents": len(correspondent_docs),
+        "mails": mails,
+        "attachments": attachments_created,
+        "stats_buckets": buckets,
+        "duration_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--mails", type=int, default=10000, help="Nombre de courriers")
+    parser.add_argument("--correspondents", type=int, default=2000, help="Nombre de correspondants")
+    parser.add_argument("--services", type=int, default=10, help="Nombre de services")
+    parser.add_argument("--users", type=int, default=30, help="Nombre d'utilisateurs")
+    parser.add_argument("--attachment-ratio", type=float, default=0.1, help="Part des courriers avec pièces jointes")
+    parser.add_argument("--attachment-kb", type=int, default=64, help="Taille moyenne d'une pièce jointe (Ko)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur aléatoire")
+
+
+def seed_options(args: argparse.Namespace) -> dict:
+    return {
+        "mails": args.mails,
+        "correspondents": args.correspondents,
+        "services": args.services,
+        "users": args.users,
+        "attachment_ratio": args.attachment_ratio,
+        "attachment_kb": args.attachment_kb,
+        "seed_value": args.seed,
+    }
+
+
+async def main(args: argparse.Namespace):
+    """Regenerate the benchmark database"""
+    if args.db == os.environ.get('DB_NAME') and not args.force:
+        sys.exit(f"❌ {args.db} est la base de l'application : utilisez --force pour la remettre à zéro")
+    
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[args.db]
+
+    try:
+        print(f"🌱 Génération du jeu de benchmark dans {args.db}...")
+        counts = await seed(db, **seed_options(args))
+        print(f"✅ Jeu de benchmark généré : {counts}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Générer le jeu de données de benchmark")
+    parser.add_argument("--db", default=BENCH_DB_NAME, help="Base cible (remise à zéro)")
+    parser.add_argument("--force", action="store_true", help="Autoriser la remise à zéro de DB_NAME")
+    add_seed_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
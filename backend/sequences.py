@@ -0,0 +1,139 @@
+"""
+Allocation atomique des numéros de référence des courriers
+Un compteur par année dans la collection counters, incrémenté avec
+find_one_and_update($inc) : O(1), sans doublon quel que soit le nombre de replicas
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+COUNTERS_COLLECTION = "counters"
+REFERENCE_PREFIX = "MAIL"
+
+
+def _counter_id(year: int) -> str:
+    return f"mail_reference:{year}"
+
+
+def format_reference(year: int, number: int) -> str:
+    return f"{REFERENCE_PREFIX}-{year}-{number:05d}"
+
+
+async def allocate_block(db: AsyncIOMotorDatabase, size: int, year: Optional[int] = None) -> List[str]:
+    """
+    Reserve `size` consecutive references in one round trip
+
+    Used by bulk imports; references of an abandoned block are simply skipped.
+    """
+    if size < 1:
+        return []
+    year = year or datetime.now(timezone.utc).year
+    counter = await db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": _counter_id(year)},
+        {"$inc": {"seq": size}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    last = counter["seq"]
+    return [format_reference(year, number) for number in range(last - size + 1, last + 1)]
+
+
+async def allocate_reference(db: AsyncIOMotorDatabase, year: Optional[int] = None) -> str:
+    """Reserve the next reference of the (current) year"""
+    return (await allocate_block(db, 1, year))[0]
+
+
+async def seed_reference_counters(db: AsyncIOMotorDatabase) -> None:
+    """
+    Align yearly counters with the highest reference already stored
+
+    $max keeps the operation idempotent and safe while allocations happen.
+    """
+    rows = await db.mails.aggregate([
+        {"$match": {"reference": {"$regex": f"^{REFERENCE_PREFIX}-[0-9]{{4}}-[0-9]+$"}}},
+        {"$group": {
+            "_id": {"$substrCP": ["$reference", len(REFERENCE_PREFIX) + 1, 4]},
+            "max_number": {"$max": {"$convert": {
+                "input": {"$substrCP": ["$reference", len(REFERENCE_PREFIX) + 6, 20]},
+                "to": "long",
+                "onError": 0,
+            }}},
+        }},
+    ]).to_list(None)
+
+    for row in rows:
+        await db[COUNTERS_COLLECTION].update_one(
+            {"_id": _counter_id(int(row["_id"]))},
+            {"$max": {"seq": row["max_number"]}},
+            upsert=True,
+        )
+
+
+async def find_duplicate_references(db: AsyncIOMotorDatabase, limit: int = 20) -> List[str]:
+    rows = await db.mails.aggregate([
+        {"$group": {"_id": "$reference", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ], allowDiskUse=True).to_list(None)
+    return [row["_id"] for row in rows]
+
+
+def _year_of(created_at) -> int:
+    """Year of a stored creation date (datetime or, before migration 8, ISO string)"""
+    if isinstance(created_at, datetime):
+        return created_at.year
+    if isinstance(created_at, str) and created_at[:4].isdigit():
+        return int(created_at[:4])
+    return datetime.now(timezone.utc).year
+
+
+async def renumber_duplicate_references(db: AsyncIOMotorDatabase, dry_run: bool = False) -> List[Dict[str, Optional[str]]]:
+    """
+    Give a fresh reference to every mail sharing its reference with an older one
+
+    The oldest mail (created_at, then id) keeps the reference; the others get
+    the next number of their creation year and keep the old value in
+    previous_reference. Mails without reference are all renumbered. Counters
+    must be seeded first so that fresh numbers never collide. Run explicitly
+    by an operator (scripts/migrate.py --renumber-duplicates), never by a migration.
+
+    Args:
+        dry_run: only list the mails that would be renumbered, without
+            allocating numbers nor writing
+
+    Returns:
+        list: {"id", "previous_reference", "reference"} of each renumbered
+        mail (reference is None in a dry run)
+    """
+    rows = await db.mails.aggregate([
+        {"$sort": {"created_at": 1, "id": 1}},
+        {"$group": {
+            "_id": "$reference",
+            "count": {"$sum": 1},
+            "mails": {"$push": {"id": "$id", "created_at": "$created_at"}},
+        }},
+        {"$match": {"$or": [{"count": {"$gt": 1}}, {"_id": None}]}},
+    ], allowDiskUse=True).to_list(None)
+
+    renumbered = []
+    for row in rows:
+        reference = row["_id"]
+        mails = row["mails"] if reference is None else row["mails"][1:]
+        for mail in mails:
+            if dry_run:
+                renumbered.append({"id": mail["id"], "previous_reference": reference, "reference": None})
+                continue
+            new_reference = await allocate_reference(db, _year_of(mail.get("created_at")))
+            await db.mails.update_one(
+                {"id": mail["id"], "reference": reference},
+                {"$set": {
+                    "reference": new_reference,
+                    "previous_reference": reference,
+                    "updated_at": datetime.now(timezone.utc),
+                }},
+            )
+            renumbered.append({"id": mail["id"], "previous_reference": reference, "reference": new_reference})
+    return renumbered
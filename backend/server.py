@@ -1,33 +1,117 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Depends, Header, Security
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Depends, Header, Security, Request
+from fastapi.responses import StreamingResponse
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import List, Optional
 import uuid
+from collections import Counter
 from datetime import datetime, timezone, timedelta
 import jwt
 import base64
+from urllib.parse import quote
 from fastapi_azure_auth import SingleTenantAzureAuthorizationCodeBearer
 from fastapi_azure_auth.user import User as AzureUser
 from azure_config import settings
 from azure_auth import get_current_user_azure, require_admin_azure
+from pagination import MAIL_SORT, clamp_page_size, fetch_page, keyset_filter
+from date_codec import to_bson_date
+from models import (
+    MAX_BATCH_MAILS, Attachment, Correspondent, CorrespondentCreate, LoginRequest, LoginResponse, Mail,
+    MailBatchItem, MailBatchRequest, MailBatchResult, MailChanges, MailCreate, MailPage, MailSearchResult,
+    MailSummaryPage, MailThread, MailUpdate, Service, ServiceCreate, User, UserCreate, WorkflowStep,
+)
+from fast_json import fast_response
+from mail_changes import TOMBSTONE_PROJECTION, clamp_changes_limit, fetch_changes, record_tombstones, visibility_changed
+from mail_events import MAIL_ASSIGNED, MAIL_CREATED, MAIL_STATUS_CHANGED, create_event_bus, mail_event, sse_stream
+from mail_export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, export_filename, export_stream
+from attachment_store import ATTACHMENT_STORAGE_PROJECTION, create_attachment_store, delete_attachments, parse_range
+from migrations import index_report, run_migrations
+from stats_engine import MESSAGE_TYPES, StatsQuery, add_mail_breakdowns
+from sequences import allocate_reference, seed_reference_counters
+from threads import resolve_thread
+from csv_import import DEFAULT_BATCH_SIZE as DEFAULT_IMPORT_BATCH_SIZE, CsvMailImporter, spool_to_disk
+from jobs import JobContext, JobRunner, get_job
+from cache import cached_json_response, reference_cache
+from principals import decode_token, invalidate_user, resolve_principal
+from credentials import hash_password, login_throttle, verify_password
+from metrics import MetricsMiddleware, metrics_response, mongo_command_metrics
+from slow_queries import slow_query_log
+from mail_search import DEFAULT_LIMIT as MAIL_SEARCH_LIMIT, MAX_LIMIT as MAIL_SEARCH_MAX_LIMIT, build_highlights
+from correspondent_search import DEFAULT_LIMIT as CORRESPONDENT_SEARCH_LIMIT, search_correspondents, search_fields
+from stats_counters import (
+    BUCKET_PROJECTION, STATS_COLLECTION, apply_deltas, bucket_of, record_bulk_status_change,
+    record_created, record_deleted, record_transition,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Les listeners mesurent la durée de chaque commande (/metrics) et relèvent
+# les requêtes lentes (/api/admin/slow-queries) ; tz_aware : les dates BSON
+# sont relues en datetimes UTC
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[mongo_command_metrics, slow_query_log])
 db = client[os.environ['DB_NAME']]
 
+# Stockage des pièces jointes (GridFS par défaut, voir ATTACHMENT_STORAGE)
+attachment_store = create_attachment_store(db)
+
+# Tâches longues (imports) exécutées en arrière-plan
+job_runner = JobRunner(db)
+
+# Événements poussés aux clients connectés (mémoire par défaut, voir EVENT_BUS_BACKEND)
+event_bus = create_event_bus(db)
+
+# Projection limitée aux champs du modèle Mail : les champs internes ne sortent pas
+# sur le chemin FAST_JSON (sans revalidation), le contenu des anciennes pièces jointes
+# en base64 et related_mails (le fil est calculé à la lecture) ne sont pas lus
+MAIL_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in Mail.model_fields if field not in ("attachments", "related_mails")},
+    **{f"attachments.{field}": 1 for field in Attachment.model_fields if field != "data"},
+}
+
+# Projection des vues liste : uniquement les champs de MailSummary
+MAIL_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "type": 1,
+    "reference": 1,
+    "subject": 1,
+    "correspondent_id": 1,
+    "correspondent_name": 1,
+    "service_id": 1,
+    "service_name": 1,
+    "sub_service_name": 1,
+    "assigned_to_id": 1,
+    "assigned_to_name": 1,
+    "status": {"$ifNull": ["$status", "recu"]},
+    "message_type": {"$ifNull": ["$message_type", "courrier"]},
+    "is_registered": {"$ifNull": ["$is_registered", False]},
+    "parent_mail_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "attachment_count": {"$size": {"$ifNull": ["$attachments", []]}},
+}
+
 # JWT Secret pour l'authentification legacy (pour compatibilité)
 JWT_SECRET = os.environ.get('JWT_SECRET', 'fallback_secret_key_2025')
 JWT_ALGORITHM = "HS256"
 
+# Jeton du flux SSE : EventSource ne peut envoyer d'en-tête, le jeton passe donc
+# dans l'URL (journaux, historique) ; il est limité au flux et de courte durée
+STREAM_TOKEN_SCOPE = "events"
+STREAM_TOKEN_SECONDS = int(os.environ.get("STREAM_TOKEN_SECONDS", "60"))
+
 # Create the main app
 app = FastAPI(
     swagger_ui_oauth2_redirect_url="/oauth2-redirect",
@@ -50,172 +134,6 @@ azure_scheme = SingleTenantAzureAuthorizationCodeBearer(
 
 # Azure AD User Dependency
 
-# ===== MODELS =====
-
-class User(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    email: str
-    name: str
-    password: Optional[str] = None  # Optional pour les utilisateurs Azure AD
-    role: str = "user"  # "user" or "admin"
-    service_id: Optional[str] = None  # Service assigned to user for permissions
-    sub_service_id: Optional[str] = None  # Sub-service assigned to user
-    azure_id: Optional[str] = None  # Azure AD Object ID
-    last_login: Optional[str] = None  # Dernière connexion
-    is_deleted: bool = False  # Marqueur de suppression RGPD
-    deleted_at: Optional[str] = None  # Date de suppression
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class UserCreate(BaseModel):
-    email: str
-    name: str
-    password: Optional[str] = None  # Optional pour les utilisateurs Azure AD
-    role: str = "user"
-    service_id: Optional[str] = None
-    sub_service_id: Optional[str] = None
-    azure_id: Optional[str] = None
-
-class LoginRequest(BaseModel):
-    email: str
-    password: str
-
-class LoginResponse(BaseModel):
-    token: str
-    user: dict
-
-class SubService(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-
-class Service(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    sub_services: List[SubService] = []
-    archived: bool = False
-    archived_at: Optional[datetime] = None
-    archived_by: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class ServiceCreate(BaseModel):
-    name: str
-    sub_services: List[SubService] = []
-
-class Correspondent(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    email: Optional[str] = None
-    organization: Optional[str] = None
-    phone: Optional[str] = None
-    address: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class CorrespondentCreate(BaseModel):
-    name: str
-    email: Optional[str] = None
-    organization: Optional[str] = None
-    phone: Optional[str] = None
-    address: Optional[str] = None
-
-class Attachment(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    filename: str
-    content_type: str
-    size: int
-    data: str  # Base64 encoded
-
-class WorkflowStep(BaseModel):
-    status: str  # "recu", "traitement", "traite", "archive"
-    user_id: str
-    user_name: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    comment: Optional[str] = None
-
-class Mail(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    type: str  # "entrant" or "sortant"
-    reference: str  # Auto-generated reference number
-    subject: str
-    content: str
-    correspondent_id: str
-    correspondent_name: str
-    service_id: str  # Primary service (pour compatibilité)
-    service_name: str  # Primary service name (pour compatibilité)
-    service_ids: Optional[List[str]] = None  # Multiple destinataires
-    service_names: Optional[List[str]] = None  # Multiple destinataires names
-    sub_service_id: Optional[str] = None  # Primary sub-service (pour compatibilité)
-    sub_service_name: Optional[str] = None  # Primary sub-service name (pour compatibilité)
-    sub_service_ids: Optional[List[str]] = None  # Multiple sous-services pour chaque destinataire
-    sub_service_names: Optional[List[str]] = None  # Multiple sous-services names
-    final_recipient_ids: Optional[List[str]] = None  # Utilisateurs destinataires finaux
-    final_recipient_emails: Optional[List[str]] = None  # Emails des destinataires finaux
-    assigned_to_id: Optional[str] = None
-    assigned_to_name: Optional[str] = None
-    status: str = "recu"  # "recu", "traitement", "traite", "archive"
-    workflow: List[WorkflowStep] = []
-    attachments: List[Attachment] = []
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    opened_by_id: Optional[str] = None
-    opened_by_name: Optional[str] = None
-    opened_at: Optional[datetime] = None
-    parent_mail_id: Optional[str] = None  # For replies
-    parent_mail_reference: Optional[str] = None
-    related_mails: List[dict] = []  # List of related mails (responses)
-    # New fields
-    message_type: str = "courrier"  # "courrier", "email", "accueil_physique", "accueil_telephonique", "colis"
-    is_registered: bool = False  # Recommandé
-    registered_number: Optional[str] = None  # Numéro de recommandé ou code-barres
-    no_response_needed: bool = False  # Ne nécessite pas de réponse
-
-class MailCreate(BaseModel):
-    type: str
-    subject: str
-    content: str
-    correspondent_id: str
-    correspondent_name: str
-    service_id: str  # Primary service (pour compatibilité)
-    service_name: str  # Primary service name (pour compatibilité)
-    service_ids: Optional[List[str]] = None  # Multiple destinataires
-    service_names: Optional[List[str]] = None  # Multiple destinataires names
-    sub_service_id: Optional[str] = None  # Primary sub-service (pour compatibilité)
-    sub_service_name: Optional[str] = None  # Primary sub-service name (pour compatibilité)
-    sub_service_ids: Optional[List[str]] = None  # Multiple sous-services
-    sub_service_names: Optional[List[str]] = None  # Multiple sous-services names
-    final_recipient_ids: Optional[List[str]] = None  # Utilisateurs destinataires finaux
-    final_recipient_emails: Optional[List[str]] = None  # Emails des destinataires finaux
-    parent_mail_id: Optional[str] = None
-    parent_mail_reference: Optional[str] = None
-    message_type: str = "courrier"
-    is_registered: bool = False
-    registered_number: Optional[str] = None
-    no_response_needed: bool = False
-
-class MailUpdate(BaseModel):
-    subject: Optional[str] = None
-    content: Optional[str] = None
-    correspondent_id: Optional[str] = None
-    correspondent_name: Optional[str] = None
-    service_id: Optional[str] = None
-    service_name: Optional[str] = None
-    service_ids: Optional[List[str]] = None
-    service_names: Optional[List[str]] = None
-    sub_service_id: Optional[str] = None
-    sub_service_name: Optional[str] = None
-    sub_service_ids: Optional[List[str]] = None
-    sub_service_names: Optional[List[str]] = None
-    final_recipient_ids: Optional[List[str]] = None
-    final_recipient_emails: Optional[List[str]] = None
-    message_type: Optional[str] = None
-    is_registered: Optional[bool] = None
-    registered_number: Optional[str] = None
-    status: Optional[str] = None
-    assigned_to_id: Optional[str] = None
-    assigned_to_name: Optional[str] = None
-    comment: Optional[str] = None
-
 # ===== AUTH HELPERS =====
 
 def create_token(user_data: dict) -> str:
@@ -230,18 +148,19 @@ def create_token(user_data: dict) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def create_stream_token(current_user: dict) -> str:
+    """Create a short-lived token only accepted by the event stream"""
+    payload = {claim: current_user.get(claim) for claim in ("sub", "email", "name", "role", "service_id")}
+    payload["scope"] = STREAM_TOKEN_SCOPE
+    payload["exp"] = datetime.now(timezone.utc) + timedelta(seconds=STREAM_TOKEN_SECONDS)
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
 def verify_token(token: str) -> dict:
-    """Verify mocked Azure AD token"""
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    """Verify mocked Azure AD token (decoded payloads are cached until expiry)"""
+    return decode_token(token, JWT_SECRET, JWT_ALGORITHM)
 
 async def get_current_user(authorization: str = Header(None)) -> dict:
-    """Dependency to get current user from token"""
+    """Dependency to get current user from token, with role and service read from the user record"""
     if not authorization:
         raise HTTPException(status_code=401, detail="No authorization header")
     
@@ -251,9 +170,30 @@ async def get_current_user(authorization: str = Header(None)) -> dict:
             raise HTTPException(status_code=401, detail="Invalid authentication scheme")
         
         user_data = verify_token(token)
-        return user_data
     except ValueError:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
+    if "scope" in user_data:
+        # Les jetons de flux ne donnent accès qu'à /events/stream
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    return await resolve_principal(db, user_data)
+
+async def get_stream_user(access_token: Optional[str] = None, authorization: str = Header(None)) -> dict:
+    """
+    Like get_current_user, also accepting a stream token as a query parameter (EventSource cannot send headers)
+
+    Raises:
+        HTTPException: 401 if the query parameter holds anything but a stream token
+    """
+    if authorization:
+        return await get_current_user(authorization)
+    if not access_token:
+        raise HTTPException(status_code=401, detail="No authorization header")
+    
+    payload = verify_token(access_token)
+    if payload.get("scope") != STREAM_TOKEN_SCOPE:
+        raise HTTPException(status_code=401, detail="Stream token required, see POST /api/events/token")
+    return await resolve_principal(db, payload)
 
 async def require_admin(current_user: dict = Depends(get_current_user)):
     """Dependency to require admin role"""
@@ -261,11 +201,18 @@ async def require_admin(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+def invalidate_service_cache():
+    """Drop cached service lists after a service mutation"""
+    reference_cache.invalidate("services:")
+
 # ===== AUTH ROUTES =====
 
 @api_router.post("/auth/login", response_model=LoginResponse)
-async def login(credentials: LoginRequest):
+async def login(credentials: LoginRequest, request: Request):
     """JWT login pour anciens utilisateurs uniquement"""
+    # Limiter les tentatives par email et par adresse IP (429 au-delà)
+    login_throttle.check(credentials.email, request)
+    
     # Find user in database
     user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
     
@@ -279,13 +226,17 @@ async def login(credentials: LoginRequest):
             detail="Ce compte utilise l'authentification Microsoft. Utilisez le bouton 'Se connecter avec Microsoft'."
         )
     
-    # Check password (in production, use proper hashing)
-    if user_doc["password"] != credentials.password:
+    # Check password (bcrypt hors de la boucle d'événements)
+    valid, needs_rehash = await verify_password(credentials.password, user_doc["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Convert datetime strings back
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
+    # Re-hacher un ancien mot de passe stocké en clair
+    if needs_rehash:
+        await db.users.update_one(
+            {"id": user_doc["id"], "password": user_doc["password"]},
+            {"$set": {"password": await hash_password(credentials.password)}}
+        )
     
     # Create token
     token = create_token(user_doc)
@@ -333,11 +284,12 @@ async def azure_callback(login_data: AzureLoginRequest):
                     {
                         "$set": {
                             "azure_id": azure_id,
-                            "last_login": datetime.now(timezone.utc).isoformat(),
+                            "last_login": datetime.now(timezone.utc),
                             "name": name,
                         }
                     }
                 )
+                invalidate_user(existing_user["id"], email)
                 # Récupérer l'utilisateur mis à jour
                 existing_user = await db.users.find_one({"email": email}, {"_id": 0})
             else:
@@ -346,12 +298,17 @@ async def azure_callback(login_data: AzureLoginRequest):
                     {"azure_id": azure_id},
                     {
                         "$set": {
-                            "last_login": datetime.now(timezone.utc).isoformat(),
+                            "last_login": datetime.now(timezone.utc),
                             "email": email,
                             "name": name,
                         }
                     }
                 )
+                # last_login n'est pas mis en cache : seul un changement de
+                # nom ou d'email rend les fiches en cache obsolètes
+                if existing_user.get("email") != email or existing_user.get("name") != name:
+                    invalidate_user(existing_user["id"], existing_user.get("email"))
+                    existing_user.update(email=email, name=name)
             
             logger.info(f"Utilisateur connecté: {email} (role: {existing_user.get('role')})")
             
@@ -371,12 +328,13 @@ async def azure_callback(login_data: AzureLoginRequest):
             "role": "admin" if is_first_azure_user else "user",
             "service_id": None,
             "sub_service_id": None,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "last_login": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
+            "last_login": datetime.now(timezone.utc),
             "password": None,
         }
         
         await db.users.insert_one(new_user)
+        invalidate_user(new_user["id"], email)
         logger.info(f"Nouvel utilisateur Azure AD créé: {email} (role: {new_user['role']})")
         
         user_without_id = {k: v for k, v in new_user.items() if k != "_id"}
@@ -398,17 +356,15 @@ async def azure_login(login_data: AzureLoginRequest, azure_user = Security(azure
     Endpoint protégé pour Azure AD (pour référence)
     """
     from auth_dependencies import get_or_create_user_from_azure
-    user_info = await get_or_create_user_from_azure(azure_user, db)
-    return user_info
+    return await get_or_create_user_from_azure(azure_user, db)
 
 @api_router.get("/auth/me/azure")
 async def get_azure_user_info(azure_user = Security(azure_scheme)):
     """Get current Azure AD authenticated user information"""
     from auth_dependencies import get_or_create_user_from_azure
-    user_info = await get_or_create_user_from_azure(azure_user, db)
-    return user_info
+    return await get_or_create_user_from_azure(azure_user, db)
 
-@api_router.post("/auth/register", response_model=User)
+@api_router.post("/auth/register", response_model=User, response_model_exclude={"password"})
 async def register(user_create: UserCreate, admin_user: dict = Depends(require_admin)):
     """Register a new user (admin only)"""
     # Check if user already exists
@@ -417,39 +373,41 @@ async def register(user_create: UserCreate, admin_user: dict = Depends(require_a
         raise HTTPException(status_code=400, detail="User already exists")
     
     user = User(**user_create.model_dump())
+    if user.password:
+        user.password = await hash_password(user.password)
     doc = user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.users.insert_one(doc)
+    invalidate_user(user.id, user.email)
     return user
 
 # ===== SERVICES ROUTES =====
 
+SERVICE_LIST_ADAPTER = TypeAdapter(List[Service])
+USER_LIST_ADAPTER = TypeAdapter(List[User])
+
 @api_router.get("/services", response_model=List[Service])
 async def get_services(
+    request: Request,
     include_archived: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all services (exclude archived by default)"""
-    query = {} if include_archived else {"archived": {"$ne": True}}
-    services = await db.services.find(query, {"_id": 0}).to_list(1000)
+    """Get all services (exclude archived by default) - cached, supports If-None-Match"""
+    async def load():
+        query = {} if include_archived else {"archived": {"$ne": True}}
+        return await db.services.find(query, {"_id": 0}).to_list(1000)
     
-    for service in services:
-        if isinstance(service.get('created_at'), str):
-            service['created_at'] = datetime.fromisoformat(service['created_at'])
-        if isinstance(service.get('archived_at'), str):
-            service['archived_at'] = datetime.fromisoformat(service['archived_at'])
-    
-    return services
+    key = "services:all" if include_archived else "services:active"
+    return await cached_json_response(request, key, load, SERVICE_LIST_ADAPTER)
 
 @api_router.post("/services", response_model=Service)
 async def create_service(service_create: ServiceCreate, admin_user: dict = Depends(require_admin)):
     """Create a new service (admin only)"""
     service = Service(**service_create.model_dump())
     doc = service.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.services.insert_one(doc)
+    invalidate_service_cache()
     return service
 
 @api_router.put("/services/{service_id}", response_model=Service)
@@ -457,12 +415,12 @@ async def update_service(service_id: str, service_update: ServiceCreate, admin_u
     """Update a service (admin only)"""
     service = Service(id=service_id, **service_update.model_dump())
     doc = service.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     result = await db.services.replace_one({"id": service_id}, doc)
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    invalidate_service_cache()
     return service
 
 @api_router.delete("/services/{service_id}")
@@ -476,7 +434,7 @@ async def delete_service(service_id: str, admin_user: dict = Depends(require_adm
         {"id": service_id},
         {"$set": {
             "archived": True,
-            "archived_at": datetime.now(timezone.utc).isoformat(),
+            "archived_at": datetime.now(timezone.utc),
             "archived_by": admin_user['name']
         }}
     )
@@ -484,11 +442,14 @@ async def delete_service(service_id: str, admin_user: dict = Depends(require_adm
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    invalidate_service_cache()
+    
     # Archive all mails associated with this service
     if mails_count > 0:
+        await record_bulk_status_change(db, {"service_id": service_id}, "archive")
         await db.mails.update_many(
             {"service_id": service_id, "status": {"$ne": "archive"}},
-            {"$set": {"status": "archive"}}
+            {"$set": {"status": "archive", "updated_at": datetime.now(timezone.utc)}}
         )
     
     return {
@@ -512,29 +473,25 @@ async def restore_service(service_id: str, admin_user: dict = Depends(require_ad
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    invalidate_service_cache()
     return {"message": "Service restored"}
 
 # ===== CORRESPONDENTS ROUTES =====
 
 @api_router.get("/correspondents", response_model=List[Correspondent])
-async def get_correspondents(search: Optional[str] = None, current_user: dict = Depends(get_current_user)):
-    """Get all correspondents with optional search"""
-    query = {}
+async def get_correspondents(
+    search: Optional[str] = None,
+    limit: int = CORRESPONDENT_SEARCH_LIMIT,
+    offset: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get all correspondents, or a ranked page of prefix matches on name, email or organization"""
     if search:
-        # Search by name, email, or organization (case-insensitive)
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}},
-                {"organization": {"$regex": search, "$options": "i"}}
-            ]
-        }
-    
-    correspondents = await db.correspondents.find(query, {"_id": 0}).to_list(1000)
-    
-    for corr in correspondents:
-        if isinstance(corr.get('created_at'), str):
-            corr['created_at'] = datetime.fromisoformat(corr['created_at'])
+        correspondents = await search_correspondents(db, search, limit=limit, offset=offset)
+    else:
+        correspondents = await db.correspondents.find(
+            {}, {"_id": 0, "search_tokens": 0, "name_normalized": 0}
+        ).to_list(1000)
     
     return correspondents
 
@@ -543,7 +500,7 @@ async def create_correspondent(correspondent_create: CorrespondentCreate, curren
     """Create a new correspondent"""
     correspondent = Correspondent(**correspondent_create.model_dump())
     doc = correspondent.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc.update(search_fields(doc))
     
     await db.correspondents.insert_one(doc)
     return correspondent
@@ -553,7 +510,7 @@ async def update_correspondent(correspondent_id: str, correspondent_update: Corr
     """Update a correspondent"""
     correspondent = Correspondent(id=correspondent_id, **correspondent_update.model_dump())
     doc = correspondent.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc.update(search_fields(doc))
     
     result = await db.correspondents.replace_one({"id": correspondent_id}, doc)
     if result.matched_count == 0:
@@ -571,14 +528,57 @@ async def delete_correspondent(correspondent_id: str, admin_user: dict = Depends
 
 # ===== MAILS ROUTES =====
 
-@api_router.get("/mails", response_model=List[Mail])
-async def get_mails(
+def build_visibility_filter(current_user: dict) -> Optional[dict]:
+    """Restrict non-admin users to their service mails or mails they are a final recipient of"""
+    if current_user.get("role") == "admin":
+        return None
+    
+    user_service = current_user.get("service_id")
+    user_id = current_user.get("sub") or current_user.get("id")
+    user_email = current_user.get("email")
+    
+    # Construire les conditions de filtrage
+    or_conditions = []
+    
+    # Messages du service de l'utilisateur
+    if user_service:
+        or_conditions.append({"service_id": user_service})
+        or_conditions.append({"service_ids": user_service})
+    
+    # Messages dont l'utilisateur est destinataire final (par ID ou email)
+    or_conditions.append({"final_recipient_ids": user_id})
+    or_conditions.append({"final_recipient_ids": user_email})
+    or_conditions.append({"final_recipient_emails": user_email})
+    
+    return {"$or": or_conditions}
+
+def is_mail_visible(current_user: dict, mail: dict) -> bool:
+    """In-memory counterpart of build_visibility_filter, applied to pushed events"""
+    if current_user.get("role") == "admin":
+        return True
+    
+    user_service = current_user.get("service_id")
+    if user_service and (mail.get("service_id") == user_service or user_service in (mail.get("service_ids") or [])):
+        return True
+    
+    user_id = current_user.get("sub") or current_user.get("id")
+    user_email = current_user.get("email")
+    recipients = mail.get("final_recipient_ids") or []
+    return user_id in recipients or (user_email is not None and (
+        user_email in recipients or user_email in (mail.get("final_recipient_emails") or [])
+    ))
+
+def build_mail_query(
+    current_user: dict,
     type: Optional[str] = None,
     status: Optional[str] = None,
     service_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get all mails with optional filters - users see only their service mails, admins see all"""
+    correspondent_id: Optional[str] = None,
+    assigned_to_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> dict:
+    """Build the Mongo filter shared by the mail list endpoints"""
     query = {}
     if type:
         query["type"] = type
@@ -586,106 +586,159 @@ async def get_mails(
         query["status"] = status
     if service_id:
         query["service_id"] = service_id
+    if correspondent_id:
+        query["correspondent_id"] = correspondent_id
+    if assigned_to_id:
+        query["assigned_to_id"] = assigned_to_id
+    
+    # Dates BSON natives : comparaison chronologique servie par les index created_at
+    created_range = {}
+    if date_from:
+        created_range["$gte"] = to_bson_date(date_from)
+    if date_to:
+        created_range["$lte"] = to_bson_date(date_to)
+    if created_range:
+        query["created_at"] = created_range
+    
+    visibility = build_visibility_filter(current_user)
+    if visibility:
+        query.update(visibility)
+    
+    return query
+
+async def mail_list_query(
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    service_id: Optional[str] = None,
+    correspondent_id: Optional[str] = None,
+    assigned_to_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+) -> dict:
+    """Dependency building the filtered, cursor-positioned query of the mail list endpoints"""
+    query = build_mail_query(
+        current_user,
+        type=type,
+        status=status,
+        service_id=service_id,
+        correspondent_id=correspondent_id,
+        assigned_to_id=assigned_to_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
     
-    # If user is not admin, filter by their service OR if they are a final recipient
-    if current_user.get("role") != "admin":
-        user_service = current_user.get("service_id")
-        user_id = current_user.get("sub") or current_user.get("id")
-        user_email = current_user.get("email")
-        
-        # Construire les conditions de filtrage
-        or_conditions = []
-        
-        # Messages du service de l'utilisateur
-        if user_service:
-            or_conditions.append({"service_id": user_service})
-            or_conditions.append({"service_ids": user_service})
-        
-        # Messages dont l'utilisateur est destinataire final (par ID ou email)
-        or_conditions.append({"final_recipient_ids": user_id})
-        or_conditions.append({"final_recipient_ids": user_email})
-        or_conditions.append({"final_recipient_emails": user_email})
-        
-        if or_conditions:
-            query["$or"] = or_conditions
+    after = keyset_filter(cursor)
+    if after:
+        query = {"$and": [query, after]}
     
-    mails = await db.mails.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    return query
+
+@api_router.get("/mails", response_model=MailPage)
+async def get_mails(
+    limit: Optional[int] = None,
+    query: dict = Depends(mail_list_query)
+):
+    """Get one page of mails with optional filters - users see only their service mails, admins see all"""
+    mails, next_cursor, has_more = await fetch_page(db.mails, query, clamp_page_size(limit), MAIL_PROJECTION)
+    
+    return fast_response({"items": mails, "next_cursor": next_cursor, "has_more": has_more})
+
+@api_router.get("/mails/summary", response_model=MailSummaryPage)
+async def get_mail_summaries(
+    limit: Optional[int] = None,
+    query: dict = Depends(mail_list_query)
+):
+    """Get one page of mail summaries (same filters as GET /mails, without heavy fields)"""
+    mails, next_cursor, has_more = await fetch_page(db.mails, query, clamp_page_size(limit), MAIL_SUMMARY_PROJECTION)
+    
+    return fast_response({"items": mails, "next_cursor": next_cursor, "has_more": has_more})
+
+@api_router.get("/mails/changes", response_model=MailChanges)
+async def get_mail_changes(
+    since: Optional[str] = None,
+    type: Optional[str] = None,
+    limit: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get mail summaries created/updated and ids deleted since a change token (410: reload the full list)"""
+    # Seul le type est immuable : les autres filtres de la liste s'appliquent côté client,
+    # un courrier qui en sort devant être retiré du cache local
+    query = {"type": type} if type else {}
+    visibility = build_visibility_filter(current_user)
+    if visibility:
+        query.update(visibility)
+    
+    changes = await fetch_changes(db, since, clamp_changes_limit(limit), MAIL_SUMMARY_PROJECTION, query)
+    return fast_response(changes)
+
+@api_router.get("/mails/search", response_model=MailSearchResult)
+async def search_mails(
+    q: str,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    service_id: Optional[str] = None,
+    limit: int = MAIL_SEARCH_LIMIT,
+    offset: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """Full-text search on subject, content, reference, registered number and correspondent, ranked by relevance"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+    
+    query = build_mail_query(current_user, type=type, status=status, service_id=service_id)
+    query["$text"] = {"$search": q}
+    limit = max(1, min(limit, MAIL_SEARCH_MAX_LIMIT))
+    
+    projection = {**MAIL_SUMMARY_PROJECTION, "content": 1, "score": {"$meta": "textScore"}}
+    mails = await db.mails.find(query, projection).sort(
+        [("score", {"$meta": "textScore"}), ("created_at", -1)]
+    ).skip(max(offset, 0)).limit(limit).to_list(limit)
+    total = await db.mails.count_documents(query)
     
     for mail in mails:
-        if isinstance(mail.get('created_at'), str):
-            mail['created_at'] = datetime.fromisoformat(mail['created_at'])
-        if isinstance(mail.get('opened_at'), str):
-            mail['opened_at'] = datetime.fromisoformat(mail['opened_at'])
-        # Convert workflow timestamps
-        for step in mail.get('workflow', []):
-            if isinstance(step.get('timestamp'), str):
-                step['timestamp'] = datetime.fromisoformat(step['timestamp'])
+        mail['highlights'] = build_highlights(mail, q)
+        mail.pop('content', None)
     
-    return mails
+    return {"items": mails, "total": total}
 
 @api_router.get("/mails/{mail_id}", response_model=Mail)
 async def get_mail(mail_id: str, current_user: dict = Depends(get_current_user)):
     """Get a specific mail and mark as opened"""
-    mail_doc = await db.mails.find_one({"id": mail_id}, {"_id": 0})
+    mail_doc = await db.mails.find_one({"id": mail_id}, MAIL_PROJECTION)
     
     if not mail_doc:
         raise HTTPException(status_code=404, detail="Mail not found")
     
-    # Convert datetime strings
-    if isinstance(mail_doc.get('created_at'), str):
-        mail_doc['created_at'] = datetime.fromisoformat(mail_doc['created_at'])
-    if isinstance(mail_doc.get('opened_at'), str):
-        mail_doc['opened_at'] = datetime.fromisoformat(mail_doc['opened_at'])
-    for step in mail_doc.get('workflow', []):
-        if isinstance(step.get('timestamp'), str):
-            step['timestamp'] = datetime.fromisoformat(step['timestamp'])
-    
     # Auto-assign to user who opens it first
     if not mail_doc.get('opened_by_id'):
         mail_doc['opened_by_id'] = current_user['sub']
         mail_doc['opened_by_name'] = current_user['name']
-        mail_doc['opened_at'] = datetime.now(timezone.utc).isoformat()
+        mail_doc['opened_at'] = datetime.now(timezone.utc)
         mail_doc['assigned_to_id'] = current_user['sub']
         mail_doc['assigned_to_name'] = current_user['name']
         
-        # Update in database
-        await db.mails.update_one(
-            {"id": mail_id},
+        # Update in database (only if nobody opened it in the meantime)
+        result = await db.mails.update_one(
+            {"id": mail_id, "opened_by_id": None},
             {"$set": {
                 "opened_by_id": mail_doc['opened_by_id'],
                 "opened_by_name": mail_doc['opened_by_name'],
                 "opened_at": mail_doc['opened_at'],
                 "assigned_to_id": mail_doc['assigned_to_id'],
-                "assigned_to_name": mail_doc['assigned_to_name']
-            }}
+                "assigned_to_name": mail_doc['assigned_to_name'],
+                "updated_at": mail_doc['opened_at']
+            }, "$inc": {"version": 1}}
         )
+        if result.modified_count:
+            mail_doc['version'] = mail_doc.get('version', 0) + 1
+            mail_doc['updated_at'] = mail_doc['opened_at']
+            await event_bus.publish(mail_event(MAIL_ASSIGNED, mail_doc, by=current_user['name']))
     
-    # Get related mails (responses and parent)
-    related_mails = []
-    
-    # Get child mails (responses to this mail)
-    child_mails = await db.mails.find(
-        {"parent_mail_id": mail_id}, 
-        {"_id": 0, "id": 1, "reference": 1, "type": 1, "subject": 1, "created_at": 1, "status": 1}
-    ).to_list(100)
-    
-    for child in child_mails:
-        if isinstance(child.get('created_at'), str):
-            child['created_at'] = datetime.fromisoformat(child['created_at'])
-        related_mails.append(child)
-    
-    # Get parent mail if this is a response
-    if mail_doc.get('parent_mail_id'):
-        parent_mail = await db.mails.find_one(
-            {"id": mail_doc['parent_mail_id']},
-            {"_id": 0, "id": 1, "reference": 1, "type": 1, "subject": 1, "created_at": 1, "status": 1}
-        )
-        if parent_mail:
-            if isinstance(parent_mail.get('created_at'), str):
-                parent_mail['created_at'] = datetime.fromisoformat(parent_mail['created_at'])
-            related_mails.insert(0, parent_mail)
-    
-    mail_doc['related_mails'] = related_mails
+    # Fil complet (ancêtres et réponses) en une seule agrégation
+    thread = await resolve_thread(db, mail_id, lambda mail: is_mail_visible(current_user, mail))
+    mail_doc['related_mails'] = thread['ancestors'] + thread['descendants'] if thread else []
     
     return Mail(**mail_doc)
 
@@ -693,8 +746,7 @@ async def get_mail(mail_id: str, current_user: dict = Depends(get_current_user))
 async def create_mail(mail_create: MailCreate, current_user: dict = Depends(get_current_user)):
     """Create a new mail"""
     # Generate reference number
-    count = await db.mails.count_documents({})
-    reference = f"MAIL-{datetime.now(timezone.utc).year}-{count + 1:05d}"
+    reference = await allocate_reference(db)
     
     # Determine initial status based on no_response_needed
     initial_status = "archive" if mail_create.no_response_needed else "recu"
@@ -712,136 +764,364 @@ async def create_mail(mail_create: MailCreate, current_user: dict = Depends(get_
             )
         ]
     )
-    
-    doc = mail.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    # Convert workflow timestamps
-    for step in doc['workflow']:
-        step['timestamp'] = step['timestamp'].isoformat()
-    
-    await db.mails.insert_one(doc)
-    
-    # If this is a reply to another mail, update the parent mail's related_mails
-    if mail_create.parent_mail_id:
-        await db.mails.update_one(
-            {"id": mail_create.parent_mail_id},
-            {"$push": {"related_mails": {
-                "id": mail.id,
-                "reference": mail.reference,
-                "type": mail.type,
-                "subject": mail.subject,
-                "created_at": doc['created_at'],
-                "status": mail.status
-            }}}
-        )
+    mail.updated_at = mail.created_at
+    
+    doc = mail.model_dump(exclude={"related_mails"})
+    
+    for attempt in range(2):
+        try:
+            await db.mails.insert_one(doc)
+            break
+        except DuplicateKeyError as e:
+            if "reference" not in (e.details or {}).get("keyPattern", {}):
+                raise
+            if attempt:
+                raise HTTPException(status_code=409, detail="Reference already allocated, please retry")
+            # Compteur en retard sur les références stockées (données restaurées ou importées hors API)
+            logger.warning(f"Référence {doc['reference']} déjà attribuée : compteurs réalignés")
+            await seed_reference_counters(db)
+            mail.reference = doc["reference"] = await allocate_reference(db)
+    await record_created(db, [doc])
+    await event_bus.publish(mail_event(MAIL_CREATED, doc, by=current_user['name']))
     
     return mail
 
-@api_router.put("/mails/{mail_id}", response_model=Mail)
-async def update_mail(mail_id: str, mail_update: MailUpdate, current_user: dict = Depends(get_current_user)):
-    """Update a mail"""
-    mail_doc = await db.mails.find_one({"id": mail_id}, {"_id": 0})
+@api_router.get("/mails/{mail_id}/thread", response_model=MailThread)
+async def get_mail_thread(mail_id: str, current_user: dict = Depends(get_current_user)):
+    """Get the full reply tree (ancestors and descendants) of a mail, limited to the mails visible to the user"""
+    thread = await resolve_thread(db, mail_id, lambda mail: is_mail_visible(current_user, mail))
     
-    if not mail_doc:
+    if not thread:
         raise HTTPException(status_code=404, detail="Mail not found")
     
-    # Convert datetime strings
-    if isinstance(mail_doc.get('created_at'), str):
-        mail_doc['created_at'] = datetime.fromisoformat(mail_doc['created_at'])
-    if isinstance(mail_doc.get('opened_at'), str):
-        mail_doc['opened_at'] = datetime.fromisoformat(mail_doc['opened_at'])
-    for step in mail_doc.get('workflow', []):
-        if isinstance(step.get('timestamp'), str):
-            step['timestamp'] = datetime.fromisoformat(step['timestamp'])
-    
-    # Update fields
+    return thread
+
+# Nombre de tentatives d'une mise à jour sans version attendue avant de renvoyer 409
+UPDATE_MAIL_ATTEMPTS = 3
+
+def version_filter(mail_id: str, version: int) -> dict:
+    """Match a mail only if it is still at the given version (documents without version are at 0)"""
+    if version == 0:
+        return {"id": mail_id, "$or": [{"version": 0}, {"version": {"$exists": False}}]}
+    return {"id": mail_id, "version": version}
+
+@api_router.put("/mails/{mail_id}", response_model=Mail)
+async def update_mail(mail_id: str, mail_update: MailUpdate, current_user: dict = Depends(get_current_user)):
+    """Update a mail with a conditional $set/$push (409 if it changed concurrently)"""
     update_data = mail_update.model_dump(exclude_unset=True)
+    comment = update_data.pop("comment", None)
+    expected_version = update_data.pop("expected_version", None)
     
-    # If status changed, add workflow step
-    if "status" in update_data and update_data["status"] != mail_doc["status"]:
-        workflow_step = WorkflowStep(
-            status=update_data["status"],
-            user_id=current_user['sub'],
-            user_name=current_user['name'],
-            comment=update_data.get("comment")
+    for attempt in range(UPDATE_MAIL_ATTEMPTS):
+        current = await db.mails.find_one(
+            {"id": mail_id}, {**BUCKET_PROJECTION, **TOMBSTONE_PROJECTION, "version": 1, "assigned_to_id": 1}
+        )
+        if not current:
+            raise HTTPException(status_code=404, detail="Mail not found")
+        
+        version = current.get("version", 0)
+        if expected_version is not None and expected_version != version:
+            raise HTTPException(status_code=409, detail="Le message a été modifié par un autre utilisateur")
+        
+        update = {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
+        
+        # If status changed, add workflow step
+        if "status" in update_data and update_data["status"] != current.get("status"):
+            workflow_step = WorkflowStep(
+                status=update_data["status"],
+                user_id=current_user['sub'],
+                user_name=current_user['name'],
+                comment=comment
+            ).model_dump()
+            update["$push"] = {"workflow": workflow_step}
+        
+        mail_doc = await db.mails.find_one_and_update(
+            version_filter(mail_id, version),
+            update,
+            projection=MAIL_PROJECTION,
+            return_document=ReturnDocument.AFTER,
         )
-        mail_doc['workflow'].append(workflow_step.model_dump())
-        mail_doc['workflow'][-1]['timestamp'] = mail_doc['workflow'][-1]['timestamp'].isoformat()
+        if mail_doc:
+            break
+        if expected_version is not None:
+            raise HTTPException(status_code=409, detail="Le message a été modifié par un autre utilisateur")
+    else:
+        raise HTTPException(status_code=409, detail="Le message a été modifié par un autre utilisateur")
+    
+    await record_transition(db, current, mail_doc)
+    # Retirer le courrier des listes des utilisateurs qui ne le voient plus
+    if visibility_changed(current, mail_doc):
+        await record_tombstones(db, [current])
+    
+    if mail_doc.get("status") != current.get("status"):
+        await event_bus.publish(mail_event(
+            MAIL_STATUS_CHANGED, mail_doc, previous_status=current.get("status"), by=current_user['name']
+        ))
+    if mail_doc.get("assigned_to_id") != current.get("assigned_to_id"):
+        await event_bus.publish(mail_event(MAIL_ASSIGNED, mail_doc, by=current_user['name']))
     
-    # Remove comment from update_data as it's only for workflow
-    update_data.pop("comment", None)
+    return Mail(**mail_doc)
+
+def batch_update_fields(batch: MailBatchRequest) -> dict:
+    """Fields written by a batch update operation"""
+    if batch.operation == "status":
+        if not batch.status:
+            raise HTTPException(status_code=400, detail="status is required")
+        return {"status": batch.status}
+    if batch.operation == "assign":
+        return {"assigned_to_id": batch.assigned_to_id, "assigned_to_name": batch.assigned_to_name}
+    if batch.operation == "reassign_service":
+        if not batch.service_id or not batch.service_name:
+            raise HTTPException(status_code=400, detail="service_id and service_name are required")
+        return {
+            "service_id": batch.service_id,
+            "service_name": batch.service_name,
+            "service_ids": [batch.service_id],
+            "service_names": [batch.service_name],
+            "sub_service_id": batch.sub_service_id,
+            "sub_service_name": batch.sub_service_name,
+            "sub_service_ids": [batch.sub_service_id] if batch.sub_service_id else None,
+            "sub_service_names": [batch.sub_service_name] if batch.sub_service_name else None,
+        }
+    raise HTTPException(status_code=400, detail=f"Unknown operation: {batch.operation}")
+
+@api_router.post("/mails/batch", response_model=MailBatchResult)
+async def batch_mails(batch: MailBatchRequest, current_user: dict = Depends(get_current_user)):
+    """Apply one operation to many mails with a single bulk_write, returning per-id outcomes"""
+    ids = list(dict.fromkeys(batch.ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No mail ids")
+    if len(ids) > MAX_BATCH_MAILS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_MAILS} mails per batch")
+    if batch.operation == "delete" and current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Update mail document
-    for key, value in update_data.items():
-        mail_doc[key] = value
+    fields = batch_update_fields(batch) if batch.operation != "delete" else {}
+    
+    # Les courriers invisibles pour l'utilisateur sont traités comme inexistants
+    query = {"id": {"$in": ids}}
+    visibility = build_visibility_filter(current_user)
+    if visibility:
+        query.update(visibility)
+    found = {
+        mail["id"]: mail
+        for mail in await db.mails.find(
+            query, {**BUCKET_PROJECTION, **TOMBSTONE_PROJECTION, **ATTACHMENT_STORAGE_PROJECTION, "version": 1, "reference": 1, "subject": 1}
+        ).to_list(len(ids))
+    }
     
-    # Prepare for MongoDB
-    doc = mail_doc.copy()
-    if isinstance(doc['created_at'], datetime):
-        doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('opened_at') and isinstance(doc['opened_at'], datetime):
-        doc['opened_at'] = doc['opened_at'].isoformat()
+    # Date relue telle que MongoDB la stocke (millisecondes) pour reconnaître nos écritures
+    now = datetime.now(timezone.utc)
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    outcomes = {mail_id: "not_found" for mail_id in ids if mail_id not in found}
+    operations = []
+    for mail_id, mail in found.items():
+        condition = version_filter(mail_id, mail.get("version", 0))
+        if batch.operation == "delete":
+            operations.append(DeleteOne(condition))
+            continue
+        
+        if batch.operation == "status" and mail.get("status") == batch.status:
+            outcomes[mail_id] = "unchanged"
+            continue
+        
+        update = {"$set": {**fields, "updated_at": now}, "$inc": {"version": 1}}
+        if batch.operation == "status":
+            workflow_step = WorkflowStep(
+                status=batch.status,
+                user_id=current_user['sub'],
+                user_name=current_user['name'],
+                comment=batch.comment
+            ).model_dump()
+            update["$push"] = {"workflow": workflow_step}
+        operations.append(UpdateOne(condition, update))
+    
+    applied = 0
+    if operations:
+        result = await db.mails.bulk_write(operations, ordered=False)
+        applied = result.deleted_count if batch.operation == "delete" else result.matched_count
+    
+    # Toutes les opérations ont trouvé leur version : pas de conflit possible. Sinon,
+    # relire les courriers visés : une mise à jour appliquée a laissé la version lue + 1
+    # et notre updated_at, une suppression appliquée ne laisse plus de document
+    targeted = [mail_id for mail_id in found if mail_id not in outcomes]
+    after = {}
+    if applied < len(operations):
+        after = {
+            mail["id"]: mail
+            for mail in await db.mails.find(
+                {"id": {"$in": targeted}}, {"_id": 0, "id": 1, "version": 1, "updated_at": 1}
+            ).to_list(len(targeted))
+        }
     
-    await db.mails.replace_one({"id": mail_id}, doc)
+    def was_updated(mail_id: str) -> bool:
+        if applied == len(operations):
+            return True
+        current = after.get(mail_id)
+        return (
+            current is not None
+            and current.get("version") == found[mail_id].get("version", 0) + 1
+            and current.get("updated_at") == now
+        )
     
-    return Mail(**mail_doc)
+    deltas = Counter()
+    for mail_id in targeted:
+        mail = found[mail_id]
+        if batch.operation == "delete":
+            if mail_id in after:
+                outcomes[mail_id] = "conflict"
+            else:
+                outcomes[mail_id] = "deleted"
+                deltas[bucket_of(mail)] -= 1
+        elif was_updated(mail_id):
+            outcomes[mail_id] = "updated"
+            deltas[bucket_of(mail)] -= 1
+            deltas[bucket_of({**mail, **fields})] += 1
+        else:
+            outcomes[mail_id] = "conflict"
+    await apply_deltas(db, deltas)
+    deleted = [found[mail_id] for mail_id in targeted if outcomes[mail_id] == "deleted"]
+    moved = [
+        found[mail_id] for mail_id in targeted
+        if outcomes[mail_id] == "updated" and visibility_changed(found[mail_id], {**found[mail_id], **fields})
+    ]
+    await record_tombstones(db, deleted + moved)
+    for mail in deleted:
+        await delete_attachments(attachment_store, mail.get("attachments"))
+    
+    if batch.operation != "delete":
+        kind = MAIL_STATUS_CHANGED if batch.operation == "status" else MAIL_ASSIGNED
+        for mail_id in targeted:
+            if outcomes[mail_id] == "updated":
+                mail = found[mail_id]
+                extra = {"previous_status": mail.get("status")} if batch.operation == "status" else {}
+                await event_bus.publish(mail_event(kind, {**mail, **fields}, by=current_user['name'], **extra))
+    
+    results = [MailBatchItem(id=mail_id, outcome=outcomes[mail_id]) for mail_id in ids]
+    return MailBatchResult(
+        operation=batch.operation,
+        results=results,
+        counts=dict(Counter(item.outcome for item in results)),
+    )
 
-@api_router.post("/mails/{mail_id}/attachments")
+@api_router.post("/mails/{mail_id}/attachments", response_model=Attachment)
 async def add_attachment(mail_id: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
-    """Add attachment to a mail"""
-    # Read file content
-    content = await file.read()
+    """Add attachment to a mail - content is streamed to the attachment store"""
+    if not await db.mails.find_one({"id": mail_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Mail not found")
+    
+    attachment_id = str(uuid.uuid4())
+    storage_id, size, sha256 = await attachment_store.save(attachment_id, file)
     
-    # Create attachment
     attachment = Attachment(
+        id=attachment_id,
         filename=file.filename,
         content_type=file.content_type or "application/octet-stream",
-        size=len(content),
-        data=base64.b64encode(content).decode('utf-8')
+        size=size,
+        sha256=sha256,
+        storage=attachment_store.name,
+        storage_id=storage_id,
     )
     
-    # Add to mail
+    # Add metadata only to mail
     result = await db.mails.update_one(
         {"id": mail_id},
-        {"$push": {"attachments": attachment.model_dump()}}
+        {"$push": {"attachments": attachment.model_dump(exclude={"data"})}, "$set": {"updated_at": datetime.now(timezone.utc)}}
     )
     
     if result.matched_count == 0:
+        # Le courrier a été supprimé pendant l'envoi
+        await attachment_store.delete(storage_id)
         raise HTTPException(status_code=404, detail="Mail not found")
     
     return attachment
 
+@api_router.get("/mails/{mail_id}/attachments/{attachment_id}")
+async def download_attachment(
+    mail_id: str,
+    attachment_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream an attachment content (supports single byte-range requests)"""
+    mail_doc = await db.mails.find_one(
+        {"id": mail_id, "attachments.id": attachment_id},
+        {"_id": 0, "attachments.$": 1}
+    )
+    if not mail_doc:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    
+    attachment = mail_doc["attachments"][0]
+    size = attachment.get("size", 0)
+    
+    if attachment.get("storage_id"):
+        if attachment.get("storage") != attachment_store.name:
+            raise HTTPException(status_code=404, detail="Attachment not available in current storage")
+        
+        def read(start, end):
+            return attachment_store.stream(attachment["storage_id"], start, end)
+    else:
+        # Ancienne pièce jointe base64, tant que la migration 11 n'a pas été appliquée
+        content = base64.b64decode(attachment.get("data") or "")
+        size = len(content)
+        
+        async def read(start, end):
+            yield content[start:end + 1]
+    
+    byte_range = parse_range(range_header, size)
+    filename = attachment.get("filename") or attachment_id
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+    }
+    if attachment.get("sha256"):
+        headers["ETag"] = f'"{attachment["sha256"]}"'
+    
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+    
+    return StreamingResponse(
+        read(start, end),
+        status_code=status_code,
+        media_type=attachment.get("content_type") or "application/octet-stream",
+        headers=headers,
+    )
+
 @api_router.delete("/mails/{mail_id}")
 async def delete_mail(mail_id: str, admin_user: dict = Depends(require_admin)):
     """Delete a mail (admin only)"""
-    result = await db.mails.delete_one({"id": mail_id})
-    if result.deleted_count == 0:
+    deleted = await db.mails.find_one_and_delete(
+        {"id": mail_id}, projection={**BUCKET_PROJECTION, **TOMBSTONE_PROJECTION, **ATTACHMENT_STORAGE_PROJECTION}
+    )
+    if not deleted:
         raise HTTPException(status_code=404, detail="Mail not found")
+    await record_deleted(db, [deleted])
+    await record_tombstones(db, [deleted])
+    await delete_attachments(attachment_store, deleted.get("attachments"))
     return {"message": "Mail deleted"}
 
 # ===== USERS ROUTES (Admin) =====
 
 @api_router.get("/users", response_model=List[User])
-async def get_users(admin_user: dict = Depends(require_admin)):
-    """Get all users (admin only)"""
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
-    
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
+async def get_users(request: Request, admin_user: dict = Depends(require_admin)):
+    """Get all users (admin only) - cached, supports If-None-Match"""
+    async def load():
+        return await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
     
-    return users
+    return await cached_json_response(request, "users:all", load, USER_LIST_ADAPTER)
 
 @api_router.get("/users/by-service/{service_id}", response_model=List[User])
-async def get_users_by_service(service_id: str, current_user: dict = Depends(get_current_user)):
-    """Get users by service"""
-    users = await db.users.find({"service_id": service_id}, {"_id": 0}).to_list(1000)
+async def get_users_by_service(request: Request, service_id: str, current_user: dict = Depends(get_current_user)):
+    """Get users by service - cached, supports If-None-Match"""
+    async def load():
+        return await db.users.find({"service_id": service_id}, {"_id": 0, "password": 0}).to_list(1000)
     
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
-    
-    return users
+    return await cached_json_response(request, f"users:service:{service_id}", load, USER_LIST_ADAPTER)
 
 @api_router.put("/users/{user_id}")
 async def update_user_role(user_id: str, role: str, admin_user: dict = Depends(require_admin)):
@@ -849,6 +1129,7 @@ async def update_user_role(user_id: str, role: str, admin_user: dict = Depends(r
     result = await db.users.update_one({"id": user_id}, {"$set": {"role": role}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
     return {"message": "User role updated"}
 
 class PasswordUpdate(BaseModel):
@@ -860,9 +1141,11 @@ async def update_user_password(user_id: str, password_update: PasswordUpdate, ad
     if not password_update.new_password or len(password_update.new_password) < 6:
         raise HTTPException(status_code=400, detail="Le mot de passe doit contenir au moins 6 caractères")
     
-    result = await db.users.update_one({"id": user_id}, {"$set": {"password": password_update.new_password}})
+    hashed = await hash_password(password_update.new_password)
+    result = await db.users.update_one({"id": user_id}, {"$set": {"password": hashed}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    # Le mot de passe n'est jamais mis en cache : rien à invalider
     return {"message": "Mot de passe mis à jour avec succès"}
 
 class ServiceAssignment(BaseModel):
@@ -879,6 +1162,7 @@ async def update_user_service(user_id: str, service_assignment: ServiceAssignmen
     result = await db.users.update_one({"id": user_id}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
     return {"message": "Service utilisateur mis à jour avec succès"}
 
 class PendingUserCreate(BaseModel):
@@ -886,7 +1170,7 @@ class PendingUserCreate(BaseModel):
     service_id: str
     sub_service_id: Optional[str] = None
 
-@api_router.post("/users/create-pending", response_model=User)
+@api_router.post("/users/create-pending", response_model=User, response_model_exclude={"password"})
 async def create_pending_user(user_data: PendingUserCreate, current_user: dict = Depends(get_current_user)):
     """
     Créer un utilisateur 'en attente' avec juste son email et son service
@@ -896,8 +1180,6 @@ async def create_pending_user(user_data: PendingUserCreate, current_user: dict =
     existing = await db.users.find_one({"email": user_data.email})
     if existing:
         # Si l'utilisateur existe déjà, le retourner
-        if isinstance(existing.get('created_at'), str):
-            existing['created_at'] = datetime.fromisoformat(existing['created_at'])
         return User(**existing)
     
     # Créer un nouvel utilisateur en attente
@@ -912,9 +1194,9 @@ async def create_pending_user(user_data: PendingUserCreate, current_user: dict =
     )
     
     doc = new_user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.users.insert_one(doc)
+    invalidate_user(new_user.id, new_user.email)
     
     logger.info(f"Utilisateur en attente créé: {user_data.email} (service: {user_data.service_id})")
     
@@ -953,7 +1235,7 @@ async def delete_user(user_id: str, admin_user: dict = Depends(require_admin)):
         "service_id": None,
         "sub_service_id": None,
         "is_deleted": True,
-        "deleted_at": datetime.now(timezone.utc).isoformat(),
+        "deleted_at": datetime.now(timezone.utc),
         "role": "user",  # Retirer les privilèges
     }
     
@@ -965,6 +1247,7 @@ async def delete_user(user_id: str, admin_user: dict = Depends(require_admin)):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    invalidate_user(user_id, user_to_delete["email"])
     logger.info(f"Utilisateur anonymisé (RGPD): {user_to_delete['email']} → {anonymized_data['email']}")
     
     return {
@@ -985,28 +1268,19 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin" and current_user.get("service_id"):
         query["service_id"] = current_user.get("service_id")
     
-    total_mails = await db.mails.count_documents(query)
-    
-    entrant_query = {**query, "type": "entrant"}
-    sortant_query = {**query, "type": "sortant"}
-    entrant_mails = await db.mails.count_documents(entrant_query)
-    sortant_mails = await db.mails.count_documents(sortant_query)
-    
-    status_counts = {}
-    for status in ["recu", "traitement", "traite", "archive"]:
-        status_query = {**query, "status": status}
-        status_counts[status] = await db.mails.count_documents(status_query)
+    # Totaux lus depuis les compteurs matérialisés (mail_stats)
+    result = await add_mail_breakdowns(StatsQuery(query, weight="count")).run(db[STATS_COLLECTION])
     
     assigned_query = {**query, "assigned_to_id": current_user['sub']}
     assigned_to_me = await db.mails.count_documents(assigned_query)
     
-    return {
-        "total_mails": total_mails,
-        "entrant_mails": entrant_mails,
-        "sortant_mails": sortant_mails,
-        "status_counts": status_counts,
+    return fast_response({
+        "total_mails": result["total_mails"],
+        "entrant_mails": result["type_counts"]["entrant"],
+        "sortant_mails": result["type_counts"]["sortant"],
+        "status_counts": result["status_counts"],
         "assigned_to_me": assigned_to_me
-    }
+    })
 
 @api_router.get("/stats/advanced")
 async def get_advanced_stats(
@@ -1016,15 +1290,14 @@ async def get_advanced_stats(
     current_user: dict = Depends(get_current_user)
 ):
     """Get advanced statistics with filters"""
-    from datetime import timedelta
-    
     query = {}
+    service_filter = None
     
     # If user is not admin and has a service_id, filter by their service (unless they explicitly filter by another service)
     if current_user.get("role") != "admin" and current_user.get("service_id"):
-        query["service_id"] = current_user.get("service_id")
+        service_filter = {"service_id": current_user.get("service_id")}
     elif service_id:
-        query["service_id"] = service_id
+        service_filter = {"service_id": service_id}
     
     # Filter by message type
     if message_type:
@@ -1043,50 +1316,49 @@ async def get_advanced_stats(
             start_date = None
         
         if start_date:
-            query["created_at"] = {"$gte": start_date.isoformat()}
-    
-    # Get statistics
-    total_mails = await db.mails.count_documents(query)
+            # Les compteurs sont agrégés par jour (UTC)
+            query["day"] = {"$gte": start_date.strftime("%Y-%m-%d")}
     
-    entrant_query = {**query, "type": "entrant"}
-    sortant_query = {**query, "type": "sortant"}
-    entrant_mails = await db.mails.count_documents(entrant_query)
-    sortant_mails = await db.mails.count_documents(sortant_query)
+    is_admin = current_user.get("role") == "admin"
     
-    status_counts = {}
-    for status in ["recu", "traitement", "traite", "archive"]:
-        status_query = {**query, "status": status}
-        status_counts[status] = await db.mails.count_documents(status_query)
+    # Le filtre de service s'applique à tous les indicateurs sauf la répartition par service (admin)
+    if is_admin:
+        stats = StatsQuery(query, weight="count")
+        add_mail_breakdowns(stats, service_filter)
+        stats.group("message_type_counts", "message_type", keys=MESSAGE_TYPES, match=service_filter)
+        stats.group("service_counts", "service_id")
+    else:
+        stats = StatsQuery({**query, **(service_filter or {})}, weight="count")
+        add_mail_breakdowns(stats)
+        stats.group("message_type_counts", "message_type", keys=MESSAGE_TYPES)
     
-    # Get statistics by message type
-    message_type_counts = {}
-    for msg_type in ["courrier", "email", "accueil_physique", "accueil_telephonique", "colis"]:
-        type_query = {**query, "message_type": msg_type}
-        message_type_counts[msg_type] = await db.mails.count_documents(type_query)
+    result = await stats.run(db[STATS_COLLECTION])
     
     # Get statistics by service (only for admins)
     service_counts = {}
-    if current_user.get("role") == "admin":
-        services = await db.services.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)
+    if is_admin and result["service_counts"]:
+        services = await db.services.find(
+            {"id": {"$in": list(result["service_counts"])}},
+            {"_id": 0, "id": 1, "name": 1}
+        ).to_list(None)
         for service in services:
-            service_query = {**{k: v for k, v in query.items() if k != "service_id"}, "service_id": service["id"]}
-            count = await db.mails.count_documents(service_query)
+            count = result["service_counts"].get(service["id"], 0)
             if count > 0:
                 service_counts[service["name"]] = count
     
-    return {
-        "total_mails": total_mails,
-        "entrant_mails": entrant_mails,
-        "sortant_mails": sortant_mails,
-        "status_counts": status_counts,
-        "message_type_counts": message_type_counts,
+    return fast_response({
+        "total_mails": result["total_mails"],
+        "entrant_mails": result["type_counts"]["entrant"],
+        "sortant_mails": result["type_counts"]["sortant"],
+        "status_counts": result["status_counts"],
+        "message_type_counts": result["message_type_counts"],
         "service_counts": service_counts,
         "filters": {
             "period": period,
             "service_id": service_id,
             "message_type": message_type
         }
-    }
+    })
 
 # ===== IMPORT ROUTES =====
 
@@ -1095,160 +1367,147 @@ class ImportStats(BaseModel):
     correspondents_updated: int
     mails_created: int
     errors: List[str]
+    rows_processed: int = 0
+    duration_seconds: float = 0.0
+    rows_per_second: float = 0.0
 
-@api_router.post("/import/csv", response_model=ImportStats)
+class Job(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    kind: str
+    status: str  # "pending", "running", "completed", "failed", "interrupted"
+    progress: dict = {}
+    result: Optional[dict] = None
+    errors: List[str] = []
+    error_count: int = 0
+    failure: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+@api_router.post("/import/csv", response_model=Job, status_code=202)
 async def import_csv(
     file: UploadFile = File(...),
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
     admin_user: dict = Depends(require_admin)
 ):
-    """Import correspondents and mails from CSV (admin only)"""
-    import csv
-    import io
-    
-    stats = {
-        "correspondents_created": 0,
-        "correspondents_updated": 0,
-        "mails_created": 0,
-        "errors": []
-    }
-    
-    try:
-        # Read CSV file
-        contents = await file.read()
-        decoded = contents.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(decoded))
-        
-        # Get default service for imported mails
-        default_service = await db.services.find_one({}, {"_id": 0})
-        if not default_service:
-            raise HTTPException(status_code=400, detail="Aucun service disponible. Créez au moins un service avant d'importer.")
-        
-        row_number = 0
-        for row in csv_reader:
-            row_number += 1
-            try:
-                # Extract correspondent data
-                nom = row.get('nom', '').strip()
-                prenom = row.get('prenom', '').strip()
-                tel_fixe = row.get('telephone_fixe', '').strip()
-                tel_mobile = row.get('telephone_mobile', '').strip()
-                email = row.get('adresse_mail', '').strip()
-                adresse = row.get('adresse_postale', '').strip()
-                
-                # Extract message data
-                titre = row.get('titre_message', '').strip()
-                type_msg = row.get('type', 'entrant').strip().lower()
-                statut = row.get('statut', 'en_cours').strip().lower()
-                
-                # Validate required fields
-                if not nom or not titre:
-                    stats["errors"].append(f"Ligne {row_number}: nom et titre_message sont requis")
-                    continue
-                
-                # Create full name
-                full_name = f"{prenom} {nom}".strip() if prenom else nom
-                
-                # Check if correspondent exists
-                correspondent = await db.correspondents.find_one(
-                    {"name": full_name},
-                    {"_id": 0}
-                )
-                
-                if correspondent:
-                    # Update existing correspondent
-                    update_data = {}
-                    if email and not correspondent.get('email'):
-                        update_data['email'] = email
-                    if tel_fixe or tel_mobile:
-                        phone = tel_mobile if tel_mobile else tel_fixe
-                        if not correspondent.get('phone'):
-                            update_data['phone'] = phone
-                    if adresse and not correspondent.get('address'):
-                        update_data['address'] = adresse
-                    
-                    if update_data:
-                        await db.correspondents.update_one(
-                            {"id": correspondent["id"]},
-                            {"$set": update_data}
-                        )
-                        stats["correspondents_updated"] += 1
-                    
-                    correspondent_id = correspondent["id"]
-                else:
-                    # Create new correspondent
-                    phone = tel_mobile if tel_mobile else tel_fixe
-                    correspondent_data = Correspondent(
-                        name=full_name,
-                        email=email if email else None,
-                        phone=phone if phone else None,
-                        address=adresse if adresse else None,
-                        organization=None
-                    )
-                    
-                    doc = correspondent_data.model_dump()
-                    doc['created_at'] = doc['created_at'].isoformat()
-                    await db.correspondents.insert_one(doc)
-                    
-                    correspondent_id = correspondent_data.id
-                    stats["correspondents_created"] += 1
-                
-                # Determine status
-                if statut in ['archivé', 'archive', 'archivés']:
-                    mail_status = 'archive'
-                elif statut in ['en_cours', 'en cours', 'recu', 'reçu']:
-                    mail_status = 'recu'
-                else:
-                    mail_status = 'recu'
-                
-                # Determine type
-                if type_msg in ['sortant', 'envoyé', 'envoye', 'out']:
-                    mail_type = 'sortant'
-                else:
-                    mail_type = 'entrant'
-                
-                # Generate reference
-                count = await db.mails.count_documents({})
-                reference = f"MAIL-{datetime.now(timezone.utc).year}-{count + 1:05d}"
-                
-                # Create mail
-                mail = Mail(
-                    type=mail_type,
-                    reference=reference,
-                    subject=titre,
-                    content=f"Message importé depuis CSV\n\nTitre: {titre}",
-                    correspondent_id=correspondent_id,
-                    correspondent_name=full_name,
-                    service_id=default_service['id'],
-                    service_name=default_service['name'],
-                    status=mail_status,
-                    workflow=[
-                        WorkflowStep(
-                            status=mail_status,
-                            user_id=admin_user['sub'],
-                            user_name=admin_user['name'],
-                            comment="Import CSV"
-                        )
-                    ],
-                    message_type="courrier",
-                    is_registered=False
-                )
+    """Start a background import of correspondents and mails from CSV (admin only) - poll GET /jobs/{id}"""
+    # Get default service for imported mails
+    default_service = await db.services.find_one({}, {"_id": 0})
+    if not default_service:
+        raise HTTPException(status_code=400, detail="Aucun service disponible. Créez au moins un service avant d'importer.")
+    
+    # Le fichier temporaire de la requête est fermé après la réponse : le copier sur disque
+    path = await spool_to_disk(file)
+    total_bytes = os.path.getsize(path)
+    
+    async def run_import(context: JobContext) -> dict:
+        try:
+            with open(path, "rb") as handle:
+                async def on_progress(stats: dict):
+                    progress = {k: v for k, v in stats.items() if k != "errors"}
+                    progress.update({"bytes_read": handle.tell(), "total_bytes": total_bytes})
+                    await context.update(progress, stats["errors"])
                 
-                doc = mail.model_dump()
-                doc['created_at'] = doc['created_at'].isoformat()
-                for step in doc['workflow']:
-                    step['timestamp'] = step['timestamp'].isoformat()
-                
-                await db.mails.insert_one(doc)
-                stats["mails_created"] += 1
-                
-            except Exception as e:
-                stats["errors"].append(f"Ligne {row_number}: {str(e)}")
-                continue
-        
-        return ImportStats(**stats)
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erreur lors du traitement du fichier: {str(e)}")
+                importer = CsvMailImporter(db, default_service, admin_user, batch_size=batch_size, on_progress=on_progress)
+                stats = await importer.run(handle)
+            
+            await context.update(
+                {**{k: v for k, v in stats.items() if k != "errors"}, "bytes_read": total_bytes, "total_bytes": total_bytes},
+                stats["errors"]
+            )
+            logger.info(
+                f"Import CSV: {stats['rows_processed']} lignes en {stats['duration_seconds']}s "
+                f"({stats['rows_per_second']} lignes/s)"
+            )
+            return ImportStats(**stats).model_dump(exclude={"errors"})
+        finally:
+            os.unlink(path)
+    
+    return await job_runner.submit(
+        "import_csv",
+        run_import,
+        created_by=admin_user['sub'],
+        params={"filename": file.filename, "batch_size": batch_size, "total_bytes": total_bytes},
+    )
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job_status(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get progress, errors and result of a background job"""
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user.get("role") != "admin" and job.get("created_by") != current_user.get("sub"):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return job
+
+# ===== EXPORT ROUTES =====
+
+@api_router.get("/export/mails")
+async def export_mails(
+    format: str = "ndjson",
+    gzip: bool = False,
+    query: dict = Depends(mail_list_query)
+):
+    """Stream every mail matching the GET /mails filters as NDJSON or CSV, optionally gzipped"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format, expected one of: {', '.join(EXPORT_FORMATS)}")
+    
+    # Curseur lu par lots de EXPORT_BATCH_SIZE : seul le lot courant est en mémoire
+    cursor = db.mails.find(query, MAIL_PROJECTION).sort(MAIL_SORT).batch_size(EXPORT_BATCH_SIZE)
+    
+    media_type = "application/gzip" if gzip else EXPORT_FORMATS[format][0]
+    filename = export_filename(format, gzip, datetime.now(timezone.utc))
+    return StreamingResponse(
+        export_stream(cursor, format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# ===== EVENTS ROUTES =====
+
+@api_router.post("/events/token")
+async def get_stream_token(current_user: dict = Depends(get_current_user)):
+    """Issue a short-lived token for /events/stream, the main token must not appear in URLs"""
+    return {"token": create_stream_token(current_user), "expires_in": STREAM_TOKEN_SECONDS}
+
+@api_router.get("/events/stream")
+async def stream_events(request: Request, current_user: dict = Depends(get_stream_user)):
+    """Server-Sent Events: mail created / status changed / assigned, limited to the mails the user can see"""
+    return StreamingResponse(
+        sse_stream(event_bus, lambda event: is_mail_visible(current_user, event["mail"]), request.is_disconnected),
+        media_type="text/event-stream",
+        # X-Accel-Buffering : empêcher nginx de retenir les messages
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ===== ADMIN ROUTES =====
+
+@api_router.get("/admin/indexes")
+async def get_index_report(admin_user: dict = Depends(require_admin)):
+    """Report schema version and declared indexes missing from the database (admin only)"""
+    return await index_report(db)
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(limit: int = 100, admin_user: dict = Depends(require_admin)):
+    """MongoDB commands slower than SLOW_QUERY_MS, grouped by query shape with their winning plan (admin only)"""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.report(max(1, min(limit, 500))),
+    }
+
+@api_router.delete("/admin/slow-queries")
+async def reset_slow_queries(admin_user: dict = Depends(require_admin)):
+    """Clear the slow query log of this replica (admin only)"""
+    slow_query_log.reset()
+    return {"message": "Journal des requêtes lentes vidé"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (request and MongoDB command metrics)"""
+    return metrics_response()
 
 # Include router
 app.include_router(api_router)
@@ -1261,6 +1520,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Ajouté en dernier pour englober les autres middlewares dans la mesure
+app.add_middleware(MetricsMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -1273,8 +1535,38 @@ async def load_azure_config():
     await azure_scheme.openid_config.load_config()
     logger.info("Azure AD configuration loaded successfully")
 
+@app.on_event("startup")
+async def attach_slow_query_log():
+    """Let the slow query listener schedule explain() calls on the event loop"""
+    slow_query_log.attach(client, asyncio.get_running_loop())
+
+@app.on_event("startup")
+async def apply_schema_migrations():
+    """Apply pending index/data migrations (disable with RUN_MIGRATIONS=false)"""
+    if os.environ.get('RUN_MIGRATIONS', 'true').lower() != 'true':
+        return
+    try:
+        applied = await run_migrations(db)
+        if applied:
+            logger.info(f"Migrations appliquées: {applied}")
+    except Exception as e:
+        # Ne pas bloquer le démarrage : l'état est visible via /api/admin/indexes
+        logger.error(f"Échec des migrations: {e}")
+
+@app.on_event("startup")
+async def start_job_runner():
+    """Flag jobs abandoned by a stopped replica and start the job heartbeat"""
+    await job_runner.start()
+
+@app.on_event("startup")
+async def start_event_bus():
+    """Start following events published by the other replicas (mongodb bus)"""
+    await event_bus.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await event_bus.stop()
+    await job_runner.shutdown()
     client.close()
 
 # Les fonctions get_current_user et require_admin sont déjà définies
@@ -0,0 +1,222 @@
+"""
+Journal des requêtes MongoDB lentes
+Un CommandListener pymongo relève toute commande plus longue que
+SLOW_QUERY_MS : collection, commande, forme du filtre (valeurs remplacées par
+"?") et durée. Pour chaque nouvelle forme, le plan gagnant (IXSCAN, COLLSCAN…)
+est récupéré une fois avec explain. Les entrées sont agrégées par forme et
+consultables via GET /api/admin/slow-queries
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+EXPLAIN_SLOW_QUERIES = os.environ.get("EXPLAIN_SLOW_QUERIES", "true").lower() == "true"
+
+# Nombre de formes de requêtes distinctes conservées (les plus anciennes sont oubliées)
+MAX_ENTRIES = 500
+
+# Commandes portant un filtre, et où le trouver dans le document de commande
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+# Champs de session/transport à retirer avant de rejouer une commande dans explain
+TRANSPORT_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "readConcern", "writeConcern"}
+
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values by "?" while keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        return "?"
+    if hasattr(value, "pattern"):
+        return "/regex/"
+    return "?"
+
+
+def pipeline_shape(pipeline: List[dict]) -> List[Any]:
+    """Stage names, with the shape of $match filters and $sort keys"""
+    shape = []
+    for stage in pipeline:
+        name = next(iter(stage), "?")
+        if name == "$match":
+            shape.append({name: query_shape(stage[name])})
+        elif name == "$sort":
+            shape.append({name: dict(stage[name])})
+        else:
+            shape.append(name)
+    return shape
+
+
+def command_shape(command_name: str, command: dict) -> Any:
+    field = FILTER_FIELDS[command_name]
+    value = command.get(field)
+    if command_name == "aggregate":
+        return pipeline_shape(value or [])
+    if command_name == "update":
+        return [{"q": query_shape(op.get("q", {})), "multi": op.get("multi", False)} for op in (value or [])[:1]]
+    if command_name == "delete":
+        return [{"q": query_shape(op.get("q", {}))} for op in (value or [])[:1]]
+    shape = {"filter": query_shape(value or {})}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    return shape
+
+
+def summarize_plan(explain: dict) -> Optional[dict]:
+    """Extract the winning plan stages and index names from an explain result"""
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # Agrégation : le plan se trouve dans l'étape $cursor
+        for stage in explain.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    if not planner:
+        return None
+
+    stages, indexes = [], []
+    node = planner.get("winningPlan", {})
+    node = node.get("queryPlan", node)
+    while node:
+        stages.append(node.get("stage", "?"))
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        children = node.get("inputStages") or ([node["inputStage"]] if "inputStage" in node else [])
+        node = children[0] if children else None
+    return {
+        "stages": " <- ".join(stages),
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Aggregate MongoDB commands slower than a threshold by query shape"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain: bool = EXPLAIN_SLOW_QUERIES):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._pending: Dict[Tuple, Tuple[str, dict]] = {}
+        self._entries: "OrderedDict[Tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._explains: Set[asyncio.Task] = set()
+
+    def attach(self, client: AsyncIOMotorClient, loop: asyncio.AbstractEventLoop) -> None:
+        """Give the listener the client and loop used to run explain"""
+        self._client = client
+        self._loop = loop
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name not in FILTER_FIELDS:
+            # explain, getMore, insert… : pas de filtre à analyser
+            return
+        self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event)
+
+    def _finish(self, event) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        database, command = pending
+        self.record(database, event.command_name, command, duration_ms)
+
+    def record(self, database: str, command_name: str, command: dict, duration_ms: float) -> None:
+        collection = command.get(command_name)
+        shape = command_shape(command_name, command)
+        key = (database, collection, command_name, json.dumps(shape, sort_keys=True, default=str))
+        logger.warning(f"Requête lente {collection}.{command_name} {duration_ms:.0f} ms {key[3]}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            is_new = entry is None
+            if is_new:
+                entry = {
+                    "collection": collection,
+                    "command": command_name,
+                    "shape": shape,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "plan": None,
+                }
+                self._entries[key] = entry
+                while len(self._entries) > MAX_ENTRIES:
+                    self._entries.popitem(last=False)
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = datetime.now(timezone.utc).isoformat()
+            self._entries.move_to_end(key)
+
+        # Le listener s'exécute dans un thread de Motor : planifier explain sur la boucle
+        if is_new and self.explain and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._schedule_explain, key, database, command)
+
+    def _schedule_explain(self, key: Tuple, database: str, command: dict) -> None:
+        task = asyncio.ensure_future(self._explain(key, database, command))
+        self._explains.add(task)
+        task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, key: Tuple, database: str, command: dict) -> None:
+        replay = {name: value for name, value in command.items() if name not in TRANSPORT_FIELDS}
+        if "pipeline" in replay:
+            # Ne jamais écrire pendant un explain : retirer $out/$merge
+            replay["pipeline"] = [stage for stage in replay["pipeline"] if not {"$out", "$merge"} & set(stage)]
+        try:
+            result = await self._client[database].command({"explain": replay, "verbosity": "queryPlanner"})
+            plan = summarize_plan(result)
+        except Exception as e:
+            plan = {"error": str(e)}
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]["plan"] = plan
+
+    def report(self, limit: int = 100) -> List[dict]:
+        """Slow query shapes, most expensive (total time) first"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        for entry in entries:
+            entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 1)
+            entry["total_ms"] = round(entry["total_ms"], 1)
+            entry["max_ms"] = round(entry["max_ms"], 1)
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return entries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
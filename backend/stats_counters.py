@@ -0,0 +1,146 @@
+"""
+Compteurs de statistiques matérialisés (collection mail_stats)
+Un document par combinaison service / type / statut / type de message / jour,
+mis à jour de façon incrémentale à chaque écriture sur les courriers ;
+les statistiques du tableau de bord deviennent une lecture en O(nombre de buckets)
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from date_codec import DAY_EXPRESSION
+
+STATS_COLLECTION = "mail_stats"
+
+# Champs d'un courrier nécessaires pour calculer son bucket
+BUCKET_PROJECTION = {"_id": 0, "service_id": 1, "type": 1, "status": 1, "message_type": 1, "created_at": 1}
+
+Bucket = Tuple[Optional[str], Optional[str], Optional[str], Optional[str], str]
+
+# Clé de bucket dans une agrégation ; mêmes valeurs par défaut que bucket_of
+# pour que mises à jour incrémentales et reconstruction tombent sur le même bucket
+BUCKET_GROUP_KEY = {
+    "service_id": "$service_id",
+    "type": "$type",
+    "status": {"$ifNull": ["$status", "recu"]},
+    "message_type": {"$ifNull": ["$message_type", "courrier"]},
+    "day": DAY_EXPRESSION,
+}
+
+
+def day_of(created_at) -> str:
+    """Return the UTC day (YYYY-MM-DD) of a stored creation date"""
+    if isinstance(created_at, datetime):
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc)
+        return created_at.strftime("%Y-%m-%d")
+    if isinstance(created_at, str):
+        return created_at[:10]
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def bucket_of(mail: dict) -> Bucket:
+    return (
+        mail.get("service_id"),
+        mail.get("type"),
+        mail.get("status") or "recu",
+        mail.get("message_type") or "courrier",
+        day_of(mail.get("created_at")),
+    )
+
+
+def _bucket_update(bucket: Bucket, delta: int) -> UpdateOne:
+    service_id, mail_type, status, message_type, day = bucket
+    return UpdateOne(
+        {
+            "service_id": service_id,
+            "type": mail_type,
+            "status": status,
+            "message_type": message_type,
+            "day": day,
+        },
+        {"$inc": {"count": delta}},
+        upsert=True,
+    )
+
+
+async def apply_deltas(db: AsyncIOMotorDatabase, deltas: Counter) -> None:
+    """Apply bucket count deltas in a single bulk write"""
+    operations = [_bucket_update(bucket, delta) for bucket, delta in deltas.items() if delta]
+    if operations:
+        await db[STATS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def record_created(db: AsyncIOMotorDatabase, mails: Iterable[dict]) -> None:
+    await apply_deltas(db, Counter(bucket_of(mail) for mail in mails))
+
+
+async def record_deleted(db: AsyncIOMotorDatabase, mails: Iterable[dict]) -> None:
+    deltas = Counter()
+    for mail in mails:
+        deltas[bucket_of(mail)] -= 1
+    await apply_deltas(db, deltas)
+
+
+async def record_transition(db: AsyncIOMotorDatabase, before: dict, after: dict) -> None:
+    """Move a mail from its previous bucket to its new one (status, service, type changes)"""
+    old_bucket, new_bucket = bucket_of(before), bucket_of(after)
+    if old_bucket == new_bucket:
+        return
+    await apply_deltas(db, Counter({old_bucket: -1, new_bucket: 1}))
+
+
+async def record_bulk_status_change(db: AsyncIOMotorDatabase, match: dict, new_status: str) -> None:
+    """
+    Move every mail matching a filter to another status bucket
+
+    Must be called before the corresponding update_many; the affected
+    buckets are computed with one aggregation.
+    """
+    rows = await db.mails.aggregate([
+        {"$match": {**match, "status": {"$ne": new_status}}},
+        {"$group": {"_id": BUCKET_GROUP_KEY, "count": {"$sum": 1}}},
+    ]).to_list(None)
+
+    deltas = Counter()
+    for row in rows:
+        key = row["_id"]
+        old_bucket = (key.get("service_id"), key.get("type"), key.get("status"), key.get("message_type"), key["day"])
+        deltas[old_bucket] -= row["count"]
+        deltas[old_bucket[:2] + (new_status,) + old_bucket[3:]] += row["count"]
+    await apply_deltas(db, deltas)
+
+
+async def rebuild_counters(db: AsyncIOMotorDatabase) -> int:
+    """
+    Recompute mail_stats from the mails collection (drift repair)
+
+    $out replaces the collection atomically once the aggregation completes.
+
+    Returns:
+        int: number of buckets written
+    """
+    await db.mails.aggregate([
+        {"$group": {"_id": BUCKET_GROUP_KEY, "count": {"$sum": 1}}},
+        {"$project": {
+            "_id": 0,
+            "service_id": "$_id.service_id",
+            "type": "$_id.type",
+            "status": "$_id.status",
+            "message_type": "$_id.message_type",
+            "day": "$_id.day",
+            "count": 1,
+        }},
+        {"$out": STATS_COLLECTION},
+    ]).to_list(None)
+    # La collection n'existe pas forcément avant le premier $out
+    await db[STATS_COLLECTION].create_index(
+        [("service_id", 1), ("type", 1), ("status", 1), ("message_type", 1), ("day", 1)],
+        name="bucket_unique",
+        unique=True,
+    )
+    return await db[STATS_COLLECTION].count_documents({})
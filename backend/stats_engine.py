@@ -0,0 +1,92 @@
+"""
+Moteur de statistiques en une seule agrégation $facet
+Chaque indicateur (comptage ou répartition par champ) devient une branche du
+$facet, ce qui permet d'ajouter une répartition sans nouvelle requête
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+MAIL_STATUSES = ["recu", "traitement", "traite", "archive"]
+MAIL_TYPES = ["entrant", "sortant"]
+MESSAGE_TYPES = ["courrier", "email", "accueil_physique", "accueil_telephonique", "colis"]
+
+
+class StatsQuery:
+    """
+    Builder of a single-round-trip statistics aggregation
+
+    Example:
+        stats = StatsQuery({"service_id": "service-1"})
+        stats.count("total")
+        stats.group("status_counts", "status", keys=MAIL_STATUSES)
+        result = await stats.run(db.mails)
+    """
+
+    def __init__(self, match: Optional[dict] = None, weight: Optional[str] = None):
+        """
+        Args:
+            match: filter applied before every facet
+            weight: numeric field summed instead of counting documents
+                (used on pre-aggregated counter collections)
+        """
+        self.match = match or {}
+        self._sum = f"${weight}" if weight else 1
+        self._facets: Dict[str, List[dict]] = {}
+        self._groups: Dict[str, Optional[List[str]]] = {}
+
+    def count(self, name: str, match: Optional[dict] = None) -> "StatsQuery":
+        """Count documents (optionally restricted by an extra filter)"""
+        pipeline = [{"$match": match}] if match else []
+        pipeline.append({"$group": {"_id": None, "count": {"$sum": self._sum}}})
+        self._facets[name] = pipeline
+        return self
+
+    def group(self, name: str, field: str, keys: Optional[Iterable[str]] = None, match: Optional[dict] = None) -> "StatsQuery":
+        """
+        Count documents per value of a field
+
+        Args:
+            keys: values always present in the result (0 when absent);
+                when given, other values are dropped
+            match: extra filter for this breakdown only
+        """
+        pipeline = [{"$match": match}] if match else []
+        pipeline.append({"$group": {"_id": f"${field}", "count": {"$sum": self._sum}}})
+        self._facets[name] = pipeline
+        self._groups[name] = list(keys) if keys is not None else None
+        return self
+
+    def pipeline(self) -> List[dict]:
+        stages = []
+        if self.match:
+            stages.append({"$match": self.match})
+        stages.append({"$facet": self._facets})
+        return stages
+
+    async def run(self, collection) -> dict:
+        """Execute the aggregation and shape each facet (int for counts, dict for groups)"""
+        docs = await collection.aggregate(self.pipeline()).to_list(1)
+        raw = docs[0] if docs else {}
+
+        result = {}
+        for name in self._facets:
+            rows = raw.get(name, [])
+            if name not in self._groups:
+                result[name] = rows[0]["count"] if rows else 0
+                continue
+
+            keys = self._groups[name]
+            counts = {row["_id"]: row["count"] for row in rows if row["_id"] is not None}
+            if keys is None:
+                result[name] = counts
+            else:
+                result[name] = {key: counts.get(key, 0) for key in keys}
+        return result
+
+
+def add_mail_breakdowns(stats: StatsQuery, match: Optional[dict] = None) -> StatsQuery:
+    """Register the totals and breakdowns shared by the dashboard endpoints"""
+    stats.count("total_mails", match)
+    stats.group("type_counts", "type", keys=MAIL_TYPES, match=match)
+    stats.group("status_counts", "status", keys=MAIL_STATUSES, match=match)
+    return stats
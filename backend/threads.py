@@ -0,0 +1,97 @@
+"""
+Résolution des fils de discussion (courrier initial et réponses)
+Les ancêtres et les descendants d'un courrier, à toute profondeur, sont
+obtenus en une seule agrégation $graphLookup sur parent_mail_id
+"""
+
+from typing import Callable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Profondeur maximale parcourue dans chaque direction
+MAX_THREAD_DEPTH = 50
+
+THREAD_NODE_FIELDS = ["id", "reference", "type", "subject", "status", "created_at", "parent_mail_id"]
+# Champs lus pour filtrer les courriers visibles, retirés des nœuds renvoyés
+VISIBILITY_FIELDS = ["service_id", "service_ids", "final_recipient_ids", "final_recipient_emails"]
+
+
+def _node_projection(array: str) -> dict:
+    """Keep only the summary fields (and depth) of each mail found by $graphLookup"""
+    fields = {field: f"$$node.{field}" for field in THREAD_NODE_FIELDS + VISIBILITY_FIELDS}
+    fields["depth"] = "$$node.depth"
+    return {"$map": {"input": f"${array}", "as": "node", "in": fields}}
+
+
+def _strip(node: dict) -> dict:
+    for field in VISIBILITY_FIELDS:
+        node.pop(field, None)
+    return node
+
+
+async def resolve_thread(
+    db: AsyncIOMotorDatabase,
+    mail_id: str,
+    visible: Optional[Callable[[dict], bool]] = None,
+) -> Optional[dict]:
+    """
+    Return the reply tree around a mail
+
+    Args:
+        visible: predicate on a mail (with VISIBILITY_FIELDS); mails it
+            rejects are left out of the tree
+
+    Returns:
+        dict: {"mail": node, "ancestors": [...], "descendants": [...]} where
+        ancestors are ordered from the thread root down to the direct
+        parent and descendants by creation date; None if the mail does not
+        exist or is not visible
+    """
+    pipeline = [
+        {"$match": {"id": mail_id}},
+        {"$graphLookup": {
+            "from": "mails",
+            "startWith": "$parent_mail_id",
+            "connectFromField": "parent_mail_id",
+            "connectToField": "id",
+            "as": "ancestors",
+            "maxDepth": MAX_THREAD_DEPTH,
+            "depthField": "depth",
+        }},
+        {"$graphLookup": {
+            "from": "mails",
+            "startWith": "$id",
+            "connectFromField": "id",
+            "connectToField": "parent_mail_id",
+            "as": "descendants",
+            "maxDepth": MAX_THREAD_DEPTH,
+            "depthField": "depth",
+        }},
+        {"$project": {
+            "_id": 0,
+            **{field: 1 for field in THREAD_NODE_FIELDS + VISIBILITY_FIELDS},
+            "ancestors": _node_projection("ancestors"),
+            "descendants": _node_projection("descendants"),
+        }},
+    ]
+    docs = await db.mails.aggregate(pipeline).to_list(1)
+    if not docs:
+        return None
+
+    doc = docs[0]
+    if visible is not None and not visible(doc):
+        return None
+    ancestors = [node for node in doc.pop("ancestors") if visible is None or visible(node)]
+    descendants = [node for node in doc.pop("descendants") if visible is None or visible(node)]
+    ancestors.sort(key=lambda node: node["depth"], reverse=True)
+    descendants.sort(key=lambda node: (str(node.get("created_at")), node["id"]))
+    return {
+        "mail": _strip(doc),
+        "ancestors": [_strip(node) for node in ancestors],
+        "descendants": [_strip(node) for node in descendants],
+    }
+
+
+async def drop_related_mails(db: AsyncIOMotorDatabase) -> None:
+    """Remove the related_mails arrays formerly denormalized into parent mails"""
+    await db.mails.update_many({"related_mails": {"$exists": True}}, {"$unset": {"related_mails": ""}})
@@ -1,7 +1,7 @@
 from fastapi import Depends, HTTPException, Header, Security, status
 from fastapi_azure_auth.user import User as AzureUser
-import jwt
 from datetime import datetime, timezone
+from principals import decode_token, get_user_by_email, invalidate_user, resolve_principal
 
 JWT_SECRET = "fallback_secret_key_2025"
 JWT_ALGORITHM = "HS256"
@@ -31,7 +31,7 @@ async def get_current_user_unified(
                 raise HTTPException(status_code=401, detail="Email not found in Azure AD token")
             
             # Check if user exists in MongoDB
-            existing_user = await db.users.find_one({"email": email}, {"_id": 0})
+            existing_user = await get_user_by_email(db, email)
             
             if existing_user:
                 # Update last login
@@ -40,6 +40,7 @@ async def get_current_user_unified(
                         {"email": email},
                         {"$set": {"oid": oid, "name": name}}
                     )
+                    invalidate_user(existing_user["id"], email)
                     existing_user["oid"] = oid
                     existing_user["name"] = name
                 
@@ -58,10 +59,11 @@ async def get_current_user_unified(
                     "name": name,
                     "role": "user",
                     "oid": oid,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "created_at": datetime.now(timezone.utc),
                     "password": ""
                 }
                 await db.users.insert_one(new_user)
+                invalidate_user(new_user["id"], email)
                 
                 return {
                     "id": new_user["id"],
@@ -83,16 +85,16 @@ async def get_current_user_unified(
         if scheme.lower() != "bearer":
             raise HTTPException(status_code=401, detail="Invalid authentication scheme")
         
-        # Try to decode as JWT
+        # Try to decode as JWT (payload cached until expiry, role read from the user record)
         JWT_SECRET_ENV = os.environ.get('JWT_SECRET', JWT_SECRET)
-        payload = jwt.decode(token, JWT_SECRET_ENV, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        payload = decode_token(token, JWT_SECRET_ENV, JWT_ALGORITHM)
     except ValueError:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
+    if "scope" in payload:
+        # Jeton de flux SSE : réservé à /events/stream
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    return await resolve_principal(db, payload)
 
 async def require_admin_unified(current_user: dict = Depends(get_current_user_unified)) -> dict:
     """Require admin role - works with both Azure AD and legacy auth"""
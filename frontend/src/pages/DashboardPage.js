@@ -16,6 +16,55 @@ const DashboardPage = ({ user }) => {
     fetchRecentMails();
   }, []);
 
+  // Mise à jour poussée par le serveur (SSE) au lieu d'un rafraîchissement manuel ;
+  // les événements rapprochés sont regroupés en un seul rechargement.
+  // EventSource ne peut pas envoyer d'en-tête : le flux est ouvert avec un jeton
+  // court dédié (jamais le JWT principal dans l'URL), redemandé à chaque reconnexion
+  useEffect(() => {
+    if (!localStorage.getItem("token")) return undefined;
+
+    let source = null;
+    let timer = null;
+    let retry = null;
+    let closed = false;
+    const refresh = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => {
+        fetchStats();
+        fetchRecentMails();
+      }, 1000);
+    };
+    const connect = async (reconnecting = false) => {
+      try {
+        const response = await axios.post(`${API}/events/token`);
+        if (closed) return;
+        source = new EventSource(`${API}/events/stream?access_token=${encodeURIComponent(response.data.token)}`);
+        ["mail.created", "mail.status_changed", "mail.assigned", "resync"].forEach((type) =>
+          source.addEventListener(type, refresh)
+        );
+        // Des événements ont pu être manqués pendant la coupure
+        if (reconnecting) source.onopen = refresh;
+        source.onerror = () => {
+          // La reconnexion automatique réutiliserait un jeton expiré
+          source.close();
+          retry = setTimeout(() => connect(true), 5000);
+        };
+      } catch (error) {
+        if (closed) return;
+        console.error("Error opening event stream:", error);
+        retry = setTimeout(() => connect(reconnecting), 30000);
+      }
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, []);
+
   const fetchStats = async () => {
     try {
       const response = await axios.get(`${API}/stats`);
@@ -27,8 +76,8 @@ const DashboardPage = ({ user }) => {
 
   const fetchRecentMails = async () => {
     try {
-      const response = await axios.get(`${API}/mails`);
-      setRecentMails(response.data.slice(0, 5));
+      const response = await axios.get(`${API}/mails/summary`, { params: { limit: 5 } });
+      setRecentMails(response.data.items);
     } catch (error) {
       console.error("Error fetching recent mails:", error);
     }
@@ -13,6 +13,7 @@ const ImportPage = ({ user }) => {
   const [file, setFile] = useState(null);
   const [importing, setImporting] = useState(false);
   const [result, setResult] = useState(null);
+  const [progress, setProgress] = useState(null);
   const fileInputRef = useRef(null);
 
   const isAdmin = user?.role === "admin";
@@ -68,19 +69,28 @@ const ImportPage = ({ user }) => {
       const formData = new FormData();
       formData.append('file', file);
 
+      setProgress(null);
       const response = await axios.post(`${API}/import/csv`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data'
         }
       });
 
-      setResult(response.data);
+      // The import runs in the background: poll the job until it finishes
+      const job = await waitForJob(response.data.id);
+      if (job.status !== "completed") {
+        toast.error(job.failure || "L'import a été interrompu");
+        return;
+      }
+
+      const importResult = { ...job.result, errors: job.errors };
+      setResult(importResult);
       
-      const total = response.data.correspondents_created + response.data.mails_created;
-      if (response.data.errors.length === 0) {
+      const total = importResult.correspondents_created + importResult.mails_created;
+      if (job.error_count === 0) {
         toast.success(`Import réussi ! ${total} élément(s) importé(s)`);
       } else {
-        toast.warning(`Import terminé avec ${response.data.errors.length} erreur(s)`);
+        toast.warning(`Import terminé avec ${job.error_count} erreur(s)`);
       }
       
     } catch (error) {
@@ -88,9 +98,26 @@ const ImportPage = ({ user }) => {
       toast.error(error.response?.data?.detail || "Erreur lors de l'import");
     } finally {
       setImporting(false);
+      setProgress(null);
     }
   };
 
+  const waitForJob = async (jobId) => {
+    for (;;) {
+      const response = await axios.get(`${API}/jobs/${jobId}`);
+      const job = response.data;
+      setProgress(job.progress);
+      if (!["pending", "running"].includes(job.status)) {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
+  const progressPercent = progress?.total_bytes
+    ? Math.min(100, Math.round((progress.bytes_read / progress.total_bytes) * 100))
+    : 0;
+
   const downloadTemplate = () => {
     const template = `nom,prenom,telephone_fixe,telephone_mobile,adresse_mail,adresse_postale,titre_message,type,statut
 Dupont,Jean,0123456789,0612345678,jean.dupont@example.com,"12 Rue de la Paix, 75000 Paris","Demande de renseignements",entrant,en_cours
@@ -251,6 +278,16 @@ Martin,Sophie,,0698765432,sophie.martin@example.com,"45 Avenue des Champs, 75000
               </>
             )}
           </Button>
+
+          {importing && progress && (
+            <div className="space-y-2" data-testid="import-progress">
+              <Progress value={progressPercent} />
+              <p className="text-xs text-slate-500">
+                {progress.rows_processed || 0} ligne(s) traitée(s)
+                {progress.rows_per_second ? ` · ${progress.rows_per_second} lignes/s` : ""}
+              </p>
+            </div>
+          )}
         </CardContent>
       </Card>
 
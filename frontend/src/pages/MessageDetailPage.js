@@ -272,11 +272,27 @@ const MessageDetailPage = ({ user }) => {
     setAttachments(prev => prev.filter(a => a.id !== attachmentId));
   };
 
-  const downloadAttachment = (attachment) => {
+  const downloadAttachment = async (attachment) => {
     const link = document.createElement('a');
-    link.href = `data:${attachment.content_type};base64,${attachment.data}`;
     link.download = attachment.filename;
-    link.click();
+    if (attachment.data) {
+      // Pending attachment of a new message, still held in memory
+      link.href = `data:${attachment.content_type};base64,${attachment.data}`;
+      link.click();
+      return;
+    }
+    try {
+      const response = await axios.get(`${API}/mails/${id}/attachments/${attachment.id}`, {
+        responseType: 'blob'
+      });
+      const url = URL.createObjectURL(response.data);
+      link.href = url;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error("Error downloading attachment:", error);
+      toast.error("Erreur lors du téléchargement de la pièce jointe");
+    }
   };
 
   const startBarcodeScanning = () => {
@@ -561,7 +577,8 @@ const MessageDetailPage = ({ user }) => {
           status,
           assigned_to_id: assignedTo,
           assigned_to_name: users.find(u => u.id === assignedTo)?.name || null,
-          comment: comment || null
+          comment: comment || null,
+          expected_version: mail?.version ?? 0
         };
         
         await axios.put(`${API}/mails/${id}`, updateData);
@@ -571,7 +588,12 @@ const MessageDetailPage = ({ user }) => {
       }
     } catch (error) {
       console.error("Error saving mail:", error);
-      toast.error("Erreur lors de l'enregistrement");
+      if (error.response?.status === 409) {
+        toast.error("Ce message a été modifié par un autre utilisateur. Rechargement...");
+        fetchMail();
+      } else {
+        toast.error("Erreur lors de l'enregistrement");
+      }
     } finally {
       setLoading(false);
     }
@@ -9,6 +9,38 @@ import { Badge } from "../components/ui/badge";
 import { Plus, Search, Filter } from "lucide-react";
 import { API } from "../App";
 
+// Listes déjà chargées, par utilisateur et filtres : au retour sur la page,
+// seuls les changements depuis le jeton sont demandés (GET /mails/changes)
+const listCache = new Map();
+
+const compareMails = (a, b) => {
+  if (a.created_at !== b.created_at) {
+    return new Date(b.created_at) - new Date(a.created_at);
+  }
+  return a.id < b.id ? 1 : -1;
+};
+
+const matchesFilters = (mail, params) =>
+  (!params.service_id || mail.service_id === params.service_id) &&
+  (!params.status || mail.status === params.status);
+
+// Fusionne les changements dans la liste chargée ; les courriers plus anciens
+// que la dernière page chargée arriveront avec "Charger plus". deleted contient
+// aussi les courriers réaffectés hors de la visibilité de l'utilisateur
+const applyChanges = (entry, changes, params) => {
+  const removed = new Set([...changes.deleted, ...changes.items.map((mail) => mail.id)]);
+  const oldest = entry.mails[entry.mails.length - 1];
+  const added = changes.items.filter((mail) =>
+    matchesFilters(mail, params) &&
+    (!entry.nextCursor || !oldest || compareMails(mail, oldest) <= 0)
+  );
+  return {
+    ...entry,
+    mails: [...entry.mails.filter((mail) => !removed.has(mail.id)), ...added].sort(compareMails),
+    token: changes.next_token,
+  };
+};
+
 const MessagesPage = ({ user }) => {
   const { type } = useParams();
   const navigate = useNavigate();
@@ -19,6 +51,8 @@ const MessagesPage = ({ user }) => {
   const [selectedService, setSelectedService] = useState("all");
   const [selectedStatus, setSelectedStatus] = useState("all");
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     // Check if there's a status filter in URL
@@ -27,17 +61,75 @@ const MessagesPage = ({ user }) => {
       setSelectedStatus(statusFromUrl);
     }
     
-    fetchMails();
     fetchServices();
   }, [type, searchParams]);
 
+  useEffect(() => {
+    fetchMails();
+  }, [type, selectedService, selectedStatus]);
+
+  const buildMailParams = (cursor) => {
+    const params = { type };
+    if (selectedService !== "all") params.service_id = selectedService;
+    if (selectedStatus !== "all") params.status = selectedStatus;
+    if (cursor) params.cursor = cursor;
+    return params;
+  };
+
+  const cacheKey = () => JSON.stringify({ user: user?.id, ...buildMailParams() });
+
+  const showEntry = (entry) => {
+    setMails(entry.mails);
+    setNextCursor(entry.nextCursor);
+  };
+
+  const syncChanges = async (entry, params) => {
+    let synced = entry;
+    let hasMore = true;
+    while (hasMore) {
+      const response = await axios.get(`${API}/mails/changes`, {
+        params: { type, since: synced.token }
+      });
+      synced = applyChanges(synced, response.data, params);
+      hasMore = response.data.has_more;
+    }
+    return synced;
+  };
+
   const fetchMails = async () => {
+    const key = cacheKey();
+    const params = buildMailParams();
+    const cached = listCache.get(key);
+    if (cached) {
+      showEntry(cached);
+      setLoading(false);
+      try {
+        const synced = await syncChanges(cached, params);
+        listCache.set(key, synced);
+        showEntry(synced);
+        return;
+      } catch (error) {
+        // 410 : jeton expiré, la liste complète est rechargée
+        if (error.response?.status !== 410) {
+          console.error("Error syncing mails:", error);
+          return;
+        }
+        listCache.delete(key);
+      }
+    }
+
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/mails`, {
-        params: { type }
-      });
-      setMails(response.data);
+      // Position prise avant le chargement : rien n'est perdu entre les deux
+      const position = await axios.get(`${API}/mails/changes`, { params: { type } });
+      const response = await axios.get(`${API}/mails/summary`, { params });
+      const entry = {
+        mails: response.data.items,
+        nextCursor: response.data.has_more ? response.data.next_cursor : null,
+        token: position.data.next_token,
+      };
+      listCache.set(key, entry);
+      showEntry(entry);
     } catch (error) {
       console.error("Error fetching mails:", error);
     } finally {
@@ -45,6 +137,30 @@ const MessagesPage = ({ user }) => {
     }
   };
 
+  const fetchMoreMails = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`${API}/mails/summary`, {
+        params: buildMailParams(nextCursor)
+      });
+      const key = cacheKey();
+      const cached = listCache.get(key);
+      const loaded = new Set(mails.map((mail) => mail.id));
+      const entry = {
+        token: cached?.token,
+        mails: [...mails, ...response.data.items.filter((mail) => !loaded.has(mail.id))],
+        nextCursor: response.data.has_more ? response.data.next_cursor : null,
+      };
+      if (cached) listCache.set(key, entry);
+      showEntry(entry);
+    } catch (error) {
+      console.error("Error fetching more mails:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchServices = async () => {
     try {
       const response = await axios.get(`${API}/services`);
@@ -54,17 +170,12 @@ const MessagesPage = ({ user }) => {
     }
   };
 
-  const filteredMails = mails.filter((mail) => {
-    const matchesSearch =
-      mail.subject.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      mail.reference.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      mail.correspondent_name.toLowerCase().includes(searchTerm.toLowerCase());
-    
-    const matchesService = selectedService === "all" || mail.service_id === selectedService;
-    const matchesStatus = selectedStatus === "all" || mail.status === selectedStatus;
-    
-    return matchesSearch && matchesService && matchesStatus;
-  });
+  // Service and status filters are applied server-side
+  const filteredMails = mails.filter((mail) =>
+    mail.subject.toLowerCase().includes(searchTerm.toLowerCase()) ||
+    mail.reference.toLowerCase().includes(searchTerm.toLowerCase()) ||
+    mail.correspondent_name.toLowerCase().includes(searchTerm.toLowerCase())
+  );
 
   const getStatusBadge = (status) => {
     const statusMap = {
@@ -178,9 +289,9 @@ const MessagesPage = ({ user }) => {
                     <div className="flex items-center gap-3 mb-2">
                       <span className="font-semibold text-slate-900">{mail.reference}</span>
                       {getStatusBadge(mail.status)}
-                      {mail.attachments && mail.attachments.length > 0 && (
+                      {mail.attachment_count > 0 && (
                         <Badge variant="outline" className="text-xs">
-                          {mail.attachments.length} pièce(s) jointe(s)
+                          {mail.attachment_count} pièce(s) jointe(s)
                         </Badge>
                       )}
                     </div>
@@ -206,6 +317,18 @@ const MessagesPage = ({ user }) => {
               </CardContent>
             </Card>
           ))}
+          {nextCursor && (
+            <div className="text-center">
+              <Button
+                data-testid="load-more-button"
+                variant="outline"
+                onClick={fetchMoreMails}
+                disabled={loadingMore}
+              >
+                {loadingMore ? "Chargement..." : "Charger plus"}
+              </Button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -12,6 +12,10 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent / 'backend'))
 
+from correspondent_search import search_fields  # noqa: E402
+from sequences import COUNTERS_COLLECTION, seed_reference_counters  # noqa: E402
+from stats_counters import rebuild_counters  # noqa: E402
+
 ROOT_DIR = Path(__file__).parent.parent / 'backend'
 load_dotenv(ROOT_DIR / '.env')
 
@@ -30,6 +34,7 @@ async def init_database():
     await db.services.delete_many({})
     await db.correspondents.delete_many({})
     await db.mails.delete_many({})
+    await db[COUNTERS_COLLECTION].delete_many({})
     
     # Create users
     users = [
@@ -39,7 +44,7 @@ async def init_database():
             "name": "Admin Principal",
             "password": "admin123",
             "role": "admin",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "user-001",
@@ -47,7 +52,7 @@ async def init_database():
             "name": "Jean Dupont",
             "password": "user123",
             "role": "user",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "user-002",
@@ -55,7 +60,7 @@ async def init_database():
             "name": "Marie Martin",
             "password": "marie123",
             "role": "user",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "user-003",
@@ -63,7 +68,7 @@ async def init_database():
             "name": "Pierre Bernard",
             "password": "pierre123",
             "role": "user",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     await db.users.insert_many(users)
@@ -81,7 +86,7 @@ async def init_database():
                 {"id": "sub-004", "name": "SCHS"},
                 {"id": "sub-005", "name": "CTM"}
             ],
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-002",
@@ -91,7 +96,7 @@ async def init_database():
                 {"id": "sub-007", "name": "Élections"},
                 {"id": "sub-008", "name": "Archives"}
             ],
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-003",
@@ -100,7 +105,7 @@ async def init_database():
                 {"id": "sub-009", "name": "Comptabilité"},
                 {"id": "sub-010", "name": "Budget"}
             ],
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "service-004",
@@ -109,7 +114,7 @@ async def init_database():
                 {"id": "sub-011", "name": "CCAS"},
                 {"id": "sub-012", "name": "Petite Enfance"}
             ],
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     await db.services.insert_many(services)
@@ -124,7 +129,7 @@ async def init_database():
             "organization": "Entreprise BTP Construction",
             "phone": "+33 1 45 67 89 01",
             "address": "15 Rue de la Paix, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-002",
@@ -133,7 +138,7 @@ async def init_database():
             "organization": "Association des Riverains",
             "phone": "+33 6 12 34 56 78",
             "address": "23 Avenue Victor Hugo, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-003",
@@ -142,7 +147,7 @@ async def init_database():
             "organization": "Préfecture de Paris",
             "phone": "+33 1 23 45 67 89",
             "address": "1 Place de la Préfecture, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-004",
@@ -151,7 +156,7 @@ async def init_database():
             "organization": "Cabinet d'Architectes Petit & Associés",
             "phone": "+33 1 98 76 54 32",
             "address": "45 Boulevard Haussmann, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-005",
@@ -160,7 +165,7 @@ async def init_database():
             "organization": None,
             "phone": "+33 6 87 65 43 21",
             "address": "78 Rue de la République, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-006",
@@ -169,7 +174,7 @@ async def init_database():
             "organization": "Conseil Régional d'Île-de-France",
             "phone": "+33 1 55 44 33 22",
             "address": "2 Rue Simone Veil, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-007",
@@ -178,7 +183,7 @@ async def init_database():
             "organization": "Comité des Fêtes",
             "phone": "+33 6 11 22 33 44",
             "address": "12 Place du Marché, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-008",
@@ -187,7 +192,7 @@ async def init_database():
             "organization": "Étude Notariale Blanc",
             "phone": "+33 1 77 88 99 00",
             "address": "8 Rue du Notariat, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-009",
@@ -196,7 +201,7 @@ async def init_database():
             "organization": "Inspection Académique",
             "phone": "+33 1 44 55 66 77",
             "address": "30 Rue de l'Éducation, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": "corr-010",
@@ -205,9 +210,11 @@ async def init_database():
             "organization": "Club Sportif Municipal",
             "phone": "+33 6 99 88 77 66",
             "address": "50 Avenue du Sport, 75000 Paris",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
+    for correspondent in correspondents:
+        correspondent.update(search_fields(correspondent))
     await db.correspondents.insert_many(correspondents)
     print(f"✓ Created {len(correspondents)} correspondents")
     
@@ -233,12 +240,12 @@ async def init_database():
                     "status": "recu",
                     "user_id": "admin-001",
                     "user_name": "Admin Principal",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": datetime.now(timezone.utc),
                     "comment": None
                 }
             ],
             "attachments": [],
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "opened_by_id": None,
             "opened_by_name": None,
             "opened_at": None
@@ -263,12 +270,12 @@ async def init_database():
                     "status": "recu",
                     "user_id": "admin-001",
                     "user_name": "Admin Principal",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": datetime.now(timezone.utc),
                     "comment": None
                 }
             ],
             "attachments": [],
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "opened_by_id": None,
             "opened_by_name": None,
             "opened_at": None
@@ -293,27 +300,36 @@ async def init_database():
                     "status": "recu",
                     "user_id": "user-001",
                     "user_name": "Jean Dupont",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": datetime.now(timezone.utc),
                     "comment": None
                 },
                 {
                     "status": "traite",
                     "user_id": "user-001",
                     "user_name": "Jean Dupont",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": datetime.now(timezone.utc),
                     "comment": "Autorisation envoyée"
                 }
             ],
             "attachments": [],
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "opened_by_id": "user-001",
             "opened_by_name": "Jean Dupont",
-            "opened_at": datetime.now(timezone.utc).isoformat()
+            "opened_at": datetime.now(timezone.utc)
         }
     ]
+    for mail in mails:
+        mail["updated_at"] = mail["created_at"]
     await db.mails.insert_many(mails)
     print(f"✓ Created {len(mails)} mails")
     
+    # Les prochaines références allouées par l'API suivent celles des exemples
+    await seed_reference_counters(db)
+    
+    # Les compteurs du tableau de bord ne suivent que les écritures de l'API
+    buckets = await rebuild_counters(db)
+    print(f"✓ Rebuilt {buckets} stats buckets")
+    
     print("\n✅ Database initialization completed successfully!")
     print("\nTest accounts:")
     print("  Admin: admin@mairie.fr / admin123")
@@ -0,0 +1,27 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Les modules du backend s'importent à plat (from pagination import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path_factory):
+    """server.py importé avec des réglages fictifs (Motor ne se connecte qu'à la première requête)"""
+    for name, value in {
+        "MONGO_URL": "mongodb://localhost:27017",
+        "DB_NAME": "tests",
+        "RUN_MIGRATIONS": "false",
+        "AZURE_TENANT_ID": "tests",
+        "AZURE_CLIENT_ID": "tests",
+        "AZURE_SCOPE": "tests",
+        # GridFS exige une boucle d'événements dès sa création
+        "ATTACHMENT_STORAGE": "filesystem",
+        "ATTACHMENT_DIR": str(tmp_path_factory.getbasetemp() / "attachments"),
+    }.items():
+        monkeypatch.setenv(name, os.environ.get(name, value))
+    import server
+    return server
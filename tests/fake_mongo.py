@@ -0,0 +1,210 @@
+"""
+Base MongoDB en mémoire pour tester les routes de server.py
+Ne couvre que les opérateurs utilisés par les écritures de courriers :
+égalité, $in/$nin, $exists, $ne, $lt, $or/$and ; $set, $inc, $push, $unset ; upsert et
+bulk_write (UpdateOne/DeleteOne). Les projections sont ignorées
+"""
+
+import copy
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, Optional
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+_MISSING = object()
+
+
+def _matches_condition(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for operator, argument in condition.items():
+            if operator == "$in":
+                values = value if isinstance(value, list) else [value]
+                if not any(item in argument for item in values):
+                    return False
+            elif operator == "$nin":
+                values = value if isinstance(value, list) else [value]
+                if any(item in argument for item in values):
+                    return False
+            elif operator == "$lt":
+                if value is _MISSING or value is None or not value < argument:
+                    return False
+            elif operator == "$exists":
+                if (value is not _MISSING) != bool(argument):
+                    return False
+            elif operator == "$ne":
+                if value == argument:
+                    return False
+            else:
+                raise NotImplementedError(operator)
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def matches(doc: dict, query: Optional[dict]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, part) for part in condition):
+                return False
+        elif not _matches_condition(doc.get(key, _MISSING), condition):
+            return False
+    return True
+
+
+def apply_update(doc: dict, update: dict) -> None:
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            if operator == "$set":
+                doc[field] = copy.deepcopy(value)
+            elif operator == "$inc":
+                doc[field] = doc.get(field, 0) + value
+            elif operator == "$push":
+                doc.setdefault(field, []).append(copy.deepcopy(value))
+            elif operator == "$unset":
+                doc.pop(field, None)
+            else:
+                raise NotImplementedError(operator)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for field, order in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda doc: doc.get(field), reverse=order < 0)
+        return self
+
+    def skip(self, count):
+        self.docs = self.docs[count:]
+        return self
+
+    def limit(self, count):
+        if count:
+            self.docs = self.docs[:count]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, docs: Iterable[dict] = (), unique: Iterable[str] = ()):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.unique = list(unique)
+        # Appelé avant chaque bulk_write : simule une écriture concurrente
+        self.before_bulk_write: Optional[Callable[[], None]] = None
+
+    def _find(self, query) -> list:
+        return [doc for doc in self.docs if matches(doc, query)]
+
+    def _check_unique(self, doc: dict) -> None:
+        for field in self.unique:
+            if field in doc and any(other.get(field) == doc[field] for other in self.docs if other is not doc):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key: {field}", 11000, {"keyPattern": {field: 1}, "keyValue": {field: doc[field]}}
+                )
+
+    def _upsert(self, query: dict, update: dict) -> dict:
+        doc = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+        apply_update(doc, update)
+        self.docs.append(doc)
+        return doc
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([copy.deepcopy(doc) for doc in self._find(query)])
+
+    async def find_one(self, query=None, projection=None):
+        found = self._find(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    async def count_documents(self, query):
+        return len(self._find(query))
+
+    async def insert_one(self, doc):
+        self._check_unique(doc)
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc.get("_id"))
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            await self.insert_one(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            apply_update(found[0], update)
+        elif upsert:
+            self._upsert(query, update)
+        return SimpleNamespace(matched_count=len(found[:1]), modified_count=len(found[:1]))
+
+    async def update_many(self, query, update):
+        found = self._find(query)
+        for doc in found:
+            apply_update(doc, update)
+        return SimpleNamespace(matched_count=len(found), modified_count=len(found))
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=False):
+        found = self._find(query)
+        if not found:
+            return copy.deepcopy(self._upsert(query, update)) if upsert else None
+        before = copy.deepcopy(found[0])
+        apply_update(found[0], update)
+        return copy.deepcopy(found[0] if return_document else before)
+
+    async def find_one_and_delete(self, query, projection=None):
+        found = self._find(query)
+        if not found:
+            return None
+        self.docs.remove(found[0])
+        return found[0]
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.before_bulk_write:
+            self.before_bulk_write()
+        matched = deleted = 0
+        for operation in operations:
+            found = self._find(operation._filter)
+            if isinstance(operation, UpdateOne):
+                if found:
+                    apply_update(found[0], operation._doc)
+                    matched += 1
+                elif operation._upsert:
+                    self._upsert(operation._filter, operation._doc)
+            elif isinstance(operation, DeleteOne):
+                if found:
+                    self.docs.remove(found[0])
+                    deleted += 1
+            else:
+                raise NotImplementedError(type(operation).__name__)
+        return SimpleNamespace(matched_count=matched, modified_count=matched, deleted_count=deleted)
+
+
+class FakeDb:
+    def __init__(self, **collections: FakeCollection):
+        self.collections: Dict[str, FakeCollection] = dict(collections)
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self[name]
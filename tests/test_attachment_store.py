@@ -0,0 +1,135 @@
+import asyncio
+import base64
+import hashlib
+import io
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+from attachment_store import (
+    AttachmentStore, FileSystemAttachmentStore, delete_attachments, move_inline_attachments, parse_range,
+)
+
+
+class RecordingStore(FileSystemAttachmentStore):
+    def __init__(self, root):
+        super().__init__(root)
+        self.deleted = []
+
+    async def delete(self, storage_id):
+        self.deleted.append(storage_id)
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="piece.pdf", headers=Headers({"content-type": "application/pdf"}))
+
+
+async def _read(store, storage_id, start, end):
+    return b"".join([chunk async for chunk in store.stream(storage_id, start, end)])
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=-", 1000),
+    ("bytes=500-100", 1000),
+    ("bytes=1000-", 1000),
+    ("items=0-1", 1000),
+    ("bytes=0-1,5-6", 1000),
+    ("bytes=0-0", 0),
+])
+def test_parse_range_not_satisfiable(header, size):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, size)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == f"bytes */{size}"
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        AttachmentStore()
+
+
+def test_filesystem_store_round_trip(tmp_path):
+    store = FileSystemAttachmentStore(str(tmp_path))
+    data = bytes(range(256)) * 2000
+
+    storage_id, size, sha256 = asyncio.run(store.save("abcdef", _upload(data)))
+
+    assert (storage_id, size, sha256) == ("abcdef", len(data), hashlib.sha256(data).hexdigest())
+    assert asyncio.run(_read(store, storage_id, 0, size - 1)) == data
+    assert asyncio.run(_read(store, storage_id, 100, 199)) == data[100:200]
+
+    asyncio.run(store.delete(storage_id))
+    asyncio.run(store.delete(storage_id))
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(_read(store, storage_id, 0, 0))
+
+
+def test_delete_attachments_skips_legacy_and_foreign_storage(tmp_path):
+    store = RecordingStore(str(tmp_path))
+    attachments = [
+        {"id": "a1", "storage": "filesystem", "storage_id": "a1"},
+        {"id": "a2", "data": "aGVsbG8="},
+        {"id": "a3", "storage": "gridfs", "storage_id": "a3"},
+        {"id": "a4", "storage": "filesystem", "storage_id": "a4"},
+    ]
+
+    asyncio.run(delete_attachments(store, attachments))
+    asyncio.run(delete_attachments(store, None))
+
+    assert store.deleted == ["a1", "a4"]
+
+
+class InlineMails:
+    """Mails with legacy base64 attachments; records the updates of the migration"""
+
+    def __init__(self, mails):
+        self.mails = mails
+        self.updates = []
+
+    def find(self, query, projection):
+        async def iterate():
+            for mail in self.mails:
+                yield mail
+        return iterate()
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+
+def test_move_inline_attachments(tmp_path):
+    store = FileSystemAttachmentStore(str(tmp_path))
+    content = b"%PDF-1.4 contenu"
+    mails = InlineMails([{"id": "m1", "attachments": [
+        {"id": "a1", "storage": "filesystem", "storage_id": "a1", "size": 3},
+        {"id": "a2", "filename": "lettre.pdf", "content_type": "application/pdf",
+         "data": base64.b64encode(content).decode("ascii")},
+    ]}])
+
+    moved = asyncio.run(move_inline_attachments(SimpleNamespace(mails=mails), store))
+
+    assert moved == 1
+    assert asyncio.run(_read(store, "a2", 0, len(content) - 1)) == content
+    [(query, update)] = mails.updates
+    assert query == {"id": "m1", "attachments.1.data": {"$exists": True}}
+    assert update["$unset"] == {"attachments.1.data": ""}
+    assert update["$set"] == {
+        "attachments.1.id": "a2",
+        "attachments.1.storage": "filesystem",
+        "attachments.1.storage_id": "a2",
+        "attachments.1.size": len(content),
+        "attachments.1.sha256": hashlib.sha256(content).hexdigest(),
+    }
@@ -0,0 +1,94 @@
+import asyncio
+from typing import List
+
+from pydantic import TypeAdapter
+from starlette.requests import Request
+
+import cache
+from cache import TTLCache, cached_json_response
+
+ADAPTER = TypeAdapter(List[dict])
+
+
+def request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def serve(store, calls, if_none_match=None):
+    async def load():
+        calls.append(True)
+        return [{"id": "s1", "name": "Voirie"}]
+
+    return asyncio.run(cached_json_response(request(if_none_match), "services:all", load, ADAPTER, store))
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    store = TTLCache(ttl=10)
+    store.set("a", 1)
+
+    store.set("b", 2, ttl=60)
+
+    now[0] += 9
+    assert store.get("a") == 1
+    now[0] += 2
+    assert store.get("a") is None
+    assert store.get("b") == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    store = TTLCache(maxsize=2)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")
+    store.set("c", 3)
+
+    assert store.get("b") is None
+    assert store.get("a") == 1
+
+
+def test_invalidate_by_prefix():
+    store = TTLCache()
+    store.set("users:all", 1)
+    store.set("users:service:s1", 2)
+    store.set("services:all", 3)
+
+    store.invalidate("users:")
+
+    assert store.get("users:all") is None
+    assert store.get("services:all") == 3
+
+
+def test_response_is_loaded_once_and_tagged():
+    store, calls = TTLCache(), []
+
+    first = serve(store, calls)
+    second = serve(store, calls)
+
+    assert calls == [True]
+    assert first.status_code == second.status_code == 200
+    assert first.body == b'[{"id":"s1","name":"Voirie"}]'
+    assert first.headers["etag"] == second.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+
+def test_matching_if_none_match_returns_304():
+    store, calls = TTLCache(), []
+    etag = serve(store, calls).headers["etag"]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = serve(store, calls, header)
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+
+
+def test_stale_if_none_match_returns_the_body():
+    store, calls = TTLCache(), []
+
+    response = serve(store, calls, '"outdated"')
+
+    assert response.status_code == 200
+    assert response.body
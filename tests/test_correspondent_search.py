@@ -0,0 +1,32 @@
+from correspondent_search import normalize, search_fields, tokenize
+
+
+def test_normalize_strips_accents_case_and_punctuation():
+    assert normalize("  Hélène D'Arcy-Müller ") == "helene d arcy muller"
+    assert normalize(None) == ""
+    assert normalize("") == ""
+
+
+def test_tokenize_splits_email_on_punctuation():
+    assert tokenize("jean.dupont@mairie-enghien.fr") == ["jean", "dupont", "mairie", "enghien", "fr"]
+
+
+def test_search_fields_merge_name_email_and_organization():
+    fields = search_fields({
+        "name": "Valérie Garnier",
+        "email": "v.garnier@education.gouv.fr",
+        "organization": "Inspection Académique",
+        "phone": "+33 1 44 55 66 77",
+    })
+
+    assert fields["name_normalized"] == "valerie garnier"
+    assert fields["search_tokens"] == sorted({
+        "valerie", "garnier", "v", "education", "gouv", "fr", "inspection", "academique",
+    })
+
+
+def test_search_fields_ignore_missing_fields():
+    assert search_fields({"name": "Marie Martin", "email": None}) == {
+        "name_normalized": "marie martin",
+        "search_tokens": ["marie", "martin"],
+    }
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import credentials
+from credentials import TokenBucket, hash_password, is_hashed, verify_password
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(credentials.time, "monotonic", fake)
+    return fake
+
+
+def test_bucket_grants_a_burst_then_reports_the_wait(clock):
+    bucket = TokenBucket(capacity=3, refill_seconds=10)
+
+    assert [bucket.consume("a") for _ in range(3)] == [0, 0, 0]
+    assert bucket.consume("a") == pytest.approx(10)
+    clock.now += 4
+    assert bucket.consume("a") == pytest.approx(6)
+
+
+def test_bucket_refills_over_time_up_to_capacity(clock):
+    bucket = TokenBucket(capacity=2, refill_seconds=5)
+    bucket.consume("a")
+    bucket.consume("a")
+
+    clock.now += 5
+    assert bucket.consume("a") == 0
+    assert bucket.consume("a") > 0
+
+    clock.now += 1000
+    assert [bucket.consume("a") for _ in range(2)] == [0, 0]
+    assert bucket.consume("a") > 0
+
+
+def test_buckets_are_independent_and_bounded(clock):
+    bucket = TokenBucket(capacity=1, refill_seconds=60, maxsize=2)
+    bucket.consume("a")
+    assert bucket.consume("b") == 0
+    assert bucket.consume("a") > 0
+
+    # "a" est la clé la moins récemment servie : elle est évincée par "c"
+    bucket.consume("c")
+    assert bucket.consume("a") == 0
+    assert bucket.consume("c") > 0
+
+
+def test_plaintext_password_is_accepted_and_flagged_for_rehash():
+    assert asyncio.run(verify_password("secret", "secret")) == (True, True)
+    assert asyncio.run(verify_password("wrong", "secret")) == (False, False)
+    assert asyncio.run(verify_password("secret", None)) == (False, False)
+
+
+def test_hashed_password_round_trip(monkeypatch):
+    monkeypatch.setattr(credentials, "BCRYPT_ROUNDS", 4)
+
+    async def scenario():
+        stored = await hash_password("secret")
+        return stored, await verify_password("secret", stored), await verify_password("wrong", stored)
+
+    stored, valid, invalid = asyncio.run(scenario())
+    assert is_hashed(stored)
+    assert valid == (True, False)
+    assert invalid == (False, False)
@@ -0,0 +1,75 @@
+import asyncio
+import io
+from datetime import datetime, timezone
+
+from csv_import import CsvMailImporter
+from tests.fake_mongo import FakeCollection, FakeDb
+
+YEAR = datetime.now(timezone.utc).year
+SERVICE = {"id": "s1", "name": "Voirie"}
+ADMIN = {"sub": "u1", "name": "Alice"}
+
+CSV = """nom,prenom,telephone_fixe,telephone_mobile,adresse_mail,adresse_postale,titre_message,type,statut
+Martin,Marie,,0600000000,marie@example.fr,,Demande de voirie,entrant,en_cours
+Durand,Paul,,,,,Réponse au riverain,sortant,archivé
+Martin,Marie,,,,1 rue Haute,Relance,entrant,
+,,,,,,Sans nom,entrant,
+Durand,Paul,,,paul@example.fr,,Nouveau courrier,entrant,
+"""
+
+
+def run_import(db, batch_size=2):
+    importer = CsvMailImporter(db, SERVICE, ADMIN, batch_size=batch_size)
+    return asyncio.run(importer.run(io.BytesIO(CSV.encode("utf-8"))))
+
+
+def test_import_allocates_one_reference_block_per_batch():
+    db = FakeDb(
+        correspondents=FakeCollection([{"id": "c-paul", "name": "Paul Durand", "email": None, "phone": None}]),
+        counters=FakeCollection([{"_id": f"mail_reference:{YEAR}", "seq": 7}]),
+    )
+    blocks = []
+    allocate = db.counters.find_one_and_update
+
+    async def record_block(query, update, **kwargs):
+        blocks.append(update["$inc"]["seq"])
+        return await allocate(query, update, **kwargs)
+
+    db.counters.find_one_and_update = record_block
+
+    stats = run_import(db)
+
+    # 5 lignes en lots de 2 : la ligne sans nom ne consomme pas de référence
+    assert blocks == [2, 1, 1]
+    assert [mail["reference"] for mail in db.mails.docs] == [f"MAIL-{YEAR}-{n:05d}" for n in (8, 9, 10, 11)]
+    assert db.counters.docs[0]["seq"] == 11
+    assert stats["mails_created"] == 4
+    assert stats["rows_processed"] == 5
+    assert stats["errors"] == ["Ligne 4: nom et titre_message sont requis"]
+    assert [mail["status"] for mail in db.mails.docs] == ["recu", "archive", "recu", "recu"]
+    assert [mail["type"] for mail in db.mails.docs] == ["entrant", "sortant", "entrant", "entrant"]
+
+
+def test_import_creates_each_correspondent_once_and_completes_existing_ones():
+    db = FakeDb(correspondents=FakeCollection([{"id": "c-paul", "name": "Paul Durand", "email": None, "phone": None}]))
+
+    stats = run_import(db)
+
+    by_name = {doc["name"]: doc for doc in db.correspondents.docs}
+    assert sorted(by_name) == ["Marie Martin", "Paul Durand"]
+    # Correspondants déjà insérés (lot précédent ou base) complétés par bulk_write
+    assert by_name["Marie Martin"]["address"] == "1 rue Haute"
+    assert by_name["Paul Durand"]["email"] == "paul@example.fr"
+    assert stats["correspondents_created"] == 1
+    assert stats["correspondents_updated"] == 2
+    assert {mail["correspondent_id"] for mail in db.mails.docs if mail["correspondent_name"] == "Paul Durand"} == {"c-paul"}
+
+
+def test_correspondent_created_in_the_same_batch_is_completed_before_insertion():
+    db = FakeDb(correspondents=FakeCollection([{"id": "c-paul", "name": "Paul Durand", "email": None, "phone": None}]))
+
+    stats = run_import(db, batch_size=10)
+
+    marie = next(doc for doc in db.correspondents.docs if doc["name"] == "Marie Martin")
+    assert marie["address"] == "1 rue Haute"
+    assert stats["correspondents_updated"] == 1
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+
+from date_codec import _converted_fields, to_bson_date
+
+PARIS_SUMMER = timezone(timedelta(hours=2))
+
+
+def test_naive_datetime_is_taken_as_utc():
+    assert to_bson_date(datetime(2025, 3, 1, 8, 30)) == datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc)
+
+
+def test_aware_datetime_is_converted_to_utc():
+    converted = to_bson_date(datetime(2025, 7, 1, 10, 0, tzinfo=PARIS_SUMMER))
+
+    assert converted == datetime(2025, 7, 1, 8, 0, tzinfo=timezone.utc)
+    assert converted.tzinfo == timezone.utc
+
+
+def test_iso_strings_are_parsed():
+    assert to_bson_date("2025-03-01T08:30:00Z") == datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc)
+    assert to_bson_date("2025-07-01T10:00:00+02:00") == datetime(2025, 7, 1, 8, 0, tzinfo=timezone.utc)
+    assert to_bson_date("2025-03-01T08:30:00") == datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc)
+
+
+def test_invalid_and_missing_values_are_kept():
+    assert to_bson_date("pas une date") == "pas une date"
+    assert to_bson_date(None) is None
+    assert to_bson_date(42) == 42
+
+
+def test_converted_fields_rewrites_string_dates_only():
+    doc = {
+        "created_at": "2025-03-01T08:30:00Z",
+        "opened_at": datetime(2025, 3, 2, tzinfo=timezone.utc),
+        "workflow": [{"status": "recu", "timestamp": "2025-03-01T08:30:00Z"}],
+    }
+
+    update = _converted_fields(doc, ["created_at", "opened_at", "workflow.timestamp"])
+
+    assert update == {
+        "created_at": datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc),
+        "workflow": [{"status": "recu", "timestamp": datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc)}],
+    }
+    assert _converted_fields({"created_at": datetime(2025, 3, 1)}, ["created_at"]) == {}
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+import fast_json
+
+orjson = pytest.importorskip("orjson")
+
+
+def test_payload_is_unchanged_when_disabled(monkeypatch):
+    monkeypatch.setattr(fast_json, "FAST_JSON", False)
+    payload = {"items": []}
+
+    assert fast_json.fast_response(payload) is payload
+
+
+def test_payload_is_rendered_by_orjson_when_enabled(monkeypatch):
+    monkeypatch.setattr(fast_json, "FAST_JSON", True)
+
+    response = fast_json.fast_response({"items": [{"id": "m1"}]})
+
+    assert isinstance(response, fast_json.FastJSONResponse)
+    assert response.body == b'{"items":[{"id":"m1"}]}'
+    assert response.media_type == "application/json"
+
+
+def test_render_matches_pydantic_conventions():
+    response = fast_json.FastJSONResponse({
+        "created_at": datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc),
+        "amount": Decimal("12.50"),
+        2025: "année",
+    })
+
+    assert orjson.loads(response.body) == {"created_at": "2025-03-01T08:30:00Z", "amount": "12.50", "2025": "année"}
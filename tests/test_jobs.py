@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import jobs
+from jobs import JobRunner
+from tests.fake_mongo import FakeCollection, FakeDb
+
+NOW = datetime.now(timezone.utc)
+
+
+def job(job_id, status="running", host="other-host", **fields):
+    return {"id": job_id, "status": status, "host": host, "updated_at": NOW, **fields}
+
+
+def statuses(db):
+    return {doc["id"]: doc["status"] for doc in db.jobs.docs}
+
+
+@pytest.fixture
+def db():
+    stale = NOW - timedelta(seconds=jobs.STALE_AFTER_SECONDS + 10)
+    return FakeDb(jobs=FakeCollection([
+        job("stale-elsewhere", heartbeat_at=stale),
+        job("alive-elsewhere", heartbeat_at=NOW),
+        job("stale-pending", status="pending", heartbeat_at=stale),
+        job("legacy", updated_at=stale),
+        job("finished", status="completed", heartbeat_at=stale),
+    ]))
+
+
+def test_recover_interrupts_stale_jobs_of_any_host(db):
+    runner = JobRunner(db)
+
+    interrupted = asyncio.run(runner.recover())
+
+    assert interrupted == 3
+    assert statuses(db) == {
+        "stale-elsewhere": "interrupted",
+        "alive-elsewhere": "running",
+        "stale-pending": "interrupted",
+        "legacy": "interrupted",
+        "finished": "completed",
+    }
+
+
+def test_recover_keeps_jobs_of_a_live_replica_on_the_same_host(db):
+    runner = JobRunner(db)
+    db.jobs.docs[1]["host"] = runner.host
+
+    asyncio.run(runner.recover())
+
+    assert statuses(db)["alive-elsewhere"] == "running"
+
+
+def test_running_job_keeps_its_heartbeat(monkeypatch):
+    db = FakeDb()
+    runner = JobRunner(db)
+
+    async def scenario():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def work(context):
+            started.set()
+            await release.wait()
+            return {"done": True}
+
+        submitted = await runner.submit("test", work, created_by="u1")
+        await started.wait()
+        # Le battement a cessé depuis longtemps du point de vue de la base...
+        db.jobs.docs[0]["heartbeat_at"] = NOW - timedelta(days=1)
+        # ...mais la tâche appartient à ce processus : elle n'est pas interrompue
+        assert await runner.recover() == 0
+        await runner.heartbeat()
+        assert db.jobs.docs[0]["heartbeat_at"] > NOW
+        release.set()
+        await asyncio.wait(runner._tasks)
+        await runner.shutdown()
+        return submitted
+
+    submitted = asyncio.run(scenario())
+
+    assert db.jobs.docs[0]["id"] == submitted["id"]
+    assert db.jobs.docs[0]["status"] == "completed"
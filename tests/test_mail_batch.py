@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.fake_mongo import FakeCollection, FakeDb
+
+ADMIN = {"sub": "u1", "name": "Alice", "role": "admin"}
+
+
+def stored_mail(mail_id, **fields):
+    return {
+        "id": mail_id, "type": "entrant", "reference": f"MAIL-2025-{mail_id}", "subject": mail_id,
+        "service_id": "s1", "status": "recu", "version": 2,
+        "created_at": datetime(2025, 3, 1, tzinfo=timezone.utc), "workflow": [],
+        **fields,
+    }
+
+
+@pytest.fixture
+def db(server, monkeypatch):
+    fake = FakeDb(mails=FakeCollection([stored_mail("m1"), stored_mail("m2"), stored_mail("m3", status="traite")]))
+    monkeypatch.setattr(server, "db", fake)
+    return fake
+
+
+def run_batch(server, ids, **fields):
+    result = asyncio.run(server.batch_mails(server.MailBatchRequest(ids=ids, **fields), ADMIN))
+    return {item.id: item.outcome for item in result.results}, result.counts
+
+
+def stored(db, mail_id):
+    return next(doc for doc in db.mails.docs if doc["id"] == mail_id)
+
+
+def test_clean_batch_updates_every_mail(server, db):
+    outcomes, counts = run_batch(server, ["m1", "m2", "m3"], operation="status", status="traite")
+
+    assert outcomes == {"m1": "updated", "m2": "updated", "m3": "unchanged"}
+    assert counts == {"updated": 2, "unchanged": 1}
+    assert stored(db, "m1")["status"] == "traite"
+    assert stored(db, "m1")["version"] == 3
+    assert len(stored(db, "m1")["workflow"]) == 1
+    assert "last_batch_id" not in stored(db, "m1")
+
+
+def test_mail_modified_concurrently_is_a_conflict(server, db):
+    def concurrent_write():
+        # Une mise à jour individuelle passe entre la lecture des versions et le bulk_write
+        stored(db, "m2")["version"] += 1
+        stored(db, "m2")["status"] = "archive"
+
+    db.mails.before_bulk_write = concurrent_write
+
+    outcomes, counts = run_batch(server, ["m1", "m2"], operation="status", status="traitement")
+
+    assert outcomes == {"m1": "updated", "m2": "conflict"}
+    assert stored(db, "m2")["status"] == "archive"
+    assert stored(db, "m2")["version"] == 3
+
+
+def test_unknown_id_is_not_found(server, db):
+    outcomes, counts = run_batch(server, ["m1", "missing"], operation="assign", assigned_to_id="u2", assigned_to_name="Bob")
+
+    assert outcomes == {"m1": "updated", "missing": "not_found"}
+    assert stored(db, "m1")["assigned_to_id"] == "u2"
+
+
+def test_delete_reports_conflict_for_modified_mail(server, db):
+    db.mails.before_bulk_write = lambda: stored(db, "m1").update(version=5)
+
+    outcomes, counts = run_batch(server, ["m1", "m2"], operation="delete")
+
+    assert outcomes == {"m1": "conflict", "m2": "deleted"}
+    assert [doc["id"] for doc in db.mails.docs] == ["m1", "m3"]
+    assert [doc["id"] for doc in db.mail_tombstones.docs] == ["m2"]
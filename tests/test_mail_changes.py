@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from mail_changes import TOMBSTONE_TTL_DAYS, TOMBSTONES_COLLECTION, fetch_changes, visibility_changed
+from pagination import decode_cursor, encode_cursor
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeMails:
+    """Changed mails for the updated_at query, existing visible ids for the id lookup"""
+
+    def __init__(self, changed, visible_ids=()):
+        self.changed = changed
+        self.visible_ids = set(visible_ids)
+
+    def find(self, query, projection):
+        lookup = query["$and"][0].get("id")
+        if lookup is not None:
+            return FakeCursor([{"id": mail_id} for mail_id in lookup["$in"] if mail_id in self.visible_ids])
+        return FakeCursor(list(self.changed))
+
+
+class FakeTombstones:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return FakeCursor(list(self.docs))
+
+
+class FakeDb:
+    def __init__(self, mails, tombstones):
+        self.mails = mails
+        self.collections = {TOMBSTONES_COLLECTION: FakeTombstones(tombstones)}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def at(minutes):
+    return datetime.now(timezone.utc) - timedelta(minutes=minutes)
+
+
+def token(minutes):
+    return encode_cursor(at(minutes), "")
+
+
+def test_without_token_only_the_position_is_returned():
+    changes = asyncio.run(fetch_changes(FakeDb(FakeMails([]), []), None, 10, {}, {}))
+
+    assert changes["items"] == [] and changes["deleted"] == [] and not changes["has_more"]
+    assert decode_cursor(changes["next_token"])[0] <= datetime.now(timezone.utc)
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(fetch_changes(FakeDb(FakeMails([]), []), token(TOMBSTONE_TTL_DAYS * 24 * 60 + 60), 10, {}, {}))
+    assert error.value.status_code == 410
+
+
+def test_updates_and_tombstones_are_merged_in_token_order():
+    mails = [{"id": "m1", "updated_at": at(30)}, {"id": "m3", "updated_at": at(10)}]
+    tombstones = [{"id": "m2", "deleted_at": at(20)}]
+
+    changes = asyncio.run(fetch_changes(FakeDb(FakeMails(mails), tombstones), token(60), 10, {}, {}))
+
+    assert [mail["id"] for mail in changes["items"]] == ["m1", "m3"]
+    assert changes["deleted"] == ["m2"]
+    assert not changes["has_more"]
+
+
+def test_page_stops_at_the_limit_and_resumes_after_the_last_event():
+    mails = [{"id": "m1", "updated_at": at(30)}, {"id": "m3", "updated_at": at(10)}]
+    tombstones = [{"id": "m2", "deleted_at": at(20)}]
+
+    changes = asyncio.run(fetch_changes(FakeDb(FakeMails(mails), tombstones), token(60), 2, {}, {}))
+
+    assert [mail["id"] for mail in changes["items"]] == ["m1"]
+    assert changes["deleted"] == ["m2"]
+    assert changes["has_more"]
+    assert decode_cursor(changes["next_token"]) == (tombstones[0]["deleted_at"], "m2")
+
+
+def test_moved_mail_still_visible_is_not_removed():
+    # m1 a changé de service mais reste visible ; m2 n'est plus visible
+    mails = [{"id": "m1", "updated_at": at(10)}]
+    tombstones = [{"id": "m1", "deleted_at": at(10)}, {"id": "m2", "deleted_at": at(10)}]
+
+    changes = asyncio.run(fetch_changes(FakeDb(FakeMails(mails, visible_ids={"m1"}), tombstones), token(60), 10, {}, {}))
+
+    assert [mail["id"] for mail in changes["items"]] == ["m1"]
+    assert changes["deleted"] == ["m2"]
+
+
+def test_visibility_changed():
+    before = {"type": "entrant", "service_id": "s1", "service_ids": ["s1"], "status": "recu"}
+
+    assert not visibility_changed(before, {**before, "status": "traite"})
+    assert visibility_changed(before, {**before, "service_id": "s2", "service_ids": ["s2"]})
+    assert visibility_changed(before, {**before, "final_recipient_emails": ["a@example.com"]})
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from tests.fake_mongo import FakeCollection, FakeDb
+
+USER = {"sub": "u1", "name": "Alice", "role": "admin"}
+YEAR = datetime.now(timezone.utc).year
+
+
+@pytest.fixture
+def db(server, monkeypatch):
+    # Références déjà stockées alors que le compteur de l'année n'a jamais été initialisé
+    fake = FakeDb(mails=FakeCollection(
+        [{"id": "old", "reference": f"MAIL-{YEAR}-00001"}, {"id": "older", "reference": f"MAIL-{YEAR}-00002"}],
+        unique=["id", "reference"],
+    ))
+    seeded = []
+
+    async def seed_reference_counters(db):
+        seeded.append(True)
+        await db.counters.update_one({"_id": f"mail_reference:{YEAR}"}, {"$set": {"seq": 2}}, upsert=True)
+
+    monkeypatch.setattr(server, "db", fake)
+    monkeypatch.setattr(server, "seed_reference_counters", seed_reference_counters)
+    fake.seeded = seeded
+    return fake
+
+
+def create(server):
+    return asyncio.run(server.create_mail(server.MailCreate(
+        type="entrant", subject="Objet", content="Texte", correspondent_id="c1", correspondent_name="Sophie",
+        service_id="s1", service_name="Voirie",
+    ), USER))
+
+
+def test_duplicate_reference_reseeds_counters_and_retries(server, db):
+    mail = create(server)
+
+    assert mail.reference == f"MAIL-{YEAR}-00003"
+    assert db.seeded == [True]
+    assert [doc["reference"] for doc in db.mails.docs][-1] == mail.reference
+
+
+def test_second_duplicate_is_reported_as_conflict(server, db, monkeypatch):
+    async def allocate_reference(db):
+        return f"MAIL-{YEAR}-00001"
+
+    monkeypatch.setattr(server, "allocate_reference", allocate_reference)
+
+    with pytest.raises(HTTPException) as error:
+        create(server)
+    assert error.value.status_code == 409
+    assert len(db.mails.docs) == 2
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+import mail_events
+from mail_events import (
+    MAIL_CREATED, RESYNC, EventBus, InMemoryEventBus, Subscription, create_event_bus, format_sse, mail_event, sse_stream,
+)
+
+
+def test_event_bus_requires_publish():
+    with pytest.raises(TypeError):
+        EventBus()
+
+
+def test_mail_event_keeps_only_event_fields():
+    event = mail_event(MAIL_CREATED, {"id": "m1", "subject": "Objet", "content": "secret"}, by="Alice")
+
+    assert event["type"] == MAIL_CREATED
+    assert event["by"] == "Alice"
+    assert event["mail"]["subject"] == "Objet"
+    assert "content" not in event["mail"]
+
+
+def test_format_sse():
+    event = mail_event(MAIL_CREATED, {"id": "m1", "subject": "Réponse"})
+    message = format_sse(event)
+
+    lines = message.split("\n")
+    assert lines[0] == f"id: {event['id']}"
+    assert lines[1] == f"event: {MAIL_CREATED}"
+    assert message.endswith("\n\n")
+    data = json.loads(lines[2][len("data: "):])
+    assert data["mail"]["subject"] == "Réponse"
+    assert data["at"].endswith("Z")
+
+
+def test_in_memory_bus_filters_per_subscription():
+    async def scenario():
+        bus = InMemoryEventBus()
+        s1 = bus.subscribe(lambda event: event["mail"]["service_id"] == "s1")
+        s2 = bus.subscribe(lambda event: event["mail"]["service_id"] == "s2")
+        await bus.publish(mail_event(MAIL_CREATED, {"id": "m1", "service_id": "s1"}))
+        return s1.queue.qsize(), s2.queue.qsize()
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_full_queue_is_replaced_by_resync(monkeypatch):
+    monkeypatch.setattr(mail_events, "SUBSCRIBER_QUEUE_SIZE", 2)
+
+    async def scenario():
+        subscription = Subscription(lambda event: True)
+        for index in range(3):
+            subscription.deliver(mail_event(MAIL_CREATED, {"id": f"m{index}"}))
+        return [subscription.queue.get_nowait()["type"] for _ in range(subscription.queue.qsize())]
+
+    assert asyncio.run(scenario()) == [RESYNC]
+
+
+def test_sse_stream_unsubscribes_on_disconnect(monkeypatch):
+    monkeypatch.setattr(mail_events, "HEARTBEAT_SECONDS", 0.01)
+
+    async def scenario():
+        bus = InMemoryEventBus()
+        checks = iter([False, False, True])
+
+        async def is_disconnected():
+            return next(checks)
+
+        messages = []
+        stream = sse_stream(bus, lambda event: True, is_disconnected)
+        messages.append(await stream.__anext__())
+        await bus.publish(mail_event(MAIL_CREATED, {"id": "m1"}))
+        async for message in stream:
+            messages.append(message)
+        return messages, bus.subscriber_count
+
+    messages, subscriber_count = asyncio.run(scenario())
+    assert messages[0].startswith("retry: ")
+    assert messages[1].startswith("id: ")
+    assert messages[2] == ": keep-alive\n\n"
+    assert subscriber_count == 0
+
+
+def test_unknown_backend_is_rejected(monkeypatch):
+    monkeypatch.setenv("EVENT_BUS_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        create_event_bus(None)
@@ -0,0 +1,88 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import mail_export
+from mail_export import CSV_COLUMNS, export_filename, export_stream, gzip_chunks
+
+
+async def from_list(items):
+    for item in items:
+        yield item
+
+
+def collect(stream):
+    async def run():
+        return [chunk async for chunk in stream]
+
+    return asyncio.run(run())
+
+
+MAILS = [
+    {
+        "id": "m1", "reference": "MAIL-2025-00001", "subject": "Objet, avec \"guillemets\"",
+        "service_names": ["Voirie", "Urbanisme"], "attachments": [{"id": "a1"}, {"id": "a2"}],
+        "created_at": datetime(2025, 3, 1, 8, 30, tzinfo=timezone.utc), "opened_at": None,
+    },
+    {"id": "m2", "reference": "MAIL-2025-00002", "subject": "Réponse", "created_at": datetime(2025, 3, 2, tzinfo=timezone.utc)},
+]
+
+
+def test_ndjson_export_writes_one_document_per_line():
+    body = b"".join(collect(export_stream(from_list(MAILS), "ndjson")))
+
+    lines = body.decode("utf-8").splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["m1", "m2"]
+    assert json.loads(lines[0])["created_at"] == "2025-03-01T08:30:00Z"
+    assert json.loads(lines[1])["subject"] == "Réponse"
+
+
+def test_csv_export_has_bom_header_and_flattened_values():
+    body = b"".join(collect(export_stream(from_list(MAILS), "csv"))).decode("utf-8")
+
+    assert body.startswith("\ufeff")
+    rows = list(csv.DictReader(io.StringIO(body[1:])))
+    assert list(rows[0]) == CSV_COLUMNS
+    assert rows[0]["subject"] == "Objet, avec \"guillemets\""
+    assert rows[0]["service_names"] == "Voirie | Urbanisme"
+    assert rows[0]["attachment_count"] == "2"
+    assert rows[0]["created_at"] == "2025-03-01T08:30:00Z"
+    assert rows[0]["opened_at"] == ""
+    assert rows[1]["attachment_count"] == "0"
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+def test_large_exports_are_split_in_chunks(monkeypatch, format):
+    monkeypatch.setattr(mail_export, "CHUNK_SIZE", 256)
+    mails = [{**MAILS[1], "id": f"m{index}"} for index in range(50)]
+
+    chunks = collect(export_stream(from_list(mails), format))
+
+    assert len(chunks) > 2
+    assert b"".join(chunks).count(b"MAIL-2025-00002") == 50
+
+
+def test_gzip_chunks_produce_a_single_gzip_member():
+    data = [b"ligne %d\n" % index for index in range(1000)]
+
+    compressed = b"".join(collect(gzip_chunks(from_list(data))))
+
+    assert gzip.decompress(compressed) == b"".join(data)
+
+
+def test_compressed_export_round_trip():
+    compressed = b"".join(collect(export_stream(from_list(MAILS), "ndjson", compress=True)))
+    plain = b"".join(collect(export_stream(from_list(MAILS), "ndjson")))
+
+    assert gzip.decompress(compressed) == plain
+
+
+def test_export_filename():
+    now = datetime(2025, 3, 1, 8, 30, 5)
+    assert export_filename("csv", False, now) == "courriers-20250301-083005.csv"
+    assert export_filename("ndjson", True, now) == "courriers-20250301-083005.ndjson.gz"
@@ -0,0 +1,47 @@
+from mail_search import build_highlights, highlight, query_terms, snippet, _term_pattern
+
+
+def test_query_terms_drop_single_characters():
+    assert query_terms("permis d'urbanisme à") == ["permis", "urbanisme"]
+
+
+def test_highlight_is_accent_and_case_insensitive_prefix_match():
+    pattern = _term_pattern(query_terms("ecole"))
+    assert highlight("Travaux École Jules Ferry", pattern) == "Travaux <mark>École</mark> Jules Ferry"
+    assert highlight("Les écoles", pattern) == "Les <mark>écoles</mark>"
+    assert highlight("Préécole", pattern) is None
+
+
+def test_highlight_escapes_html_around_matches():
+    pattern = _term_pattern(["voirie"])
+    assert highlight("<b>Voirie</b> & co", pattern) == "&lt;b&gt;<mark>Voirie</mark>&lt;/b&gt; &amp; co"
+
+
+def test_highlight_without_terms():
+    assert _term_pattern([]) is None
+    assert highlight("Objet", None) is None
+
+
+def test_snippet_is_centred_on_first_match():
+    text = "a" * 300 + " permis de construire " + "b" * 300
+    excerpt = snippet(text, _term_pattern(["permis"]), length=60)
+
+    assert excerpt.startswith("…") and excerpt.endswith("…")
+    assert "<mark>permis</mark>" in excerpt
+    assert len(excerpt.replace("<mark>", "").replace("</mark>", "")) == 62
+
+
+def test_build_highlights_keeps_matching_fields_only():
+    mail = {
+        "subject": "Demande de permis",
+        "reference": "MAIL-2025-00001",
+        "correspondent_name": "Sophie Lefebvre",
+        "content": "Je dépose une demande de permis de construire.",
+    }
+
+    highlights = build_highlights(mail, "permis")
+
+    assert highlights == {
+        "subject": "Demande de <mark>permis</mark>",
+        "content": "Je dépose une demande de <mark>permis</mark> de construire.",
+    }
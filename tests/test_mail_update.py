@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from tests.fake_mongo import FakeCollection, FakeDb
+
+USER = {"sub": "u1", "name": "Alice", "role": "admin"}
+
+
+def stored_mail(**fields):
+    return {
+        "id": "m1", "type": "entrant", "reference": "MAIL-2025-00001", "subject": "Objet", "content": "Texte",
+        "correspondent_id": "c1", "correspondent_name": "Sophie", "service_id": "s1", "service_name": "Voirie",
+        "status": "recu", "created_at": datetime(2025, 3, 1, tzinfo=timezone.utc), "workflow": [],
+        **fields,
+    }
+
+
+@pytest.fixture
+def db(server, monkeypatch):
+    fake = FakeDb(mails=FakeCollection([stored_mail(version=3)]))
+    monkeypatch.setattr(server, "db", fake)
+    return fake
+
+
+def update(server, **fields):
+    return asyncio.run(server.update_mail("m1", server.MailUpdate(**fields), USER))
+
+
+def test_matching_version_is_updated(server, db):
+    mail = update(server, status="traitement", comment="Pris en charge", expected_version=3)
+
+    stored = db.mails.docs[0]
+    assert mail.version == stored["version"] == 4
+    assert stored["status"] == "traitement"
+    assert [step["comment"] for step in stored["workflow"]] == ["Pris en charge"]
+    assert stored["updated_at"] is not None
+
+
+def test_stale_version_is_rejected(server, db):
+    with pytest.raises(HTTPException) as error:
+        update(server, subject="Nouvel objet", expected_version=2)
+
+    assert error.value.status_code == 409
+    assert db.mails.docs[0]["subject"] == "Objet"
+    assert db.mails.docs[0]["version"] == 3
+
+
+def test_legacy_mail_without_version_is_at_version_zero(server, db):
+    db.mails.docs = [stored_mail()]
+
+    mail = update(server, subject="Nouvel objet", expected_version=0)
+
+    assert mail.version == db.mails.docs[0]["version"] == 1
+    assert db.mails.docs[0]["subject"] == "Nouvel objet"
+
+
+def test_concurrent_write_is_retried_without_expected_version(server, db):
+    write = db.mails.find_one_and_update
+    calls = []
+
+    async def concurrent_then_write(query, update, **kwargs):
+        calls.append(query)
+        if len(calls) == 1:
+            # Une autre requête modifie le courrier entre la lecture et l'écriture
+            db.mails.docs[0]["version"] += 1
+        return await write(query, update, **kwargs)
+
+    db.mails.find_one_and_update = concurrent_then_write
+
+    mail = update(server, status="traite")
+
+    assert [query["version"] for query in calls] == [3, 4]
+    assert mail.version == 5
+    assert mail.status == "traite"
+
+
+def test_conflict_with_expected_version_is_not_retried(server, db):
+    async def always_concurrent(query, update, **kwargs):
+        return None
+
+    db.mails.find_one_and_update = always_concurrent
+
+    with pytest.raises(HTTPException) as error:
+        update(server, status="traite", expected_version=3)
+    assert error.value.status_code == 409
+
+
+def test_unknown_mail(server, db):
+    db.mails.docs = []
+    with pytest.raises(HTTPException) as error:
+        update(server, status="traite")
+    assert error.value.status_code == 404
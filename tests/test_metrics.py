@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from starlette.responses import PlainTextResponse
+
+from metrics import MetricsMiddleware, MongoCommandMetrics, command_target
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return PlainTextResponse("x" * 10)
+
+    client = TestClient(app)
+    labels = {"method": "GET", "route": "/items/{item_id}"}
+    before = sample("http_requests_total", status="200", **labels)
+    size_before = sample("http_response_size_bytes_sum", **labels)
+
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+
+    assert sample("http_requests_total", status="200", **labels) - before == 2
+    assert sample("http_response_size_bytes_sum", **labels) - size_before == 20
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+
+
+def test_command_target():
+    assert command_target("find", {"find": "mails", "filter": {}}) == "mails"
+    assert command_target("getMore", {"getMore": 42, "collection": "mails"}) == "mails"
+    assert command_target("listCollections", {"listCollections": 1}) == "-"
+
+
+def event(command_name, request_id, command=None, duration_micros=2000):
+    return SimpleNamespace(
+        command_name=command_name, request_id=request_id, connection_id=("localhost", 27017),
+        command=command or {}, duration_micros=duration_micros,
+    )
+
+
+def test_mongo_commands_are_timed_per_collection():
+    listener = MongoCommandMetrics()
+    labels = {"collection": "metrics_test", "command": "find"}
+    count_before = sample("mongodb_command_duration_seconds_count", **labels)
+    failures_before = sample("mongodb_command_failures_total", **labels)
+
+    listener.started(event("find", 1, {"find": "metrics_test"}))
+    listener.succeeded(event("find", 1))
+    listener.started(event("find", 2, {"find": "metrics_test"}))
+    listener.failed(event("find", 2))
+    listener.started(event("hello", 3, {"hello": 1}))
+    listener.succeeded(event("hello", 3))
+
+    assert sample("mongodb_command_duration_seconds_count", **labels) - count_before == 2
+    assert sample("mongodb_command_failures_total", **labels) - failures_before == 1
+    assert listener._targets == {}
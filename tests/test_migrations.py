@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+import migrations
+from migrations import INDEXES, MIGRATIONS, Migration, run_migrations
+
+
+@pytest.fixture
+def fake_migrations(monkeypatch):
+    """Five migrations, version 2 already applied; apply_migration succeeds unless listed in `claimed`"""
+    state = {"claimed": set(), "attempted": []}
+
+    async def applied_versions(db):
+        return [2]
+
+    async def apply_migration(db, migration):
+        state["attempted"].append(migration.version)
+        return migration.version not in state["claimed"]
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [Migration(version, f"v{version}") for version in range(1, 6)])
+    monkeypatch.setattr(migrations, "applied_versions", applied_versions)
+    monkeypatch.setattr(migrations, "apply_migration", apply_migration)
+    return state
+
+
+def test_pending_versions_applied_in_order(fake_migrations):
+    assert asyncio.run(run_migrations(None)) == [1, 3, 4, 5]
+
+
+def test_stops_at_version_claimed_elsewhere(fake_migrations):
+    fake_migrations["claimed"] = {3}
+
+    assert asyncio.run(run_migrations(None)) == [1]
+    assert fake_migrations["attempted"] == [1, 3]
+
+
+def test_seed_references_fails_on_duplicates_without_renumbering(monkeypatch):
+    calls = []
+
+    async def seed_reference_counters(db):
+        calls.append("seed")
+
+    async def find_duplicate_references(db):
+        return ["MAIL-2024-00003"]
+
+    monkeypatch.setattr(migrations, "seed_reference_counters", seed_reference_counters)
+    monkeypatch.setattr(migrations, "find_duplicate_references", find_duplicate_references)
+
+    with pytest.raises(RuntimeError, match="MAIL-2024-00003"):
+        asyncio.run(migrations._seed_references(None))
+    assert calls == ["seed"]
+
+
+def test_declared_versions_are_consistent():
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert {spec.version for spec in INDEXES} <= set(versions)
+    assert len({(spec.collection, spec.name) for spec in INDEXES}) == len(INDEXES)
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, clamp_page_size, decode_cursor, encode_cursor, fetch_page, keyset_filter,
+)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return FakeCursor(list(self.docs))
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(created_at, "mail-1")) == (created_at, "mail-1")
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(datetime(2025, 3, 1, tzinfo=timezone.utc), "a/b+c")
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+
+
+def test_cursor_accepts_legacy_naive_dates():
+    created_at, _ = decode_cursor(encode_cursor("2025-03-01T12:30:00", "mail-1"))
+    assert created_at == datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor("not a date", "mail-1")])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_keyset_filter():
+    created_at = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    assert keyset_filter(None) is None
+    assert keyset_filter(encode_cursor(created_at, "m")) == {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": "m"}},
+        ]
+    }
+
+
+@pytest.mark.parametrize("limit, expected", [(None, DEFAULT_PAGE_SIZE), (0, DEFAULT_PAGE_SIZE), (10, 10), (10**6, MAX_PAGE_SIZE)])
+def test_clamp_page_size(limit, expected):
+    assert clamp_page_size(limit) == expected
+
+
+def test_fetch_page_reports_next_cursor():
+    day = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    docs = [{"id": f"m{index}", "created_at": day} for index in range(5)]
+
+    page, next_cursor, has_more = asyncio.run(fetch_page(FakeCollection(docs), {}, 3))
+
+    assert [doc["id"] for doc in page] == ["m4", "m3", "m2"]
+    assert has_more
+    assert decode_cursor(next_cursor) == (day, "m2")
+
+
+def test_fetch_page_last_page():
+    docs = [{"id": "m1", "created_at": datetime(2025, 3, 1, tzinfo=timezone.utc)}]
+    assert asyncio.run(fetch_page(FakeCollection(docs), {}, 3)) == (docs, None, False)
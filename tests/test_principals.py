@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from tests.fake_mongo import FakeCollection, FakeDb
+
+ALICE = {"id": "u1", "azure_id": "oid-1", "email": "alice@mairie.fr", "name": "Alice", "role": "admin"}
+BOB = {"id": "u2", "email": "bob@mairie.fr", "name": "Bob", "role": "user", "service_id": "s1"}
+
+
+@pytest.fixture
+def principals():
+    import principals
+
+    principals.user_cache.invalidate()
+    principals.reference_cache.invalidate()
+    yield principals
+    principals.user_cache.invalidate()
+    principals.reference_cache.invalidate()
+
+
+def warm(principals, db):
+    for user in (ALICE, BOB):
+        asyncio.run(principals.get_user_by_id(db, user["id"]))
+        asyncio.run(principals.get_user_by_email(db, user["email"]))
+    principals.reference_cache.set("users:all", b"[]")
+
+
+def cached_keys(principals):
+    return sorted(principals.user_cache._entries)
+
+
+def test_invalidate_user_only_drops_that_user(principals):
+    db = FakeDb(users=FakeCollection([ALICE, BOB]))
+    warm(principals, db)
+
+    principals.invalidate_user("u2")
+
+    assert cached_keys(principals) == ["email:alice@mairie.fr", "id:u1"]
+    assert principals.reference_cache.get("users:all") is None
+
+
+def test_invalidate_user_by_email_drops_records_under_both_keys(principals):
+    db = FakeDb(users=FakeCollection([ALICE, BOB]))
+    warm(principals, db)
+
+    principals.invalidate_user(email="bob@mairie.fr")
+
+    assert cached_keys(principals) == ["email:alice@mairie.fr", "id:u1"]
+
+
+def test_invalidate_user_without_argument_drops_everything(principals):
+    db = FakeDb(users=FakeCollection([ALICE, BOB]))
+    warm(principals, db)
+
+    principals.invalidate_user()
+
+    assert cached_keys(principals) == []
+
+
+def azure_login(server, name="Alice", email="alice@mairie.fr", oid="oid-1"):
+    return asyncio.run(server.azure_callback(server.AzureLoginRequest(oid=oid, email=email, name=name)))
+
+
+def test_repeated_azure_login_keeps_the_cache(server, principals, monkeypatch):
+    db = FakeDb(users=FakeCollection([ALICE, BOB]))
+    monkeypatch.setattr(server, "db", db)
+    warm(principals, db)
+
+    azure_login(server)
+
+    assert len(cached_keys(principals)) == 4
+    assert principals.reference_cache.get("users:all") == b"[]"
+    assert db.users.docs[0]["last_login"] is not None
+
+
+def test_azure_login_with_new_name_drops_that_user(server, principals, monkeypatch):
+    db = FakeDb(users=FakeCollection([ALICE, BOB]))
+    monkeypatch.setattr(server, "db", db)
+    warm(principals, db)
+
+    result = azure_login(server, name="Alice Martin")
+
+    assert result["user"]["name"] == "Alice Martin"
+    assert cached_keys(principals) == ["email:bob@mairie.fr", "id:u2"]
+    assert principals.reference_cache.get("users:all") is None
+
+
+def test_new_azure_user_keeps_other_records(server, principals, monkeypatch):
+    db = FakeDb(users=FakeCollection([ALICE, BOB]))
+    monkeypatch.setattr(server, "db", db)
+    warm(principals, db)
+
+    azure_login(server, name="Chloé", email="chloe@mairie.fr", oid="oid-3")
+
+    assert len(cached_keys(principals)) == 4
+    assert principals.reference_cache.get("users:all") is None
+    assert db.users.docs[-1]["id"] == "oid-3"
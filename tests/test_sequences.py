@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sequences import COUNTERS_COLLECTION, allocate_block, format_reference, renumber_duplicate_references
+
+
+class FakeAggregation:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length):
+        return self.rows
+
+
+class FakeCounters:
+    def __init__(self, seqs=None):
+        self.seqs = dict(seqs or {})
+
+    async def find_one_and_update(self, query, update, upsert, return_document):
+        key = query["_id"]
+        self.seqs[key] = self.seqs.get(key, 0) + update["$inc"]["seq"]
+        return {"_id": key, "seq": self.seqs[key]}
+
+
+class FakeMails:
+    def __init__(self, duplicate_rows):
+        self.duplicate_rows = duplicate_rows
+        self.updates = []
+
+    def aggregate(self, pipeline, **kwargs):
+        return FakeAggregation(self.duplicate_rows)
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update["$set"]))
+
+
+class FakeDb:
+    def __init__(self, duplicate_rows=(), seqs=None):
+        self.mails = FakeMails(list(duplicate_rows))
+        self.counters = FakeCounters(seqs)
+
+    def __getitem__(self, name):
+        assert name == COUNTERS_COLLECTION
+        return self.counters
+
+
+def test_format_reference():
+    assert format_reference(2025, 42) == "MAIL-2025-00042"
+
+
+def test_allocate_block_is_consecutive():
+    db = FakeDb(seqs={"mail_reference:2025": 7})
+    assert asyncio.run(allocate_block(db, 3, 2025)) == ["MAIL-2025-00008", "MAIL-2025-00009", "MAIL-2025-00010"]
+    assert asyncio.run(allocate_block(db, 0, 2025)) == []
+
+
+def test_renumber_keeps_oldest_and_uses_creation_year():
+    rows = [
+        {"_id": "MAIL-2024-00003", "count": 3, "mails": [
+            {"id": "oldest", "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc)},
+            {"id": "dup-1", "created_at": datetime(2024, 2, 1, tzinfo=timezone.utc)},
+            {"id": "dup-2", "created_at": "2025-01-05T10:00:00"},
+        ]},
+        {"_id": None, "count": 1, "mails": [{"id": "missing", "created_at": datetime(2025, 3, 1, tzinfo=timezone.utc)}]},
+    ]
+    db = FakeDb(rows, seqs={"mail_reference:2024": 10, "mail_reference:2025": 3})
+
+    renumbered = asyncio.run(renumber_duplicate_references(db))
+
+    assert [(mail["id"], mail["reference"]) for mail in renumbered] == [
+        ("dup-1", "MAIL-2024-00011"),
+        ("dup-2", "MAIL-2025-00004"),
+        ("missing", "MAIL-2025-00005"),
+    ]
+    assert all(query["reference"] == mail["previous_reference"] for (query, _), mail in zip(db.mails.updates, renumbered))
+    assert db.mails.updates[0][1]["previous_reference"] == "MAIL-2024-00003"
+
+
+def test_renumber_dry_run_lists_without_writing():
+    rows = [{"_id": "MAIL-2024-00003", "count": 2, "mails": [
+        {"id": "oldest", "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc)},
+        {"id": "dup-1", "created_at": datetime(2024, 2, 1, tzinfo=timezone.utc)},
+    ]}]
+    db = FakeDb(rows, seqs={"mail_reference:2024": 10})
+
+    planned = asyncio.run(renumber_duplicate_references(db, dry_run=True))
+
+    assert planned == [{"id": "dup-1", "previous_reference": "MAIL-2024-00003", "reference": None}]
+    assert db.mails.updates == []
+    assert db.counters.seqs == {"mail_reference:2024": 10}
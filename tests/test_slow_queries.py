@@ -0,0 +1,84 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+from slow_queries import SlowQueryLog, command_shape, query_shape, summarize_plan
+
+
+def event(command_name, request_id, command=None, duration_ms=0):
+    return SimpleNamespace(
+        command_name=command_name, request_id=request_id, connection_id=("localhost", 27017),
+        database_name="courrier", command=command or {}, duration_micros=int(duration_ms * 1000),
+    )
+
+
+def test_query_shape_hides_values():
+    shape = query_shape({"service_id": "s1", "status": {"$in": ["recu", "traite"]}, "subject": re.compile("^a")})
+
+    assert shape == {"service_id": "?", "status": {"$in": "?"}, "subject": "/regex/"}
+    assert query_shape({"$or": [{"a": 1}, {"b": 2}]}) == {"$or": [{"a": "?"}, {"b": "?"}]}
+
+
+def test_command_shape():
+    find = {"find": "mails", "filter": {"status": "recu"}, "sort": {"created_at": -1}}
+    aggregate = {"aggregate": "mails", "pipeline": [{"$match": {"type": "entrant"}}, {"$group": {"_id": "$status"}}]}
+    update = {"update": "mails", "updates": [{"q": {"id": "m1"}, "u": {"$set": {"x": 1}}}]}
+
+    assert command_shape("find", find) == {"filter": {"status": "?"}, "sort": {"created_at": -1}}
+    assert command_shape("aggregate", aggregate) == [{"$match": {"type": "?"}}, "$group"]
+    assert command_shape("update", update) == [{"q": {"id": "?"}, "multi": False}]
+
+
+def test_summarize_plan():
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "status_created_at"},
+    }}}
+    aggregate = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}}]}
+
+    assert summarize_plan(explain) == {"stages": "FETCH <- IXSCAN", "indexes": ["status_created_at"], "collscan": False}
+    assert summarize_plan(aggregate)["collscan"] is True
+    assert summarize_plan({}) is None
+
+
+def test_only_slow_commands_are_aggregated_by_shape():
+    log = SlowQueryLog(threshold_ms=100, explain=False)
+    for request_id, (value, duration) in enumerate([("recu", 150), ("traite", 250), ("archive", 20)]):
+        log.started(event("find", request_id, {"find": "mails", "filter": {"status": value}}))
+        log.succeeded(event("find", request_id, duration_ms=duration))
+    log.started(event("insert", 10, {"insert": "mails"}))
+    log.succeeded(event("insert", 10, duration_ms=500))
+
+    report = log.report()
+
+    assert len(report) == 1
+    assert report[0]["collection"] == "mails"
+    assert report[0]["count"] == 2
+    assert report[0]["avg_ms"] == 200.0
+    assert report[0]["max_ms"] == 250.0
+    log.reset()
+    assert log.report() == []
+
+
+def test_new_shape_is_explained_once_without_writes():
+    commands = []
+
+    class Database:
+        async def command(self, command):
+            commands.append(command)
+            return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+    async def scenario():
+        log = SlowQueryLog(threshold_ms=0)
+        log.attach({"courrier": Database()}, asyncio.get_running_loop())
+        pipeline = [{"$match": {"status": "recu"}}, {"$out": "copie"}]
+        for _ in range(2):
+            log.record("courrier", "aggregate", {"aggregate": "mails", "pipeline": pipeline, "lsid": {}}, 10)
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return log.report()
+
+    report = asyncio.run(scenario())
+
+    assert len(commands) == 1
+    assert commands[0]["explain"] == {"aggregate": "mails", "pipeline": [{"$match": {"status": "recu"}}]}
+    assert report[0]["plan"]["collscan"] is True
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+from stats_counters import BUCKET_GROUP_KEY, _bucket_update, bucket_of, day_of
+
+
+def test_day_of_uses_utc_day():
+    paris = timezone(timedelta(hours=2))
+    assert day_of(datetime(2025, 6, 1, 1, 30, tzinfo=paris)) == "2025-05-31"
+    assert day_of(datetime(2025, 6, 1, 23, 0)) == "2025-06-01"
+    assert day_of("2025-06-01T10:00:00+00:00") == "2025-06-01"
+
+
+def test_bucket_defaults_match_aggregation_defaults():
+    created_at = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    legacy = {"service_id": "s1", "type": "entrant", "created_at": created_at}
+    explicit_null = {**legacy, "status": None, "message_type": None}
+
+    assert bucket_of(legacy) == bucket_of(explicit_null) == ("s1", "entrant", "recu", "courrier", "2025-06-01")
+    assert BUCKET_GROUP_KEY["status"] == {"$ifNull": ["$status", "recu"]}
+    assert BUCKET_GROUP_KEY["message_type"] == {"$ifNull": ["$message_type", "courrier"]}
+
+
+def test_bucket_update_upserts_delta():
+    operation = _bucket_update(("s1", "entrant", "recu", "courrier", "2025-06-01"), -2)
+    assert operation._filter == {
+        "service_id": "s1", "type": "entrant", "status": "recu", "message_type": "courrier", "day": "2025-06-01",
+    }
+    assert operation._doc == {"$inc": {"count": -2}}
+    assert operation._upsert
+
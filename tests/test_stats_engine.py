@@ -0,0 +1,76 @@
+import asyncio
+
+from stats_engine import MAIL_STATUSES, StatsQuery, add_mail_breakdowns
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class AggregateCollection:
+    """Renvoie un résultat $facet préparé et garde le pipeline reçu"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return FakeCursor(self.docs)
+
+
+def test_pipeline_is_a_single_facet_after_the_match():
+    stats = StatsQuery({"service_id": "s1"})
+    stats.count("total")
+    stats.group("status_counts", "status", keys=MAIL_STATUSES, match={"type": "entrant"})
+
+    pipeline = stats.pipeline()
+
+    assert pipeline[0] == {"$match": {"service_id": "s1"}}
+    assert list(pipeline[1]["$facet"]) == ["total", "status_counts"]
+    assert pipeline[1]["$facet"]["status_counts"][0] == {"$match": {"type": "entrant"}}
+
+
+def test_run_shapes_counts_and_groups():
+    collection = AggregateCollection([{
+        "total": [{"_id": None, "count": 7}],
+        "status_counts": [{"_id": "recu", "count": 5}, {"_id": "inconnu", "count": 1}, {"_id": None, "count": 1}],
+        "by_service": [{"_id": "s1", "count": 4}, {"_id": None, "count": 3}],
+        "empty": [],
+    }])
+    stats = StatsQuery()
+    stats.count("total").count("empty")
+    stats.group("status_counts", "status", keys=MAIL_STATUSES)
+    stats.group("by_service", "service_id")
+
+    result = asyncio.run(stats.run(collection))
+
+    assert result == {
+        "total": 7,
+        "empty": 0,
+        "status_counts": {"recu": 5, "traitement": 0, "traite": 0, "archive": 0},
+        "by_service": {"s1": 4},
+    }
+    assert len(collection.pipelines) == 1
+
+
+def test_weight_sums_a_field_instead_of_counting():
+    stats = add_mail_breakdowns(StatsQuery(weight="count"))
+
+    facets = stats.pipeline()[0]["$facet"]
+
+    assert facets["total_mails"] == [{"$group": {"_id": None, "count": {"$sum": "$count"}}}]
+    assert facets["type_counts"][0]["$group"]["_id"] == "$type"
+
+
+def test_run_on_empty_collection():
+    stats = add_mail_breakdowns(StatsQuery())
+
+    result = asyncio.run(stats.run(AggregateCollection([])))
+
+    assert result["total_mails"] == 0
+    assert result["type_counts"] == {"entrant": 0, "sortant": 0}
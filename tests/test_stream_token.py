@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from tests.fake_mongo import FakeDb
+
+USER = {"id": "u1", "email": "alice@mairie.fr", "name": "Alice", "role": "user", "service_id": "s1"}
+
+
+@pytest.fixture
+def db(server, monkeypatch):
+    fake = FakeDb()
+    monkeypatch.setattr(server, "db", fake)
+    return fake
+
+
+def principal(server):
+    return asyncio.run(server.get_current_user(f"Bearer {server.create_token(USER)}"))
+
+
+def test_stream_token_opens_the_stream(server, db):
+    issued = asyncio.run(server.get_stream_token(principal(server)))
+
+    user = asyncio.run(server.get_stream_user(access_token=issued["token"], authorization=None))
+
+    assert issued["expires_in"] == server.STREAM_TOKEN_SECONDS
+    assert user["sub"] == "u1"
+    assert user["service_id"] == "s1"
+
+
+def test_main_token_is_rejected_in_the_query_string(server, db):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_stream_user(access_token=server.create_token(USER), authorization=None))
+    assert error.value.status_code == 401
+
+
+def test_stream_token_is_not_a_bearer_token(server, db):
+    token = server.create_stream_token(principal(server))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_current_user(f"Bearer {token}"))
+    assert error.value.status_code == 401
+
+
+def test_expired_stream_token_is_rejected(server, db, monkeypatch):
+    monkeypatch.setattr(server, "STREAM_TOKEN_SECONDS", -1)
+    token = server.create_stream_token(principal(server))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_stream_user(access_token=token, authorization=None))
+    assert error.value.detail == "Token expired"
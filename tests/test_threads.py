@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from threads import VISIBILITY_FIELDS, resolve_thread
+
+
+class FakeAggregation:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length):
+        return self.rows
+
+
+class FakeMails:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def aggregate(self, pipeline):
+        return FakeAggregation(self.rows)
+
+
+def node(mail_id, service_id, day, depth=0):
+    return {
+        "id": mail_id, "reference": f"MAIL-2025-{mail_id}", "type": "entrant", "subject": mail_id,
+        "status": "recu", "created_at": datetime(2025, 1, day, tzinfo=timezone.utc), "parent_mail_id": None,
+        "service_id": service_id, "service_ids": [service_id], "final_recipient_ids": [],
+        "final_recipient_emails": [], "depth": depth,
+    }
+
+
+def thread_db():
+    root = node("b", "s1", 2)
+    root.pop("depth")
+    root["ancestors"] = [node("a", "s2", 1, depth=0)]
+    root["descendants"] = [node("d", "s1", 4, depth=1), node("c", "s2", 3, depth=0), node("e", "s1", 3, depth=0)]
+    return SimpleNamespace(mails=FakeMails([root]))
+
+
+def in_service(service_id):
+    return lambda mail: mail.get("service_id") == service_id
+
+
+def test_resolve_thread_keeps_every_node_without_predicate():
+    thread = asyncio.run(resolve_thread(thread_db(), "b"))
+
+    assert [n["id"] for n in thread["ancestors"]] == ["a"]
+    assert [n["id"] for n in thread["descendants"]] == ["c", "e", "d"]
+
+
+def test_resolve_thread_drops_invisible_nodes_and_visibility_fields():
+    thread = asyncio.run(resolve_thread(thread_db(), "b", in_service("s1")))
+
+    assert thread["ancestors"] == []
+    assert [n["id"] for n in thread["descendants"]] == ["e", "d"]
+    for n in [thread["mail"], *thread["descendants"]]:
+        assert not set(VISIBILITY_FIELDS) & set(n)
+
+
+def test_resolve_thread_hides_invisible_root():
+    assert asyncio.run(resolve_thread(thread_db(), "b", in_service("s2"))) is None
+
+
+def test_resolve_thread_missing_mail():
+    assert asyncio.run(resolve_thread(SimpleNamespace(mails=FakeMails([])), "x")) is None